@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,17 +10,82 @@ class Settings(BaseSettings):
     # SD model ayarları
     model_id: str = "stabilityai/stable-diffusion-2-inpainting"
     use_cpu: bool = os.environ.get("USE_CPU", "0") == "1"
+    model_use_safetensors: Optional[bool] = None  # None: varsa safetensors, yoksa .bin; True: yalnızca safetensors
+    
+    # Model arka planda yüklendikten sonra sentetik çıkarımla ısıtılır
+    warmup_enabled: bool = True
+    warmup_resolutions: list = []  # Isıtılacak çözünürlükler (boşsa parça boyutu veya 512/768)
+    warmup_steps: int = 2  # Isıtma çıkarımındaki denoising adımı sayısı
+    
+    # Model kopyaları: her kullanılabilir GPU'ya bir kopya, GPU yoksa çekirdeklere bölünmüş CPU kopyaları
+    replica_devices: list = []  # Ör. ["cuda:0", "cuda:1"] veya ["cpu", "cpu"]; boşsa otomatik
+    cpu_replicas: int = 0  # Otomatik planda CPU kopyası sayısı (0 = çekirdek ve RAM'e göre)
+    cpu_threads_per_replica: int = 16  # Otomatik planda CPU kopyası başına çekirdek
+    cpu_replica_memory_gb: float = 4.0  # Otomatik planda CPU kopyası başına ayrılan RAM (GB)
+    replica_queue_depth: int = 2  # Kopya başına gönderilebilecek toplu iş (çalışan + bekleyen)
+    replica_max_failures: int = 2  # Üst üste bu kadar sağlık kontrolü başarısız olan kopya tahliye edilir
+    replica_health_check_seconds: int = 60  # Boşta kalan kopyaların sağlık kontrolü aralığı (0 = kapalı)
+    engine_config_path: str = "config/config.json"  # CPU motoru, otomatik ayar ve girdi hazırlama ("cpu_engine", "autotune", "performance") bölümlerinin okunduğu dosya
+    admin_token: str = ""  # Admin endpoint'leri için X-Admin-Token (boş = yalnızca geliştirme modunda açık)
     
     # API ayarları
     host: str = "0.0.0.0"
     port: int = 8000
     
+    # Çıkarım kuyruğu ayarları
+    max_queue_depth: int = 8  # Kuyrukta bekleyebilecek maksimum görev sayısı, aşılırsa 429 döner
+    batch_window_ms: int = 10  # Uyumlu görevleri toplamak için ilk görevden sonra beklenecek süre (ms)
+    max_batch_size: int = 4  # Tek pipeline çağrısındaki maksimum görüntü sayısı (1 = toplama kapalı)
+    prompt_cache_max_mb: int = 64  # Metin gömme önbelleğinin boyut sınırı (MB, 0 = kapalı)
+    latent_cache_max_mb: int = 128  # Maskelenmiş görüntü VAE latent önbelleğinin boyut sınırı (MB, 0 = kapalı)
+    progress_preview_min_interval: int = 5  # Latent önizlemeleri en sık kaç adımda bir gönderilebilir
+    
+    # Plan bazlı zamanlama: weight = adil kuyruktaki pay, max_in_flight = lisans başına aynı anda
+    # çalışan görev, max_queued = lisans başına kuyrukta bekleyen görev, rate_per_minute/burst = jeton kovası
+    plan_settings: dict = {
+        "basic": {"weight": 1, "max_in_flight": 1, "max_queued": 2, "rate_per_minute": 6, "burst": 3},
+        "pro": {"weight": 4, "max_in_flight": 2, "max_queued": 4, "rate_per_minute": 30, "burst": 10},
+        "enterprise": {"weight": 16, "max_in_flight": 4, "max_queued": 8, "rate_per_minute": 120, "burst": 30},
+    }
+    default_plan: str = "enterprise" if development_mode else "basic"  # Lisans bilgisi olmayan isteklerin planı
+    
+    # Görev deposu ayarları
+    task_store_backend: str = "memory"  # memory veya sqlite (birden fazla uvicorn işçisi için sqlite)
+    task_store_path: str = "output/tasks.db"  # SQLite görev veritabanının yolu
+    task_ttl_seconds: int = 3600  # Bitmiş görevlerin depoda tutulacağı süre (saniye)
+    max_tasks: int = 1000  # Depoda tutulacak maksimum görev sayısı
+    task_store_max_memory_mb: int = 64  # Bellek içi deponun meta veri için kullanabileceği maksimum bellek (MB)
+    
     # Lisans ayarları
     license_required: bool = not development_mode  # Geliştirme modunda lisans gerekmez
+    license_backend: str = "json"  # json (config/licenses.json) veya sqlite
+    license_db_path: str = "config/licenses.db"  # SQLite lisans veritabanının yolu
+    license_db_pool_size: int = 4  # SQLite bağlantı havuzu boyutu
+    license_flush_interval_seconds: int = 10  # json deposunda kullanım sayaçlarının dosyaya yazılma aralığı
+    license_token_secret: str = ""  # İmzalı lisans token'ları için HS256 anahtarı (boş = kapalı)
+    license_token_algorithm: str = "HS256"  # HS256 veya RS256/ES256/EdDSA (anahtar dosyaları ile)
+    license_token_private_key_path: str = ""  # Asimetrik algoritmalarda imzalama anahtarı
+    license_token_public_key_path: str = ""  # Asimetrik algoritmalarda doğrulama anahtarı
+    license_revocation_file: str = "config/revoked_licenses.json"  # İptal edilen anahtar/token listesi
+    license_token_cache_size: int = 1024  # Doğrulanmış token önbelleği boyutu
     
     # Çıktı ayarları
     output_dir: str = "output"
     max_output_storage_days: int = 7  # Çıktıların kaç gün saklanacağı
+    max_output_storage_mb: int = 10240  # Çıktı klasörünün toplam boyut kotası (MB, 0 = sınırsız)
+    output_cleanup_interval_seconds: int = 300  # Saklama politikasının uygulanma aralığı
+    output_cleanup_batch_size: int = 200  # Bir seferde silinecek dosya sayısı
+    output_cleanup_batch_pause_ms: int = 50  # Silme grupları arasındaki bekleme (ms)
+    output_encode_workers: int = 2  # Çıktıları kodlayıp diske yazan iş parçacığı sayısı
+    output_x_accel_redirect: bool = False  # Görüntü dosyalarını nginx X-Accel-Redirect ile sun
+    output_x_accel_prefix: str = "/protected-output"  # nginx'teki internal location yolu
+    image_url_secret: str = ""  # Görüntü adreslerini imzalayan anahtar (boş = sqlite görev deposunda görev veritabanının yanındaki dosyadan, bellek deposunda süreç başına rastgele)
+    
+    # Sonuç önbelleği (yalnızca sabit seed'li istekler; aynı istekler çalışan göreve bağlanır)
+    result_cache_enabled: bool = True
+    result_cache_dir: str = "output/cache"  # Önbelleğe alınan çıktıların disk katmanı
+    result_cache_max_entries: int = 256  # Bellek katmanındaki maksimum kayıt sayısı
+    result_cache_max_mb: int = 1024  # Disk katmanının boyut kotası (MB, 0 = disk katmanı kapalı)
     
     # Güvenlik ayarları
     allowed_origins: list = ["*"]  # CORS için izin verilen originler
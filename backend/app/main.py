@@ -1,15 +1,30 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import logging
 import time
 import os
 from typing import Dict, Any, List, Optional
 
 from app.config import settings
-from app.utils.auto_device_detection import get_device_info, load_optimized_model
+from app.utils.auto_device_detection import get_device_info
+from app.utils.security import is_image_request, is_events_request
 from app.routers import api_router
-from app.services.license_service import validate_license
+from app.services.license_service import validate_license, configure_license_store, configure_license_tokens
+from app.services.license_tokens import is_license_token
+from app.services.inpainting_service import InferenceExecutor
+from app.services.task_store import create_task_store
+from app.services.retention_service import OutputJanitor
+from app.services.result_cache import ResultCache
+from app.services.progress import ProgressHub
+from app.services.model_loader import ModelLoader
+from app.services.autotuner import Autotuner, load_autotune_settings
+from app.services.preprocessing import load_performance_settings
+from app.utils.cpu_engine import load_cpu_engine_settings
+from app.models.inpainting import output_writer
+from app.utils.prompt_cache import prompt_cache
+from app.utils.latent_cache import latent_cache
 
 # Ana uygulama oluştur
 app = FastAPI(
@@ -47,40 +62,155 @@ os.makedirs(settings.output_dir, exist_ok=True)
 @app.on_event("startup")
 async def startup_event():
     """Uygulama başlatıldığında çalışacak kod"""
-    logger.info(f"Sistem cihaz bilgileri tespit ediliyor...")
+    # Lisans deposunu seç (json deposu kullanım sayaçlarını periyodik olarak kaydeder)
+    app.state.license_store = configure_license_store(
+        settings.license_backend,
+        path=settings.license_db_path if settings.license_backend == "sqlite" else None,
+        flush_interval=settings.license_flush_interval_seconds,
+        pool_size=settings.license_db_pool_size
+    )
+    app.state.license_store.start()
     
-    # Model ve config'i yükle
-    try:
-        model, config = load_optimized_model(
-            model_id=settings.model_id
+    # İmzalı lisans token'ları (yapılandırılmışsa depoya erişmeden doğrulanır)
+    app.state.token_verifier = configure_license_tokens(
+        secret=settings.license_token_secret,
+        algorithm=settings.license_token_algorithm,
+        private_key_path=settings.license_token_private_key_path,
+        public_key_path=settings.license_token_public_key_path,
+        revocation_file=settings.license_revocation_file,
+        cache_size=settings.license_token_cache_size
+    )
+    if app.state.token_verifier is not None:
+        app.state.token_verifier.start()
+    
+    # Görev deposu ve çıktı temizleyici model yüklenemese bile oluşturulur
+    app.state.task_store = create_task_store(settings)
+    
+    # İlerleme olayları SSE akışına aktarılır; durum değişiklikleri görev deposundan gelir
+    app.state.progress_hub = ProgressHub()
+    app.state.task_store.add_listener(app.state.progress_hub.on_status)
+    app.state.janitor = OutputJanitor(
+        settings.output_dir,
+        max_age_days=settings.max_output_storage_days,
+        max_bytes=settings.max_output_storage_mb * 1024 * 1024,
+        interval_seconds=settings.output_cleanup_interval_seconds,
+        batch_size=settings.output_cleanup_batch_size,
+        batch_pause=settings.output_cleanup_batch_pause_ms / 1000.0,
+        task_store=app.state.task_store
+    )
+    app.state.janitor.start()
+    
+    # Sabit seed'li isteklerin sonuç önbelleği
+    app.state.result_cache = None
+    if settings.result_cache_enabled:
+        app.state.result_cache = ResultCache(
+            settings.result_cache_dir,
+            max_entries=settings.result_cache_max_entries,
+            max_bytes=settings.result_cache_max_mb * 1024 * 1024
         )
-        app.state.model = model
-        app.state.config = config
-        logger.info(f"Model başarıyla yüklendi. Çalışma cihazı: {model.device}")
-    except Exception as e:
-        logger.error(f"Model yüklenirken hata oluştu: {e}")
-        app.state.model = None
-        app.state.config = None
+    
+    # Metin gömme ve VAE latent önbellekleri tüm pipeline çağrılarında paylaşılır
+    prompt_cache.max_bytes = settings.prompt_cache_max_mb * 1024 * 1024
+    latent_cache.max_bytes = settings.latent_cache_max_mb * 1024 * 1024
+    
+    # Model arka planda yüklenip ısıtılır; hazır olana kadar çıkarım istekleri 503 alır
+    app.state.model = None
+    app.state.config = None
+    app.state.executor = None
+    app.state.autotuner = Autotuner(settings.model_id, load_autotune_settings(settings.engine_config_path))
+    app.state.model_loader = ModelLoader(
+        settings.model_id,
+        use_safetensors=settings.model_use_safetensors,
+        warmup_enabled=settings.warmup_enabled,
+        warmup_resolutions=settings.warmup_resolutions,
+        warmup_steps=settings.warmup_steps,
+        replica_devices=settings.replica_devices,
+        cpu_replicas=settings.cpu_replicas,
+        cpu_threads_per_replica=settings.cpu_threads_per_replica,
+        cpu_replica_memory_gb=settings.cpu_replica_memory_gb,
+        cpu_engine=load_cpu_engine_settings(settings.engine_config_path),
+        autotuner=app.state.autotuner,
+        on_ready=start_inference
+    )
+    app.state.model_loader.start()
+
+def start_inference(replicas):
+    """Model kopyaları hazır olunca onları sahiplenen çıkarım yürütücüsünü başlatır (yükleyici iş parçacığından çağrılır)"""
+    performance = load_performance_settings(settings.engine_config_path)
+    executor = InferenceExecutor(
+        replicas,
+        max_queue_depth=settings.max_queue_depth,
+        batch_window_ms=settings.batch_window_ms,
+        max_batch_size=settings.max_batch_size,
+        plan_settings=settings.plan_settings,
+        default_plan=settings.default_plan,
+        progress_hub=app.state.progress_hub,
+        replica_queue_depth=settings.replica_queue_depth,
+        replica_max_failures=settings.replica_max_failures,
+        health_check_interval=settings.replica_health_check_seconds,
+        preprocess_workers=performance["num_workers"],
+        prefetch_factor=performance["prefetch_factor"]
+    )
+    executor.start()
+    app.state.config = replicas[0].config
+    app.state.executor = executor
+    app.state.model = replicas[0].model
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Uygulama kapatıldığında çalışacak kod"""
     logger.info("Uygulama kapatılıyor...")
     
-    # Eğer gerekiyorsa burada temizlik işlemleri yapılabilir
-    # Örneğin geçici dosyaları silme, vs.
+    # Yükleme sürüyorsa yürütücü başlatılmaz
+    model_loader = getattr(app.state, "model_loader", None)
+    if model_loader is not None:
+        model_loader.stop()
+    
+    # Kuyruktaki görevlerin bitmesini bekle ve yürütücüyü durdur
+    executor = getattr(app.state, "executor", None)
+    if executor is not None:
+        executor.stop()
+    
+    # Diske yazılmayı bekleyen çıktıları tamamla
+    output_writer.shutdown(wait=True)
+    
+    # Çıktı temizleyiciyi durdur (devam eden silme grubu tamamlanır)
+    janitor = getattr(app.state, "janitor", None)
+    if janitor is not None:
+        janitor.stop()
+    
+    task_store = getattr(app.state, "task_store", None)
+    if task_store is not None:
+        task_store.close()
+    
+    # Bellekte biriken lisans kullanım sayaçlarını kaydet ve depoyu kapat
+    token_verifier = getattr(app.state, "token_verifier", None)
+    if token_verifier is not None:
+        token_verifier.stop()
+    
+    license_store = getattr(app.state, "license_store", None)
+    if license_store is not None:
+        license_store.stop()
 
 # Lisans doğrulama middleware'i
 @app.middleware("http")
 async def validate_license_middleware(request: Request, call_next):
-    # API isteği olmayan endpoint'ler için doğrulama atlanır
-    public_endpoints = ["/", "/docs", "/redoc", "/openapi.json", "/device-info"]
+    # API isteği olmayan endpoint'ler için doğrulama atlanır (admin endpoint'leri kendi yetkisini kontrol eder)
+    public_endpoints = ["/", "/ready", "/docs", "/redoc", "/openapi.json", "/device-info"]
     
-    if request.url.path in public_endpoints or request.url.path.startswith("/static/"):
+    if (request.url.path in public_endpoints or request.url.path.startswith("/static/")
+            or request.url.path.startswith("/admin/")):
         return await call_next(request)
     
-    # Geliştirme modunda lisans kontrolünü atla
+    # Görüntü ve ilerleme akışı adresleri imzalıdır (<img src> ve EventSource lisans
+    # başlığı gönderemez); kullanım sayılmaz
+    if is_image_request(request) or is_events_request(request):
+        return await call_next(request)
+    
+    # Geliştirme modunda lisans kontrolünü atla (istemciler adres bazında zamanlanır)
     if settings.development_mode:
+        request.state.license_key = request.client.host if request.client else "anonymous"
+        request.state.plan = settings.default_plan
         response = await call_next(request)
         return response
     
@@ -93,8 +223,12 @@ async def validate_license_middleware(request: Request, call_next):
             content={"detail": "Lisans anahtarı gereklidir"}
         )
     
-    # Lisans doğrulama 
-    valid_license = await validate_license(license_key)
+    # Lisans doğrulama: imzalı token'lar yalnızca CPU ile doğrulanır, diğer anahtarlar
+    # için depo erişimi event loop'u bloklamasın diye iş parçacığında yapılır
+    if is_license_token(license_key):
+        valid_license = validate_license(license_key)
+    else:
+        valid_license = await run_in_threadpool(validate_license, license_key)
     
     if not valid_license["valid"]:
         return JSONResponse(
@@ -102,13 +236,17 @@ async def validate_license_middleware(request: Request, call_next):
             content={"detail": valid_license["message"]}
         )
     
+    # Zamanlayıcı görevleri lisans ve plana göre sıralar
+    request.state.license_key = valid_license.get("license_key", license_key)
+    request.state.plan = valid_license.get("plan") or settings.default_plan
+    
     # İşleme devam et
     response = await call_next(request)
     return response
 
 @app.get("/")
 async def root():
-    """API durumunu kontrol etmek için root endpoint"""
+    """API durumunu kontrol etmek için root endpoint (canlılık; model yüklenirken de yanıt verir)"""
     device_info = get_device_info()
     
     return {
@@ -116,9 +254,34 @@ async def root():
         "app_name": settings.app_name,
         "version": "1.0.0",
         "device": device_info["device"],
-        "model_loaded": app.state.model is not None
+        "model_loaded": app.state.model is not None,
+        "model_state": app.state.model_loader.state,
+        "queue": app.state.executor.stats() if getattr(app.state, "executor", None) else None,
+        "tasks": app.state.task_store.stats(),
+        "storage": app.state.janitor.stats(),
+        "result_cache": app.state.result_cache.stats() if app.state.result_cache else None,
+        "progress_streams": app.state.progress_hub.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "latent_cache": latent_cache.stats(),
+        "autotune": app.state.autotuner.stats()
     }
 
+@app.get("/ready")
+async def ready():
+    """
+    Hazırlık kontrolü: model yüklenip ısıtıldıysa 200, yükleniyor (loading),
+    ısıtılıyor (warming), yükleme başarısızsa (failed) veya tüm model kopyaları
+    tahliye edildiyse (unhealthy) 503 döner.
+    """
+    model_loader = app.state.model_loader
+    stats = model_loader.stats()
+    executor = app.state.executor
+    if model_loader.ready and executor is not None:
+        if executor.healthy():
+            return dict(stats, status="ready")
+        return JSONResponse(status_code=503, content=dict(stats, status="unhealthy"))
+    return JSONResponse(status_code=503, content=dict(stats, status=stats["state"]))
+
 @app.get("/device-info")
 async def get_device_info_endpoint():
     """Mevcut cihaz bilgilerini döndürür"""
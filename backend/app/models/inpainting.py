@@ -1,99 +1,465 @@
 import torch
 import io
-import base64
+import os
 import time
+import hashlib
 import logging
+import threading
 import numpy as np
 from PIL import Image
-from app.utils.auto_device_detection import process_with_auto_tiling
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.auto_device_detection import process_with_auto_tiling, process_batch, requires_tiling
+from app.utils.variations import generate_variations, is_out_of_memory
+from app.utils.region_planner import plan_regions, crop_scale
+from app.utils.mask_index import MaskIndex
+from app.utils.image_utils import invert_mask, encode_image, write_file_atomic, get_output_format
+from app.services.progress import TaskInterrupted, BatchSplit, combine_callbacks
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-async def process_inpainting(
-    model,
-    config,
-    task_id: str,
-    image_data: bytes,
-    mask_data: bytes,
-    prompt: str,
-    negative_prompt: str,
-    guidance_scale: float,
-    num_inference_steps: int,
-    seed: int,
-    num_outputs: int,
-    active_tasks: dict
-):
-    """Arka planda inpainting işlemini gerçekleştirme"""
-    try:
-        # Durumu güncelle
-        active_tasks[task_id]["status"] = "processing"
-        
-        # Resim ve maskeyi yükle
-        init_image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        mask_image = Image.open(io.BytesIO(mask_data)).convert("RGB")
-        
-        # Görüntüleri işle ve uygun boyutlara getir
+# Çıktıların kodlanıp diske yazıldığı havuz; kodlama bir sonraki varyasyonun
+# veya görevin çıkarımıyla paralel yürür
+output_writer = ThreadPoolExecutor(
+    max_workers=max(1, settings.output_encode_workers),
+    thread_name_prefix="output-writer"
+)
+
+class InpaintingResult(BaseModel):
+    """Inpainting görevinin API üzerinden döndürülen durumu"""
+    id: str
+    status: str
+    images: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+    # Bekleyen görevler için kuyruk sırası (1 = sıradaki) ve tahmini başlama zamanı (Unix zamanı)
+    queue_position: Optional[int] = None
+    estimated_start: Optional[float] = None
+    # Bitmemiş görevler için imzalı ilerleme akışı adresi (lisans başlığı gerektirmez)
+    events_url: Optional[str] = None
+
+def prepare_inputs(image_data, mask_data, seed):
+    """Resim ve maskeyi çözer, 8'in katlarına getirir ve seed'i belirler"""
+    # Resim ve maskeyi yükle
+    init_image = Image.open(io.BytesIO(image_data)).convert("RGB")
+    mask_image = Image.open(io.BytesIO(mask_data)).convert("RGB")
+
+    # Görüntüleri işle ve uygun boyutlara getir
+    width, height = init_image.size
+
+    # SD 2.0 için resimleri 8'in katları olacak şekilde yeniden boyutlandır
+    if width % 8 != 0 or height % 8 != 0:
+        width = (width // 8) * 8
+        height = (height // 8) * 8
+        init_image = init_image.resize((width, height))
+        mask_image = mask_image.resize((width, height))
+
+    # Maskı hazırla: arayüzde siyah alanlar inpainting içindir, pipeline ise
+    # beyaz=inpaint bekler. Maske burada bir kez ters çevrilir.
+    mask_image = invert_mask(mask_image)
+
+    # Seed'i ayarla
+    if seed == -1:
+        seed = int(time.time()) % 2**32
+
+    return init_image, mask_image, seed
+
+def write_output(image, path, output_format, output_quality, png_compress_level):
+    """Tek bir çıktıyı kodlayıp atomik olarak diske yazar ve kayıt bilgisini döndürür"""
+    data = encode_image(image, output_format, quality=output_quality, compress_level=png_compress_level)
+    write_file_atomic(path, data)
+    return {
+        "path": path,
+        "media_type": get_output_format(output_format)[2],
+        "size": len(data),
+        "etag": hashlib.blake2b(data, digest_size=16).hexdigest(),
+    }
+
+class OutputSink:
+    """
+    Bir görevin çıktılarını üretildikçe kodlama havuzuna gönderir. close() ile
+    tüm çıktıların eklendiği bildirildikten sonra son dosya yazıldığında görev
+    completed olarak işaretlenir; çıkarım iş parçacığı beklemez. close()
+    çağrılmazsa (üretim hatası) görev durumu değiştirilmez. Görev tamamlandıktan
+    sonra on_complete(görüntü kayıtları) çağrılır (ör. sonuç önbelleği için).
+    """
+
+    def __init__(self, task_id, task_store, prompt, seeds, output_format="png",
+                 output_quality=90, png_compress_level=6, output_dir=None, on_complete=None):
+        self.task_id = task_id
+        self.task_store = task_store
+        self.prompt = prompt
+        self.seeds = seeds
+        self.output_format = output_format
+        self.output_quality = output_quality
+        self.png_compress_level = png_compress_level
+        self.output_dir = output_dir or settings.output_dir
+        self.extension = get_output_format(output_format)[1]
+        self.on_complete = on_complete
+        self._futures = {}
+
+    def add(self, index, image):
+        """index numaralı çıktıyı kodlama kuyruğuna ekler"""
+        path = os.path.join(self.output_dir, f"{self.task_id}_{index}.{self.extension}")
+        self._futures[index] = output_writer.submit(
+            write_output, image, path, self.output_format, self.output_quality, self.png_compress_level
+        )
+
+    def close(self):
+        """Tüm çıktılar eklendi; yazmalar bitince görevi tamamla"""
+        futures = list(self._futures.values())
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._finalize()
+
+        if not futures:
+            self._finalize()
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def _finalize(self):
+        try:
+            if len(self._futures) != len(self.seeds):
+                raise RuntimeError(f"{len(self.seeds)} çıktı bekleniyordu, {len(self._futures)} üretildi")
+
+            output_images = [
+                dict(self._futures[i].result(), seed=seed, prompt=self.prompt)
+                for i, seed in enumerate(self.seeds)
+            ]
+
+            # Durumu güncelle
+            if not self.task_store.complete(self.task_id, output_images):
+                logger.warning(f"Görev {self.task_id} depodan tahliye edilmiş, sonuç kaydedilemedi")
+                return
+
+            logger.info(f"Görev {self.task_id} başarıyla tamamlandı")
+        except Exception as e:
+            mark_failed(self.task_id, e, self.task_store)
+            return
+
+        if self.on_complete is not None:
+            try:
+                self.on_complete(output_images)
+            except Exception as e:
+                logger.warning(f"Görev {self.task_id} tamamlama bildirimi başarısız: {e}")
+
+def create_sink(job, seed):
+    """Görev parametrelerinden çıktı sink'ini oluşturur"""
+    return OutputSink(
+        job["task_id"],
+        job["task_store"],
+        job["prompt"],
+        [seed + i for i in range(job["num_outputs"])],
+        output_format=job.get("output_format", "png"),
+        output_quality=job.get("output_quality", 90),
+        png_compress_level=job.get("png_compress_level", 6),
+        on_complete=job.get("on_complete")
+    )
+
+def mark_failed(task_id, error, task_store):
+    """Görevi başarısız olarak işaretler; iptal edilen veya süresi dolan görevler kendi durumlarını alır"""
+    if isinstance(error, TaskInterrupted):
+        logger.info(f"Görev {task_id} durduruldu: {error.status}")
+        task_store.interrupt(task_id, error.status, str(error))
+        return
+    logger.error(f"Görev {task_id} işlenirken hata oluştu: {str(error)}")
+    task_store.fail(task_id, error)
+
+def is_device_error(error):
+    """Hata model kopyasının cihazından mı kaynaklanıyor (bellek yetersizliği, CUDA/MPS hatası)"""
+    if is_out_of_memory(error):
+        return True
+    message = str(error)
+    return isinstance(error, RuntimeError) and any(
+        marker in message for marker in ("CUDA error", "device-side assert", "MPS backend")
+    )
+
+def generate_full_frame(model, config, task_id, image, mask_image, prompt, negative_prompt,
+                        guidance_scale, num_inference_steps, seeds, max_batch_size=4, on_output=None,
+                        progress=None):
+    """
+    Verilen görüntünün tamamı için her seed'e bir çıktı üretir. Tiling gerekmiyorsa
+    tüm varyasyonlar ortak ön işleme ile toplu olarak, gerekiyorsa sırayla tiling ile üretilir.
+    Tek çıktılı görevler de varyasyon yolundan geçer; böylece aynı görüntü ve maskenin
+    önbellekteki VAE latent'leri tekrar denemelerde ve farklı promptlarda kullanılır.
+    on_output(index, image) her çıktı hazır olduğunda çağrılır; progress verilirse
+    ilerleme bildirilir.
+    """
+    width, height = image.size
+
+    if not requires_tiling(config, width, height):
+        logger.info(f"İşlem başlatılıyor: {task_id}, {len(seeds)} varyasyon toplu olarak")
+        return generate_variations(
+            pipe=model,
+            image=image,
+            mask_image=mask_image,
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            guidance_scale=guidance_scale,
+            num_inference_steps=num_inference_steps,
+            seeds=seeds,
+            max_batch_size=max_batch_size,
+            on_result=on_output,
+            progress=progress
+        )
+
+    result_images = []
+
+    # Maske indeksi bir kez oluşturulur ve tüm çıktılarda tiler tarafından kullanılır
+    mask_index = MaskIndex(np.array(mask_image))
+
+    # Her bir çıktı için işlem yap
+    for i, current_seed in enumerate(seeds):
+        # Akıllı tiling ile inpainting işlemini gerçekleştir
+        logger.info(f"İşlem başlatılıyor: {task_id}, çıktı {i+1}/{len(seeds)}")
+        if progress is not None:
+            progress.set("output", i, len(seeds))
+        result_image = process_with_auto_tiling(
+            pipe=model,
+            image=image,
+            mask_image=mask_image,
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            guidance_scale=guidance_scale,
+            num_inference_steps=num_inference_steps,
+            seed=current_seed,
+            config=config,
+            mask_index=mask_index,
+            progress=progress
+        )
+
+        result_images.append(result_image)
+        if on_output is not None:
+            on_output(i, result_image)
+
+    return result_images
+
+def generate_outputs(model, config, task_id, init_image, mask_image, prompt, negative_prompt,
+                     guidance_scale, num_inference_steps, seed, num_outputs, max_batch_size=4,
+                     regions=None, on_output=None, progress=None):
+    """
+    Çıktıları üretir. Önce maske bölgeleri planlanır: maske boşsa girdi doğrudan
+    döndürülür, maske görüntünün küçük bir kısmını kaplıyorsa yalnızca bölgeler
+    (gerekirse büyütülerek) işlenip orijinal görüntüye geri yapıştırılır.
+    on_output(index, image) her çıktı hazır olduğunda çağrılır (ör. kodlamayı başlatmak için).
+    progress verilirse bölge, çıktı, parça ve adım ilerlemesi bildirilir.
+    """
+    seeds = [seed + i for i in range(num_outputs)]
+    width, height = init_image.size
+    inpainting_settings = config["inpainting_settings"]
+
+    if regions is None:
+        regions = plan_regions(np.array(mask_image), inpainting_settings)
+
+    if not regions:
+        logger.info(f"Görev {task_id}: maske boş, girdi görüntüsü döndürülüyor")
+        result_images = [init_image.copy() for _ in seeds]
+        if on_output is not None:
+            for i, result_image in enumerate(result_images):
+                on_output(i, result_image)
+        return result_images, seeds
+
+    if regions == [(0, 0, width, height)]:
+        result_images = generate_full_frame(
+            model, config, task_id, init_image, mask_image, prompt, negative_prompt,
+            guidance_scale, num_inference_steps, seeds, max_batch_size, on_output, progress
+        )
+        return result_images, seeds
+
+    result_nps = [np.array(init_image) for _ in seeds]
+    min_size = inpainting_settings.get("region_min_size", 512)
+
+    for region_index, box in enumerate(regions):
+        x0, y0, x1, y1 = box
+        if progress is not None:
+            progress.set("region", region_index, len(regions))
+        crop_image = init_image.crop(box)
+        crop_mask = mask_image.crop(box)
+        paste_mask = np.array(crop_mask) > 128
+
+        # Küçük bölgeler modelin doğal çözünürlüğüne büyütülerek işlenir
+        target_size = crop_scale(box, min_size)
+        if target_size is not None:
+            crop_image = crop_image.resize(target_size, Image.LANCZOS)
+            crop_mask = crop_mask.resize(target_size, Image.NEAREST)
+
+        logger.info(f"Bölge işleniyor: {task_id}, {box} ({crop_image.size[0]}x{crop_image.size[1]})")
+        crop_results = generate_full_frame(
+            model, config, task_id, crop_image, crop_mask, prompt, negative_prompt,
+            guidance_scale, num_inference_steps, seeds, max_batch_size, progress=progress
+        )
+
+        # Sonuçları yalnızca maskeli piksellerde orijinal görüntüye yapıştır
+        for result_np, crop_result in zip(result_nps, crop_results):
+            if target_size is not None:
+                crop_result = crop_result.resize((x1 - x0, y1 - y0), Image.LANCZOS)
+            result_np[y0:y1, x0:x1][paste_mask] = np.asarray(crop_result)[paste_mask]
+
+    # Bölgeler tüm varyasyonlar için birlikte işlendiğinden çıktılar en sonda hazır olur
+    result_images = [Image.fromarray(result_np) for result_np in result_nps]
+    if on_output is not None:
+        for i, result_image in enumerate(result_images):
+            on_output(i, result_image)
+    return result_images, seeds
+
+def interrupted(job):
+    """Görev iptal edildiyse veya süre sınırını aştıysa True"""
+    progress = job.get("progress")
+    return progress is not None and progress.interrupted is not None
+
+def process_inpainting_batch(model, config, jobs, max_batch_size=4):
+    """
+    Kuyruktan birlikte alınan görevleri işler. Aynı çözünürlük, adım sayısı ve
+    guidance scale değerine sahip, maskesi görüntünün tamamına yayılan ve tiling
+    gerektirmeyen görevlerin çıktıları tek bir toplu pipeline çağrısında üretilir;
+    her öğe kendi prompt, seed ve maskesini korur. Diğer görevler tek tek işlenir.
+    Toplu çağrıda iptal edilen veya süresi dolan görevin öğeleri atılır, diğer
+    görevler devam eder; kesilen öğelerin kalan adımları, diğer öğelerin o ana
+    kadarki adımlarından pahalıysa çağrı durdurulup kalan öğelerle yeniden başlatılır.
+
+    jobs: task_id, task_store, image_data, mask_data, seed, prompt, negative_prompt,
+    guidance_scale, num_inference_steps, num_outputs, çıktı ayarları, on_complete
+    ve progress alanlarını içeren sözlükler;
+    "prepared" (PreparedInputs) varsa girdiler önceden hazırlanmış olarak alınır.
+    Görevlerden biri cihaz kaynaklı bir hatayla başarısız olduysa True döner
+    (geçersiz girdi gibi görev hataları kopyanın sağlığını etkilemez).
+    """
+    groups = {}
+    device_failed = False
+
+    def fail(task_id, error, task_store):
+        nonlocal device_failed
+        device_failed = device_failed or is_device_error(error)
+        mark_failed(task_id, error, task_store)
+
+    for job in jobs:
+        task_id = job["task_id"]
+        task_store = job["task_store"]
+
+        try:
+            # Kuyrukta beklerken süresi dolan veya iptal edilen görevler başlatılmaz
+            if job.get("progress") is not None:
+                job["progress"].check()
+            task_store.mark_processing(task_id)
+            if job.get("prepared") is not None:
+                # Girdiler çıkarım yürütücüsünün hazırlık aşamasında çözüldü
+                init_image, mask_image, seed, regions = job["prepared"].get()
+            else:
+                init_image, mask_image, seed = prepare_inputs(job["image_data"], job["mask_data"], job["seed"])
+                regions = plan_regions(np.array(mask_image), config["inpainting_settings"])
+        except Exception as e:
+            fail(task_id, e, task_store)
+            continue
+
         width, height = init_image.size
-        
-        # SD 2.0 için resimleri 8'in katları olacak şekilde yeniden boyutlandır
-        if width % 8 != 0 or height % 8 != 0:
-            width = (width // 8) * 8
-            height = (height // 8) * 8
-            init_image = init_image.resize((width, height))
-            mask_image = mask_image.resize((width, height))
-        
-        # Maskı hazırla (siyah alanlar inpainting için, beyaz alanlar korunur)
-        mask_image = mask_image.convert("L")
-        
-        # Seed'i ayarla
-        if seed == -1:
-            seed = int(time.time()) % 2**32
-            
-        output_images = []
-        
-        # Her bir çıktı için işlem yap
-        for i in range(num_outputs):
-            current_seed = seed + i
-            
-            # Akıllı tiling ile inpainting işlemini gerçekleştir
-            logger.info(f"İşlem başlatılıyor: {task_id}, çıktı {i+1}/{num_outputs}")
-            result_image = process_with_auto_tiling(
-                pipe=model,
-                image=init_image,
-                mask_image=mask_image,
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                guidance_scale=guidance_scale,
-                num_inference_steps=num_inference_steps,
-                seed=current_seed,
-                config=config
+        if regions != [(0, 0, width, height)] or requires_tiling(config, width, height):
+            # Bölge bazlı veya tiling gereken görevler diğer görevlerle birlikte toplanamaz
+            try:
+                sink = create_sink(job, seed)
+                generate_outputs(
+                    model, config, task_id, init_image, mask_image, job["prompt"], job["negative_prompt"],
+                    job["guidance_scale"], job["num_inference_steps"], seed, job["num_outputs"],
+                    max_batch_size, regions, on_output=sink.add, progress=job.get("progress")
+                )
+                sink.close()
+            except Exception as e:
+                fail(task_id, e, task_store)
+            continue
+
+        prepared = dict(job, init_image=init_image, mask_image=mask_image, seed=seed)
+        prepared["sink"] = create_sink(job, seed)
+        prepared["error"] = None
+
+        key = (width, height, job["num_inference_steps"], job["guidance_scale"])
+        groups.setdefault(key, []).append(prepared)
+
+    for (width, height, num_inference_steps, guidance_scale), group in groups.items():
+        if len(group) == 1:
+            # Tek görev: varyasyonlar ortak ön işleme ile üretilir
+            job = group[0]
+            try:
+                generate_outputs(
+                    model, config, job["task_id"], job["init_image"], job["mask_image"], job["prompt"],
+                    job["negative_prompt"], guidance_scale, num_inference_steps, job["seed"],
+                    job["num_outputs"], max_batch_size, on_output=job["sink"].add,
+                    progress=job.get("progress")
+                )
+                job["sink"].close()
+            except Exception as e:
+                fail(job["task_id"], e, job["task_store"])
+            continue
+
+        # Her görevin her çıktısı ayrı bir toplu öğe olur
+        items = [(job, i) for job in group for i in range(job["num_outputs"])]
+
+        while items:
+            # Kesilen görevlerin kalan öğeleri işlenmez
+            items = [(job, i) for job, i in items if job["error"] is None and not interrupted(job)]
+            chunk, items = items[:max_batch_size], items[max_batch_size:]
+            if not chunk:
+                break
+            logger.info(
+                f"Toplu işlem başlatılıyor: {len(chunk)} öğe, "
+                f"{len(set(job['task_id'] for job, _ in chunk))} görev ({width}x{height})"
             )
-            
-            # Dosya adı oluştur ve kaydet
-            filename = f"output/{task_id}_{i}.png"
-            result_image.save(filename)
-            
-            # Base64 dönüşümü
-            buffered = io.BytesIO()
-            result_image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
-            # Sonuçları listeye ekle
-            output_images.append({
-                "image": f"data:image/png;base64,{img_str}",
-                "seed": current_seed,
-                "prompt": prompt
-            })
-        
-        # Durumu güncelle
-        active_tasks[task_id]["status"] = "completed"
-        active_tasks[task_id]["images"] = output_images
-        active_tasks[task_id]["completed_at"] = time.time()
-        
-        logger.info(f"Görev {task_id} başarıyla tamamlandı")
-        
-    except Exception as e:
-        logger.error(f"Görev {task_id} işlenirken hata oluştu: {str(e)}")
-        active_tasks[task_id]["status"] = "failed"
-        active_tasks[task_id]["error"] = str(e)
-        active_tasks[task_id]["completed_at"] = time.time()
\ No newline at end of file
+
+            # Her görev kendi öğelerinin adımlarını bildirir (önizleme görevin ilk öğesinden)
+            callbacks = []
+            for offset, (job, i) in enumerate(chunk):
+                progress = job.get("progress")
+                if progress is None or (offset > 0 and chunk[offset - 1][0] is job):
+                    continue
+                outputs = [index for other, index in chunk if other is job]
+                progress.set("output", outputs[0], job["num_outputs"], span=len(outputs))
+                callbacks.append(progress.callback(offset))
+
+            def split(step, chunk=chunk):
+                # Kesilen öğelerin boşa gidecek adımları ile kalanların tekrarlanacak adımları
+                dropped = sum(1 for job, _ in chunk if interrupted(job))
+                return (len(chunk) - dropped) * step < dropped * (num_inference_steps - step)
+
+            try:
+                images = process_batch(
+                    pipe=model,
+                    images=[job["init_image"] for job, _ in chunk],
+                    mask_images=[job["mask_image"] for job, _ in chunk],
+                    prompts=[job["prompt"] for job, _ in chunk],
+                    negative_prompts=[job["negative_prompt"] for job, _ in chunk],
+                    guidance_scale=guidance_scale,
+                    num_inference_steps=num_inference_steps,
+                    seeds=[job["seed"] + i for job, i in chunk],
+                    callback=combine_callbacks(callbacks, split=split),
+                )
+
+                # Kodlama, sonraki toplu öğelerin çıkarımıyla paralel başlar
+                for (job, i), result_image in zip(chunk, images):
+                    if not interrupted(job):
+                        job["sink"].add(i, result_image)
+            except BatchSplit:
+                # Kalan öğeler sıranın başına döner; kesilenler döngü başında atılır
+                logger.info(f"Toplu işlem kesilen görevler nedeniyle bölündü ({width}x{height})")
+                items = chunk + items
+            except Exception as e:
+                for job, _ in chunk:
+                    if job["error"] is None and not interrupted(job):
+                        job["error"] = e
+
+        # Görevleri tamamla (kalan yazmalar bitince completed olurlar)
+        for job in group:
+            if interrupted(job):
+                mark_failed(job["task_id"], TaskInterrupted(job["progress"].interrupted), job["task_store"])
+                continue
+            if job["error"] is not None:
+                fail(job["task_id"], job["error"], job["task_store"])
+                continue
+
+            job["sink"].close()
+
+    return device_failed
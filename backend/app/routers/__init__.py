@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 from .inpainting import router as inpainting_router
 from .license import router as license_router
+from .admin import router as admin_router
 
 api_router = APIRouter()
 api_router.include_router(inpainting_router)
-api_router.include_router(license_router)
\ No newline at end of file
+api_router.include_router(license_router)
+api_router.include_router(admin_router)
\ No newline at end of file
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from typing import Dict, Any
+import hmac
+import logging
+from app.config import settings
+
+# Bu endpoint'ler sadece admin erişimi içindir: geliştirme modunda açıktır,
+# aksi halde admin_token ayarlanmışsa X-Admin-Token başlığı gerekir.
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    responses={404: {"description": "Not found"}},
+)
+
+logger = logging.getLogger(__name__)
+
+def require_admin(request: Request):
+    """İsteğin admin yetkisi yoksa 403 fırlatır"""
+    if settings.development_mode:
+        return
+    token = request.headers.get("X-Admin-Token", "")
+    if not settings.admin_token or not hmac.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Admin yetkisi gereklidir")
+
+@router.get("/autotune", response_model=Dict[str, Any])
+async def get_autotune_status(request: Request):
+    """Otomatik ayarın durumunu ve cihazlara uygulanan profilleri döndürür (Sadece admin)"""
+    require_admin(request)
+    return request.app.state.autotuner.stats()
+
+@router.post("/autotune", response_model=Dict[str, Any], status_code=202)
+async def retune(request: Request):
+    """
+    Çalışan model kopyaları için ayarları arka planda yeniden ölçer ve kaydeder
+    (Sadece admin). Ölçüm sırasında ilgili cihazdaki kopyalar yeni iş almaz.
+    """
+    require_admin(request)
+    executor = getattr(request.app.state, "executor", None)
+    if executor is None or not executor.healthy():
+        raise HTTPException(status_code=503, detail="Model henüz hazır değil", headers={"Retry-After": "10"})
+
+    autotuner = request.app.state.autotuner
+    if not autotuner.retune(executor):
+        return JSONResponse(status_code=409, content=dict(autotuner.stats(), detail="Ayar ölçümü zaten sürüyor"))
+    logger.info("Yeniden ayarlama başlatıldı")
+    return autotuner.stats()
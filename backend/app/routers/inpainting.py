@@ -1,12 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
+import asyncio
 import logging
+import json
 import uuid
 import time
 import os
 from app.models.inpainting import InpaintingResult
-from app.services.inpainting_service import process_inpainting
+from app.services.inpainting_service import QueueFullError
+from app.services.result_cache import result_cache_key, pipeline_fingerprint, ACTIVE_STATUSES
+from app.services.progress import INTERRUPT_MESSAGES
+from app.config import settings
+from app.utils.image_utils import OUTPUT_FORMATS
+from app.utils.security import sign_image_url, verify_image_signature, sign_events_url, verify_events_signature
 
 router = APIRouter(
     prefix="/inpaint",
@@ -15,11 +23,90 @@ router = APIRouter(
 )
 
 logger = logging.getLogger(__name__)
-active_tasks = {}
+
+# Çıktı dosyaları görev ID'si ile adlandırılır ve hiç değişmez
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+# İlerleme akışında görev durumunun depodan yeniden okunma aralığı ve boşta kalma sinyali (saniye)
+EVENTS_POLL_SECONDS = 1.0
+EVENTS_KEEPALIVE_SECONDS = 15.0
+
+def image_urls(task_id, images):
+    """
+    Görev kaydındaki görüntüleri API yanıtındaki URL listesine dönüştürür. Adresler
+    imzalıdır; lisans başlığı olmadan (ör. <img src>) kullanılabilirler.
+    """
+    if not images:
+        return images
+    return [
+        {
+            "url": f"/inpaint/{task_id}/images/{i}?sig={sign_image_url(task_id, i)}",
+            "media_type": image["media_type"],
+            "seed": image["seed"],
+            "prompt": image["prompt"]
+        }
+        for i, image in enumerate(images)
+    ]
+
+def events_url(task_id):
+    """Görevin imzalı ilerleme akışı adresi; EventSource lisans başlığı olmadan kullanabilir"""
+    return f"/inpaint/{task_id}/events?sig={sign_events_url(task_id)}"
+
+def queue_info(executor, task_id):
+    """Bekleyen görevin kuyruk sırasını ve tahmini başlama zamanını döndürür"""
+    if executor is None:
+        return None, None
+    position = executor.queue_position(task_id)
+    if position is None:
+        # Görev başka bir işçinin kuyruğunda veya kuyruktan yeni çıkmış olabilir
+        return None, None
+    return position, round(time.time() + executor.estimate_wait(position - 1), 1)
+
+def sse_event(event, data):
+    """Server-Sent Events biçiminde tek bir olay"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def parse_range(range_header, size):
+    """
+    Tek aralıklı 'bytes=start-end' başlığını (start, end) olarak çözer (end dahil).
+    Başlık geçersizse None, aralık karşılanamıyorsa ValueError döner.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+
+    start_str, _, end_str = spec.strip().partition("-")
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+        else:
+            # Son N bayt
+            start = max(0, size - int(end_str))
+            end = size - 1
+    except ValueError:
+        return None
+
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Aralık karşılanamıyor")
+    return start, end
+
+def iter_file_range(path, start, end):
+    """Dosyanın [start, end] aralığını parça parça okur"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
 
 @router.post("/", response_model=InpaintingResult)
 async def inpaint(
-    background_tasks: BackgroundTasks,
     request: Request,
     image: UploadFile = File(...),
     mask: UploadFile = File(...),
@@ -29,13 +116,58 @@ async def inpaint(
     num_inference_steps: int = Form(30),
     seed: int = Form(-1),
     num_outputs: int = Form(1),
+    output_format: str = Form("png"),
+    output_quality: int = Form(90),
+    png_compress_level: int = Form(6),
+    preview_every: int = Form(0),
+    deadline_ms: int = Form(0),
 ):
-    """Inpainting işlemini asenkron olarak başlatma"""
+    """
+    Inpainting işlemini asenkron olarak başlatma.
+    output_format: png, jpeg, webp (kayıplı) veya webp_lossless. output_quality JPEG ve
+    WebP için kalite (1-100), png_compress_level PNG sıkıştırma düzeyidir (0-9).
+    preview_every > 0 ise ilerleme akışında bu kadar adımda bir latent önizlemesi gönderilir.
+    deadline_ms > 0 ise görev istekten itibaren bu süre içinde bitmezse durdurulur
+    ve timed_out olarak kaydedilir.
+    """
+    received_at = time.time()
     model = request.app.state.model
-    config = request.app.state.config
+    executor = getattr(request.app.state, "executor", None)
+    task_store = request.app.state.task_store
     
-    if model is None:
+    if model is None or executor is None:
+        model_loader = getattr(request.app.state, "model_loader", None)
+        if model_loader is not None and model_loader.state in ("loading", "tuning", "warming"):
+            # Model arka planda yükleniyor; istemci kısa süre sonra tekrar denemeli
+            raise HTTPException(
+                status_code=503,
+                detail=f"Model henüz hazır değil ({model_loader.state})",
+                headers={"Retry-After": "10"}
+            )
         raise HTTPException(status_code=503, detail="Model henüz yüklenmedi veya yükleme başarısız oldu")
+    if not executor.healthy():
+        raise HTTPException(status_code=503, detail="Kullanılabilir model kopyası kalmadı")
+    
+    # Çıktı formatı parametrelerini doğrula
+    output_format = output_format.lower()
+    if output_format == "jpg":
+        output_format = "jpeg"
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Geçersiz çıktı formatı. Desteklenenler: {', '.join(OUTPUT_FORMATS)}"
+        )
+    if not 1 <= output_quality <= 100:
+        raise HTTPException(status_code=400, detail="output_quality 1 ile 100 arasında olmalıdır")
+    if not 0 <= png_compress_level <= 9:
+        raise HTTPException(status_code=400, detail="png_compress_level 0 ile 9 arasında olmalıdır")
+    if preview_every < 0:
+        raise HTTPException(status_code=400, detail="preview_every negatif olamaz")
+    if preview_every:
+        preview_every = max(preview_every, settings.progress_preview_min_interval)
+    if deadline_ms < 0:
+        raise HTTPException(status_code=400, detail="deadline_ms negatif olamaz")
+    deadline = received_at + deadline_ms / 1000.0 if deadline_ms else None
     
     try:
         # Benzersiz bir ID oluştur
@@ -45,64 +177,322 @@ async def inpaint(
         image_data = await image.read()
         mask_data = await mask.read()
         
-        # Durumu güncelle
-        active_tasks[task_id] = {
-            "status": "pending",
-            "created_at": time.time(),
-            "params": {
-                "prompt": prompt,
-                "negative_prompt": negative_prompt,
-                "guidance_scale": guidance_scale,
-                "num_inference_steps": num_inference_steps,
-                "seed": seed,
-                "num_outputs": num_outputs,
-            }
+        params = {
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "guidance_scale": guidance_scale,
+            "num_inference_steps": num_inference_steps,
+            "seed": seed,
+            "num_outputs": num_outputs,
+            "output_format": output_format,
         }
         
-        # Arkaplan görevi olarak inpainting işlemini başlat
-        background_tasks.add_task(
-            process_inpainting, 
-            model=model,
-            config=config,
-            task_id=task_id, 
-            image_data=image_data, 
-            mask_data=mask_data, 
-            prompt=prompt, 
-            negative_prompt=negative_prompt, 
-            guidance_scale=guidance_scale, 
-            num_inference_steps=num_inference_steps, 
-            seed=seed, 
-            num_outputs=num_outputs,
-            active_tasks=active_tasks
-        )
+        # Durumu güncelle
+        await run_in_threadpool(task_store.create, task_id, params)
+        
+        # Sabit seed'li istekler önbellekten veya çalışan aynı görevden karşılanır
+        result_cache = getattr(request.app.state, "result_cache", None)
+        cache_key = None
+        on_complete = None
+        if result_cache is not None and seed != -1:
+            pipeline = pipeline_fingerprint([replica.config for replica in executor.pool.replicas])
+            cache_key = result_cache_key(
+                image_data, mask_data, settings.model_id, pipeline,
+                output_quality=output_quality, png_compress_level=png_compress_level, **params
+            )
+            outcome, value = await run_in_threadpool(result_cache.claim, cache_key, task_id, task_store)
+            
+            if outcome == "hit":
+                await run_in_threadpool(task_store.complete, task_id, value)
+                return InpaintingResult(
+                    id=task_id,
+                    status="completed",
+                    images=image_urls(task_id, value)
+                )
+            
+            if outcome == "attach":
+                await run_in_threadpool(task_store.delete, task_id)
+                # İstemci bekleyenlere eklenir; çalışan görev son bekleyen iptal edene kadar sürer
+                executor.attach(value, getattr(request.state, "license_key", "anonymous"))
+                queue_position, estimated_start = queue_info(executor, value)
+                return InpaintingResult(
+                    id=value,
+                    status="pending" if queue_position is not None else "processing",
+                    queue_position=queue_position,
+                    estimated_start=estimated_start,
+                    events_url=events_url(value)
+                )
+            
+            on_complete = lambda images: result_cache.store(cache_key, task_id, images)
         
+        # Görevi lisansın kuyruğuna ekle (kuyruk dolu veya plan sınırı aşıldıysa 429 döndürülür)
+        try:
+            executor.submit(
+                task_id,
+                task_store,
+                license_key=getattr(request.state, "license_key", "anonymous"),
+                plan=getattr(request.state, "plan", None),
+                image_data=image_data, 
+                mask_data=mask_data, 
+                prompt=prompt, 
+                negative_prompt=negative_prompt, 
+                guidance_scale=guidance_scale, 
+                num_inference_steps=num_inference_steps, 
+                seed=seed, 
+                num_outputs=num_outputs,
+                output_format=output_format,
+                output_quality=output_quality,
+                png_compress_level=png_compress_level,
+                preview_every=preview_every,
+                deadline=deadline,
+                on_complete=on_complete,
+            )
+        except QueueFullError as e:
+            await run_in_threadpool(task_store.delete, task_id)
+            if cache_key is not None:
+                result_cache.release(cache_key, task_id)
+            raise HTTPException(
+                status_code=429,
+                detail=e.message,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        
+        queue_position, estimated_start = queue_info(executor, task_id)
         return InpaintingResult(
             id=task_id,
-            status="pending"
+            status="pending",
+            queue_position=queue_position,
+            estimated_start=estimated_start,
+            events_url=events_url(task_id)
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Inpainting işlemi başlatılırken hata: {str(e)}")
         raise HTTPException(status_code=500, detail=f"İşlem başlatılamadı: {str(e)}")
 
 @router.get("/{task_id}", response_model=InpaintingResult)
-async def get_inpaint_result(task_id: str):
+async def get_inpaint_result(task_id: str, request: Request):
     """Belirli bir inpainting görevinin sonucunu alma"""
-    if task_id not in active_tasks:
+    task_store = request.app.state.task_store
+    task_info = await run_in_threadpool(task_store.get, task_id)
+    
+    if task_info is None:
         raise HTTPException(status_code=404, detail="Belirtilen ID ile bir görev bulunamadı")
     
-    task_info = active_tasks[task_id]
+    queue_position, estimated_start = None, None
+    if task_info["status"] == "pending":
+        queue_position, estimated_start = queue_info(getattr(request.app.state, "executor", None), task_id)
     
-    # Sonucu döndür
+    # Sonucu döndür (görüntüler yalnızca URL olarak)
     return InpaintingResult(
         id=task_id,
         status=task_info["status"],
-        images=task_info.get("images"),
-        error=task_info.get("error")
+        images=image_urls(task_id, task_info.get("images")),
+        error=task_info.get("error"),
+        queue_position=queue_position,
+        estimated_start=estimated_start,
+        events_url=events_url(task_id) if task_info["status"] in ACTIVE_STATUSES else None
+    )
+
+@router.delete("/{task_id}", response_model=InpaintingResult)
+async def cancel_inpaint(task_id: str, request: Request):
+    """
+    Görevi iptal etme. Kuyrukta bekleyen görev hemen cancelled olarak kaydedilir;
+    çalışan görev bir sonraki denoising adımında veya parçalar arasında durur ve
+    yanıt o anki durumunu (processing) döndürür. Bitmiş görevler için 409 döner.
+    Aynı sonucu bekleyen başka istemciler (sonuç önbelleği) varsa görev sürer;
+    görevi beklemeyen lisansların isteği 403 ile reddedilir. Görev başka bir
+    uvicorn işçisindeyse iptal isteği görev deposuna kaydedilir ve görevi
+    çalıştıran işçi bir sonraki kontrol noktasında uygular (202).
+    """
+    task_store = request.app.state.task_store
+    executor = getattr(request.app.state, "executor", None)
+    task_info = await run_in_threadpool(task_store.get, task_id)
+    
+    if task_info is None:
+        raise HTTPException(status_code=404, detail="Belirtilen ID ile bir görev bulunamadı")
+    if task_info["status"] not in ACTIVE_STATUSES or executor is None:
+        raise HTTPException(status_code=409, detail=f"Görev zaten sonlanmış ({task_info['status']})")
+    
+    status = task_info["status"]
+    license_key = getattr(request.state, "license_key", "anonymous")
+    try:
+        cancelled = executor.cancel(task_id, license_key=license_key)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if cancelled:
+        # Görev kuyruktan çıkarıldı; çıkarım hiç başlamadı
+        status = "cancelled"
+        await run_in_threadpool(task_store.interrupt, task_id, status, INTERRUPT_MESSAGES[status])
+    elif cancelled is None:
+        task_info = await run_in_threadpool(task_store.get, task_id) or task_info
+        if task_info["status"] not in ACTIVE_STATUSES:
+            # Görev durum okunduktan sonra bitti; iptal edilecek bir şey yok
+            raise HTTPException(status_code=409, detail=f"Görev zaten sonlanmış ({task_info['status']})")
+        # Görev bu işçide değil (depoyu paylaşan başka bir işçide bekliyor veya çalışıyor)
+        await run_in_threadpool(task_store.request_cancel, task_id, license_key)
+        logger.info(f"Görev {task_id} başka bir işçide; iptal isteği kaydedildi")
+        return JSONResponse(
+            status_code=202,
+            content=InpaintingResult(id=task_id, status=task_info["status"]).dict()
+        )
+    
+    logger.info(f"Görev {task_id} için iptal istendi ({status})")
+    return InpaintingResult(id=task_id, status=status)
+
+@router.get("/{task_id}/events")
+async def stream_inpaint_events(task_id: str, request: Request, sig: str = ""):
+    """
+    Görevin ilerlemesini Server-Sent Events olarak akıtır. Olaylar:
+    queue (kuyruk sırası ve tahmini başlama), status, progress (adım N/M, parça i/k,
+    ETA ve istenmişse latent önizlemesi), son olarak completed (görüntü URL'leri),
+    failed, cancelled veya timed_out. Akış görev bittiğinde kapanır. Lisans
+    doğrulamasından geçmez; görev yanıtındaki imzalı adres (sig) gereklidir.
+    """
+    if not verify_events_signature(task_id, sig):
+        raise HTTPException(status_code=403, detail="Geçersiz ilerleme akışı adresi")
+    
+    task_store = request.app.state.task_store
+    progress_hub = request.app.state.progress_hub
+    executor = getattr(request.app.state, "executor", None)
+    
+    task_info = await run_in_threadpool(task_store.get, task_id)
+    if task_info is None:
+        raise HTTPException(status_code=404, detail="Belirtilen ID ile bir görev bulunamadı")
+    
+    async def events():
+        subscriber = progress_hub.subscribe(task_id)
+        info = task_info
+        status = None
+        last_queue = None
+        last_sent = time.monotonic()
+        try:
+            while True:
+                if info is None:
+                    yield sse_event("failed", {"id": task_id, "error": "Görev artık mevcut değil"})
+                    return
+                
+                if info["status"] != status:
+                    status = info["status"]
+                    yield sse_event("status", {"id": task_id, "status": status})
+                    last_sent = time.monotonic()
+                
+                if status == "completed":
+                    yield sse_event("completed", {"id": task_id, "images": image_urls(task_id, info.get("images"))})
+                    return
+                if status in ("failed", "cancelled", "timed_out"):
+                    yield sse_event(status, {"id": task_id, "error": info.get("error")})
+                    return
+                
+                if status == "pending":
+                    queue_position, estimated_start = queue_info(executor, task_id)
+                    if queue_position != last_queue:
+                        last_queue = queue_position
+                        yield sse_event("queue", {"queue_position": queue_position, "estimated_start": estimated_start})
+                        last_sent = time.monotonic()
+                
+                # Olay gelmezse durum depodan yeniden okunur (görev başka bir işçide olabilir)
+                try:
+                    event = await asyncio.wait_for(subscriber[1].get(), timeout=EVENTS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    event = None
+                
+                if event is not None and event["type"] == "progress":
+                    yield sse_event("progress", event)
+                    last_sent = time.monotonic()
+                    continue
+                
+                if time.monotonic() - last_sent > EVENTS_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                
+                info = await run_in_threadpool(task_store.get, task_id)
+        finally:
+            progress_hub.unsubscribe(task_id, subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx'in akışı tamponlamaması için
+            "X-Accel-Buffering": "no",
+        }
     )
 
+@router.get("/{task_id}/images/{index}")
+async def get_inpaint_image(task_id: str, index: int, request: Request, sig: str = ""):
+    """
+    Görevin index numaralı çıktı görüntüsünü dosya olarak döndürür. Lisans
+    doğrulamasından geçmez ve kullanım sayılmaz; görev yanıtındaki imzalı
+    adres (sig) gereklidir.
+    """
+    if not verify_image_signature(task_id, index, sig):
+        raise HTTPException(status_code=403, detail="Geçersiz görüntü adresi")
+    
+    task_store = request.app.state.task_store
+    task_info = await run_in_threadpool(task_store.get, task_id)
+    
+    if task_info is None:
+        raise HTTPException(status_code=404, detail="Belirtilen ID ile bir görev bulunamadı")
+    
+    images = task_info.get("images") or []
+    if task_info["status"] != "completed" or not 0 <= index < len(images):
+        raise HTTPException(status_code=404, detail="Belirtilen görüntü bulunamadı")
+    
+    image = images[index]
+    etag = f'"{image["etag"]}"'
+    
+    # Kota aşımında en uzun süredir erişilmeyen görevler silinir
+    janitor = getattr(request.app.state, "janitor", None)
+    if janitor is not None:
+        janitor.touch(task_id)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    # Dosyanın teslimi nginx'e bırakılabilir (Range ve sendfile nginx tarafından yapılır)
+    if settings.output_x_accel_redirect:
+        # Önbellekteki çıktılar çıktı klasörünün alt klasöründedir
+        relative_path = os.path.relpath(image["path"], settings.output_dir).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = f"{settings.output_x_accel_prefix}/{relative_path}"
+        return Response(media_type=image["media_type"], headers=headers)
+    
+    if not os.path.exists(image["path"]):
+        raise HTTPException(status_code=404, detail="Görüntü dosyası artık mevcut değil")
+    
+    range_header = request.headers.get("range")
+    # If-Range, görüntü değişmişse tüm dosyanın gönderilmesini ister
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        size = image["size"]
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                iter_file_range(image["path"], start, end),
+                status_code=206,
+                media_type=image["media_type"],
+                headers=headers
+            )
+    
+    return FileResponse(image["path"], media_type=image["media_type"], headers=headers)
+
 @router.get("/", response_model=List[str])
-async def list_active_tasks():
+async def list_active_tasks(request: Request):
     """Aktif görevlerin listesini alma"""
     # Sadece ID'leri döndür
-    return list(active_tasks.keys())
\ No newline at end of file
+    return await run_in_threadpool(request.app.state.task_store.list_ids)
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import platform
+import threading
+
+import torch
+
+from app.utils.auto_device_detection import get_device_info, select_device, synthetic_inference
+from app.utils.cpu_engine import inference_context, set_attention, physical_cores
+from app.utils.variations import is_out_of_memory
+
+logger = logging.getLogger(__name__)
+
+# config/config.json içindeki "autotune" bölümünün varsayılanları.
+# Boş aday listeleri cihaza göre seçilir (bkz. CANDIDATE_DEFAULTS)
+AUTOTUNE_DEFAULTS = {
+    "enabled": False,
+    "profile_path": "config/autotune_profiles.json",
+    "steps": 2,  # Her ölçümdeki denoising adımı sayısı
+    "tile_sizes": [],
+    "batch_sizes": [1, 2, 4],
+    "attention": ["sdpa", "sliced", "max"],
+    "max_resolutions": [],  # Parçalamadan işlenmesi denenecek tam kare boyutları
+}
+
+# Cihaza göre aday parça boyutları ve tam kare çözünürlükleri
+CANDIDATE_DEFAULTS = {
+    "cuda": {"tile_sizes": [512, 768], "max_resolutions": [768, 1024]},
+    "cpu": {"tile_sizes": [256, 384, 512], "max_resolutions": [512, 768]},
+}
+
+def load_autotune_settings(path):
+    """config.json'daki autotune bölümünü varsayılanlarla birleştirerek okur"""
+    autotune = dict(AUTOTUNE_DEFAULTS)
+    if not path or not os.path.exists(path):
+        return autotune
+    try:
+        with open(path, "r") as f:
+            autotune.update(json.load(f).get("autotune", {}))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Otomatik ayar ayarları okunamadı ({path}): {e}")
+    return autotune
+
+def cpu_model_name():
+    """İşlemci modelinin adı (Linux'ta /proc/cpuinfo, diğerlerinde platform bilgisi)"""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+def hardware_fingerprint(system_info, config, model_id):
+    """
+    Ölçülen profilin geçerli olduğu donanım ve yazılımın özeti. Cihaz, GPU/CPU
+    modeli, bellek, kullanılabilir çekirdekler, torch sürümü, model, veri tipi ve
+    CPU motoru modu değişirse profil yeniden ölçülür.
+    """
+    cpu_engine = config.get("cpu_engine", {})
+    parts = {
+        "device": system_info["device"],
+        "gpu_name": system_info.get("gpu_name") if system_info["device"] == "cuda" else None,
+        "gpu_vram_gb": round(system_info.get("gpu_vram_gb", 0), 1) if system_info["device"] == "cuda" else None,
+        "cpu": cpu_model_name(),
+        "cpu_cores": physical_cores(system_info),
+        "ram_gb": round(system_info["ram_total_gb"]),
+        "torch": torch.__version__,
+        "cuda": system_info.get("cuda_version"),
+        "model_id": model_id,
+        "dtype": str(config["torch_dtype"]),
+        "cpu_engine": [cpu_engine.get("mode"), cpu_engine.get("bf16_autocast"), cpu_engine.get("compile")],
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+
+def thread_candidates(system_info):
+    """Denenecek iş parçacığı sayıları: fiziksel çekirdekler, yarısı ve tüm mantıksal çekirdekler"""
+    physical = physical_cores(system_info)
+    logical = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else system_info["cpu_count_logical"]
+    return sorted({physical, max(1, physical // 2), logical}, reverse=True)
+
+def measure(pipe, config, size, batch_size=1, steps=2):
+    """
+    size x size boyutunda batch_size görüntülük sentetik çağrının süresi (saniye).
+    İlk çağrı ısıtma sayılır ve ölçülmez. Bellek yetmezse veya ayar bu cihazda
+    çalışmıyorsa None döner.
+    """
+    try:
+        with inference_context(config):
+            synthetic_inference(pipe, size, steps, batch_size)
+            started = time.perf_counter()
+            synthetic_inference(pipe, size, steps, batch_size)
+            return time.perf_counter() - started
+    except Exception as e:
+        if is_out_of_memory(e):
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        else:
+            logger.warning(f"Ayar ölçümü başarısız ({size}px, toplu boyut {batch_size}): {e}")
+        return None
+
+def tune_profile(pipe, config, system_info, autotune=None, tune_threads=True):
+    """
+    Aday ayarları sırayla ölçerek en hızlı profili seçer: iş parçacığı sayısı
+    (yalnızca CPU), dikkat hesaplaması, parça boyutu, parça toplu boyutu ve
+    parçalamadan işlenebilecek en büyük tam kare. Her aşamada önceki aşamanın
+    en iyisi sabit tutulur. Karşılaştırma çıktı pikseli başına süre ile yapılır;
+    parçalarda örtüşme payı işlenen alandan düşülür.
+    """
+    autotune = dict(AUTOTUNE_DEFAULTS, **(autotune or {}))
+    device = config["device"]
+    candidates = CANDIDATE_DEFAULTS.get(device, CANDIDATE_DEFAULTS["cpu"])
+    settings = config["inpainting_settings"]
+    steps = max(1, autotune["steps"])
+    measurements = {}
+
+    def cost(key, size, batch_size=1, overlap=0):
+        seconds = measure(pipe, config, size, batch_size, steps)
+        measurements[key] = round(seconds, 4) if seconds is not None else None
+        if seconds is None:
+            return None
+        return seconds / (batch_size * (size - overlap) ** 2)
+
+    def best_of(results):
+        results = [(value, choice) for choice, value in results if value is not None]
+        return min(results, key=lambda result: result[0]) if results else None
+
+    tile_size = settings["tile_size"]
+
+    num_threads = None
+    if device == "cpu" and tune_threads:
+        results = []
+        for count in thread_candidates(system_info):
+            torch.set_num_threads(count)
+            results.append((count, cost(f"threads={count}", tile_size)))
+        best = best_of(results)
+        num_threads = best[1] if best else torch.get_num_threads()
+        torch.set_num_threads(num_threads)
+
+    results = []
+    for attention in autotune["attention"]:
+        if set_attention(pipe, attention) == attention:
+            results.append((attention, cost(f"attention={attention}", tile_size)))
+    best = best_of(results)
+    if best is None:
+        raise RuntimeError("Hiçbir dikkat ayarı ölçülemedi")
+    attention = best[1]
+    set_attention(pipe, attention)
+
+    tile_sizes = autotune["tile_sizes"] or candidates["tile_sizes"]
+    results = [
+        (size, cost(f"tile={size}", size, overlap=size // 8))
+        for size in sorted(set(tile_sizes)) if size % 8 == 0
+    ]
+    best = best_of(results)
+    if best is not None:
+        tile_size = best[1]
+    tile_cost = best[0] if best is not None else None
+
+    # Toplu boyut, bellek yetmeyene veya hızlanma durana kadar artırılır
+    tile_batch_size = 1
+    for batch_size in sorted(size for size in set(autotune["batch_sizes"]) if size > 1):
+        value = cost(f"tile={tile_size}x{batch_size}", tile_size, batch_size, overlap=tile_size // 8)
+        if value is None or tile_cost is None or value >= tile_cost:
+            break
+        tile_batch_size, tile_cost = batch_size, value
+
+    # Tam kare, piksel başına parçalamadan daha ucuz olduğu en büyük boyuta kadar parçalanmaz
+    tiling_required = True
+    max_resolution = settings["max_resolution"]
+    for size in sorted(set(autotune["max_resolutions"] or candidates["max_resolutions"])):
+        value = cost(f"full={size}", size)
+        if value is None or (tile_cost is not None and value > tile_cost):
+            break
+        tiling_required, max_resolution = False, size
+
+    return {
+        "num_threads": num_threads,
+        "attention": attention,
+        "tile_size": tile_size,
+        "tile_overlap": tile_size // 8,
+        "tile_batch_size": tile_batch_size,
+        "tiling_required": tiling_required,
+        "max_resolution": max_resolution,
+        "measurements": measurements,
+    }
+
+def apply_profile(pipe, config, profile, tune_threads=True):
+    """Ölçülmüş profili pipeline'a ve model yapılandırmasına uygular"""
+    attention = set_attention(pipe, profile["attention"])
+    if tune_threads and profile.get("num_threads"):
+        torch.set_num_threads(profile["num_threads"])
+    config["inpainting_settings"].update({
+        key: profile[key]
+        for key in ("tile_size", "tile_overlap", "tile_batch_size", "tiling_required", "max_resolution")
+    })
+    if "cpu_engine" in config:
+        config["cpu_engine"]["attention"] = attention
+        if tune_threads and profile.get("num_threads"):
+            config["cpu_engine"]["num_threads"] = profile["num_threads"]
+
+class Autotuner:
+    """
+    Başlangıçta sabit eşikler yerine donanımda ölçülen ayarları kullanan servis.
+    Her cihaz için donanım parmak izine göre kayıtlı profil varsa uygulanır;
+    yoksa aday ayarlar ölçülür, en hızlısı profile_path'e kaydedilir ve
+    sonraki başlangıçlarda yeniden kullanılır. retune() ile istek üzerine
+    (ör. admin endpoint'inden) çalışan modeller yeniden ölçülür.
+    """
+
+    def __init__(self, model_id, settings=None):
+        self.model_id = model_id
+        self.settings = dict(AUTOTUNE_DEFAULTS, **(settings or {}))
+        self.enabled = bool(self.settings["enabled"])
+        self.path = self.settings["profile_path"]
+        self.state = "idle"
+        self.error = None
+        self.last_run = None
+        # Cihaz başına uygulanan profil: {"fingerprint", "source", ...}
+        self.current = {}
+        self._lock = threading.Lock()
+        self._profiles = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ayar profilleri okunamadı ({self.path}): {e}")
+            return {}
+
+    def _save(self, fingerprint, profile):
+        """Profili parmak izine göre kaydeder (atomik yazma)"""
+        with self._lock:
+            self._profiles[fingerprint] = profile
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._profiles, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def prepare(self, model, config, device, tune_threads=True, force=False):
+        """
+        Cihazın profilini uygular; kayıtlı profil yoksa (veya force ise) ölçer ve
+        kaydeder. Uygulanan profili döndürür.
+        """
+        system_info = select_device(get_device_info(), device)
+        fingerprint = hardware_fingerprint(system_info, config, self.model_id)
+        profile = None if force else self._profiles.get(fingerprint)
+        if profile is not None and tune_threads and profile["device"] == "cpu" and not profile.get("num_threads"):
+            # Profil çekirdekleri bölünmüş kopyalarla ölçülmüş; iş parçacığı sayısı eksik
+            profile = None
+        source = "stored"
+
+        if profile is None:
+            logger.info(f"{device} için ayarlar ölçülüyor (parmak izi: {fingerprint})")
+            started = time.perf_counter()
+            profile = tune_profile(model, config, system_info, self.settings, tune_threads)
+            profile.update(
+                fingerprint=fingerprint,
+                device=system_info["device"],
+                created_at=time.time(),
+                tuning_seconds=round(time.perf_counter() - started, 2)
+            )
+            self._save(fingerprint, profile)
+            source = "measured"
+
+        apply_profile(model, config, profile, tune_threads)
+        config["autotune"] = {"fingerprint": fingerprint, "source": source, "created_at": profile["created_at"]}
+        self.current[device] = dict(
+            {key: value for key, value in profile.items() if key != "measurements"},
+            source=source
+        )
+        logger.info(f"{device} ayar profili uygulandı ({source}): {self.current[device]}")
+        return profile
+
+    def retune(self, executor):
+        """
+        Çalışan model kopyalarını arka planda yeniden ölçer. Her cihazda ölçüm,
+        o cihazdaki kopyalar ellerindeki işleri bitirdikten sonra yapılır. Ölçüm
+        zaten sürüyorsa False döner.
+        """
+        with self._lock:
+            if self.state == "tuning":
+                return False
+            self.state = "tuning"
+            self.error = None
+        thread = threading.Thread(target=self._retune_worker, args=(executor,), name="autotuner", daemon=True)
+        thread.start()
+        return True
+
+    def _retune_worker(self, executor):
+        try:
+            results = executor.run_exclusive(
+                lambda replica: self.prepare(
+                    replica.model, replica.config, replica.device,
+                    tune_threads=replica.cpu_cores is None, force=True
+                )
+            )
+            errors = [f"{device}: {result}" for device, result in results.items() if isinstance(result, Exception)]
+            if errors:
+                raise RuntimeError("; ".join(errors))
+            self.state = "idle"
+        except Exception as e:
+            logger.error(f"Yeniden ayarlama başarısız: {e}")
+            self.error = str(e)
+            self.state = "failed"
+        finally:
+            self.last_run = time.time()
+
+    def stats(self):
+        with self._lock:
+            profiles = len(self._profiles)
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "error": self.error,
+            "last_run": self.last_run,
+            "profile_path": self.path,
+            "stored_profiles": profiles,
+            "current": self.current,
+        }
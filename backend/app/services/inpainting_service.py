@@ -0,0 +1,479 @@
+import math
+import queue
+from collections import Counter
+import threading
+import time
+import logging
+
+from app.models.inpainting import process_inpainting_batch, mark_failed
+from app.services.scheduler import FairQueue, QueueFullError
+from app.services.progress import TaskProgress
+from app.services.replica_pool import ReplicaPool
+from app.services.preprocessing import Preprocessor
+from app.utils.cpu_engine import inference_context
+
+logger = logging.getLogger(__name__)
+
+def job_cost(job):
+    """Görevin maliyeti: üretilecek görüntü sayısı x adım sayısı (30 adım = 1 birim)"""
+    return max(1, job.get("num_outputs", 1)) * max(1, job.get("num_inference_steps", 30)) / 30.0
+
+class InferenceExecutor:
+    """
+    Model kopyalarını sahiplenen ve görevleri sınırlı bir kuyruktan işleyen
+    çıkarım yürütücüsü. Pipeline çağrıları event loop dışında çalışır, böylece
+    API istekleri model çalışırken de yanıt vermeye devam eder.
+
+    Görevler lisanslar arası ağırlıklı adil kuyruktan (FairQueue) alınır;
+    plan ayarları hız sınırını, aynı anda çalışan görev sayısını ve önceliği
+    belirler. Dağıtıcı iş parçacığı her toplu işi bekleyen işi en az olan model
+    kopyasına (ReplicaPool) gönderir; her kopyanın kendi iş parçacığı vardır.
+    Boşta kalan veya beklenmeyen ya da cihaz kaynaklı (bellek yetersizliği, CUDA)
+    hata veren kopyalar sağlık kontrolünden geçirilir, bozulan kopyalar tahliye
+    edilir ve bekleyen işleri diğerlerine aktarılır.
+
+    Görevler aşamalı bir hattan geçer: dağıtıcı kopyaya gönderdiği görevlerin
+    girdilerini (çözme, dönüştürme, maske planı) Preprocessor havuzunda
+    hazırlatır, böylece kopya bir görevi işlerken sıradaki prefetch_factor
+    görevin girdileri hazırlanır; çıktılar çıktı yazıcı havuzunda kodlanır.
+    Aşamalar arasındaki kuyruklar sınırlıdır (ön getirme sınırı, kopya kuyruk
+    derinliği). preprocess_workers = 0 ise girdiler çıkarım iş parçacığında hazırlanır.
+
+    Görevler cancel() ile iptal edilebilir: kuyruktaki görev hemen çıkarılır,
+    çalışan görev bir sonraki denoising adımında veya parçalar arasında durur.
+    İsteğe bağlı deadline (Unix zamanı) aynı noktalarda kontrol edilir.
+    """
+
+    def __init__(self, replicas, max_queue_depth=8, initial_job_seconds=30.0,
+                 batch_window_ms=0, max_batch_size=1, plan_settings=None, default_plan="basic",
+                 progress_hub=None, replica_queue_depth=2, replica_max_failures=2,
+                 health_check_interval=60.0, preprocess_workers=2, prefetch_factor=2):
+        self.pool = ReplicaPool(
+            replicas,
+            queue_depth=replica_queue_depth,
+            max_failures=replica_max_failures,
+            initial_seconds_per_cost=initial_job_seconds
+        )
+        # Çıkarımdan önce girdileri hazırlayan aşama (kopya başına prefetch_factor görev)
+        self.preprocessor = None
+        if preprocess_workers > 0:
+            self.preprocessor = Preprocessor(
+                num_workers=preprocess_workers,
+                max_prefetched=max(1, prefetch_factor) * len(self.pool.replicas)
+            )
+        # Boşta kalan kopyaların sağlık kontrolü aralığı (saniye, 0 = yalnızca hata sonrası)
+        self.health_check_interval = health_check_interval
+        self.max_queue_depth = max_queue_depth
+        # Mikro-toplama: ilk görevden sonra uyumlu görevler için beklenecek süre ve toplu öğe sınırı
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue = FairQueue(max_queue_depth, plan_settings, default_plan, on_take=self._on_take)
+        # Görev ilerlemesinin (adım, parça, ETA) yayınlandığı hub
+        self.progress_hub = progress_hub
+        self._thread = None
+        self._replica_threads = []
+        self._running = False
+        # Görev süresinin üstel hareketli ortalaması (Retry-After tahmini için)
+        self._avg_job_seconds = initial_job_seconds
+        self._completed = 0
+        # Çalışan görevlerin ilerleme nesneleri (iptal için) ve kuyruktan alınırken gelen iptaller
+        self._active = {}
+        self._interrupts = {}
+        # Kuyruktan alınmış, bitmemiş görevler (iptal kaydı yalnızca bunlar için tutulur)
+        self._dispatched = set()
+        # Görevi bekleyen istemciler: görev -> lisans başına bekleyen sayısı (sahibi ve bağlananlar)
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._cancelled = 0
+
+    def start(self):
+        """Dağıtıcı ve model kopyalarının iş parçacıklarını başlat"""
+        if self._thread is not None:
+            return
+        self._running = True
+        for replica in self.pool.replicas:
+            thread = threading.Thread(
+                target=self._replica_worker,
+                args=(replica,),
+                name=f"inference-replica-{replica.replica_id}",
+                daemon=True
+            )
+            thread.start()
+            self._replica_threads.append(thread)
+        self._thread = threading.Thread(target=self._worker, name="inference-executor", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Çıkarım yürütücüsü başlatıldı (maksimum kuyruk derinliği: {self.max_queue_depth}, "
+            f"model kopyaları: {', '.join(replica.device for replica in self.pool.replicas)})"
+        )
+
+    def stop(self, timeout=None):
+        """Yeni görev almayı bırak ve iş parçacıklarının bitmesini bekle"""
+        if self._thread is None:
+            return
+        self._running = False
+        # Kuyruktaki görevler dağıtıldıktan sonra dağıtıcı, kopyalar da kendi işlerini bitirince çıkar
+        self._queue.close()
+        self._thread.join(timeout)
+        self._thread = None
+        for replica in self.pool.replicas:
+            replica.jobs.put(None)
+        for thread in self._replica_threads:
+            thread.join(timeout)
+        self._replica_threads = []
+        if self.preprocessor is not None:
+            self.preprocessor.shutdown()
+        logger.info("Çıkarım yürütücüsü durduruldu")
+
+    def healthy(self):
+        """En az bir sağlıklı model kopyası varsa True"""
+        return self.pool.healthy_count() > 0
+
+    def run_exclusive(self, fn, timeout=None):
+        """
+        fn(kopya)'yı her cihazda bir kez, o cihazdaki tüm sağlıklı kopyalar önceki
+        işlerini bitirip beklerken çalıştırır (ağırlıkları paylaşan kopyalar bu
+        sırada iş almaz; ör. yeniden ayarlama için). {cihaz: sonuç veya hata} döndürür.
+        """
+        groups = {}
+        for replica in self.pool.replicas:
+            if replica.healthy:
+                groups.setdefault(replica.device, []).append(replica)
+
+        results = {}
+        waits = []
+        for device, replicas in groups.items():
+            done = threading.Event()
+
+            def action(device=device, replica=replicas[0], done=done):
+                try:
+                    results[device] = fn(replica)
+                except Exception as e:
+                    results[device] = e
+                finally:
+                    done.set()
+
+            barrier = threading.Barrier(len(replicas), action=action)
+            for replica in replicas:
+                replica.jobs.put(barrier)
+            waits.append((device, barrier, done))
+
+        deadline = time.monotonic() + timeout if timeout else None
+        for device, barrier, done in waits:
+            while not done.wait(1.0):
+                if barrier.broken or (deadline and time.monotonic() > deadline):
+                    barrier.abort()
+                    results.setdefault(device, RuntimeError("Model kopyaları beklenirken süre doldu veya kopya tahliye edildi"))
+                    break
+        return results
+
+    def estimate_wait(self, position=None):
+        """Verilen kuyruk sırasındaki bir görevin başlamasına kadar geçecek tahmini süre (saniye)"""
+        if position is None:
+            position = self._queue.qsize()
+        pending = position + self.pool.busy_count()
+        return pending * self._avg_job_seconds / max(1, self.pool.healthy_count())
+
+    def submit(self, task_id, task_store, license_key="anonymous", plan=None, **job):
+        """
+        Görevi lisansın kuyruğuna ekler. Kuyruk doluysa bloklamadan QueueFullError,
+        lisansın hız sınırı veya kuyruk payı aşıldıysa RateLimitedError fırlatır;
+        hata, istemcinin ne kadar sonra tekrar denemesi gerektiğini taşır.
+        """
+        if not self._running:
+            raise RuntimeError("Çıkarım yürütücüsü çalışmıyor")
+
+        with self._lock:
+            self._waiters[task_id] = Counter({license_key: 1})
+        try:
+            try:
+                self._queue.put_nowait((task_id, task_store, license_key, job), license_key, plan, job_cost(job))
+            except queue.Full:
+                retry_after = max(1, math.ceil(self.estimate_wait(self.max_queue_depth)))
+                raise QueueFullError(retry_after)
+        except QueueFullError:
+            with self._lock:
+                self._waiters.pop(task_id, None)
+            raise
+
+        return self._queue.qsize()
+
+    def attach(self, task_id, license_key="anonymous"):
+        """
+        Aynı sonucu bekleyen yeni bir istemciyi çalışan göreve bağlar (sonuç
+        önbelleği). Görev yürütücüde değilse (ör. az önce bittiyse) False döner.
+        """
+        with self._lock:
+            waiters = self._waiters.get(task_id)
+            if waiters is None:
+                return False
+            waiters[license_key] += 1
+            return True
+
+    def cancel(self, task_id, status="cancelled", license_key=None):
+        """
+        Görevi durdurur. Görev kuyrukta bekliyorsa çıkarılır ve True döner; çağıran
+        görevi kendisi sonlandırmalıdır. Görev dağıtılmış veya çalışıyorsa bir
+        sonraki kontrol noktasında durdurulur ve False döner. Görev yürütücüde
+        yoksa (ör. az önce bittiyse) None döner ve hiçbir şey kaydedilmez.
+
+        license_key verilirse istek görevi bekleyen istemcilerden birinin iptali
+        sayılır: görev yalnızca son bekleyen de ayrılınca durdurulur, o zamana
+        kadar False döner. Görevi beklemeyen lisanslar için PermissionError fırlatır.
+        """
+        if license_key is not None:
+            with self._lock:
+                waiters = self._waiters.get(task_id)
+                if waiters is not None:
+                    if license_key not in waiters:
+                        raise PermissionError("Görev bu lisansa ait değil")
+                    if waiters[license_key] > 0:
+                        waiters[license_key] -= 1
+                    if sum(waiters.values()) > 0:
+                        # Aynı sonucu bekleyen başka istemciler var
+                        return False
+
+        # Kuyruktan hiç alınmamış görev lisansın çalışan görev sayısına dahil değildir (task_done çağrılmaz)
+        item = self._queue.remove(lambda item: item[0] == task_id)
+        if item is not None:
+            with self._lock:
+                self._waiters.pop(task_id, None)
+                self._cancelled += 1
+            return True
+
+        with self._lock:
+            progress = self._active.get(task_id)
+            if progress is not None:
+                if progress.interrupted is None:
+                    progress.interrupt(status)
+                    self._cancelled += 1
+                return False
+            if task_id in self._dispatched:
+                # Görev kuyruktan alınmış ama henüz izlenmiyor; izlenmeye başlarken kesilir
+                if task_id not in self._interrupts:
+                    self._interrupts[task_id] = status
+                    self._cancelled += 1
+                return False
+        return None
+
+    def _on_take(self, item):
+        """Görev adil kuyruktan alındı (FairQueue kilidi altında çağrılır)"""
+        with self._lock:
+            self._dispatched.add(item[0])
+
+    def _finish(self, items):
+        """Görevlerin yürütücüdeki izleme kayıtlarını siler"""
+        with self._lock:
+            for task_id, _, _, _ in items:
+                self._dispatched.discard(task_id)
+                self._waiters.pop(task_id, None)
+                self._active.pop(task_id, None)
+                self._interrupts.pop(task_id, None)
+
+    def queue_position(self, task_id):
+        """Görevin kuyruktaki tahmini sırası (1'den başlar); kuyrukta değilse None"""
+        return self._queue.position(lambda item: item[0] == task_id)
+
+    def stats(self):
+        """Yürütücünün anlık durumunu döndür"""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "busy": self.pool.busy_count() > 0,
+            "completed": self._completed,
+            "batch_window_ms": self.batch_window_ms,
+            "max_batch_size": self.max_batch_size,
+            "avg_job_seconds": round(self._avg_job_seconds, 2),
+            "cancelled": self._cancelled,
+            "scheduler": self._queue.stats(),
+            "preprocessing": self.preprocessor.stats() if self.preprocessor is not None else None,
+            "replicas": self.pool.stats(),
+        }
+
+    def _collect_batch(self, first):
+        """
+        İlk görevden sonra toplama penceresi boyunca kuyruğa düşen görevleri de alır.
+        Durdurma sinyali görülürse ikinci değer True döner.
+        """
+        items = [first]
+        if self.max_batch_size <= 1 or self.batch_window_ms <= 0:
+            return items, False
+
+        deadline = time.monotonic() + self.batch_window_ms / 1000.0
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return items, True
+            items.append(item)
+
+        return items, False
+
+    def _track(self, task_id, task_store, job):
+        """Görevin ilerleme nesnesini oluşturur; iptal ve süre sınırı bunun üzerinden kontrol edilir"""
+        progress = TaskProgress(
+            self.progress_hub,
+            task_id,
+            num_outputs=job.get("num_outputs", 1),
+            num_inference_steps=job.get("num_inference_steps", 1),
+            preview_every=job.get("preview_every", 0),
+            deadline=job.get("deadline"),
+            cancel_check=(lambda: self._apply_cancel_request(task_id, task_store)) if task_store is not None else None
+        )
+        with self._lock:
+            status = self._interrupts.pop(task_id, None)
+            if status is not None:
+                progress.interrupt(status)
+            self._active[task_id] = progress
+        return progress
+
+    def _apply_cancel_request(self, task_id, task_store):
+        """Görev deposuna başka bir işçiden kaydedilen iptal isteğini bu işçideki göreve uygular"""
+        license_key = task_store.pop_cancel_request(task_id)
+        if license_key is None:
+            return
+        try:
+            self.cancel(task_id, license_key=license_key)
+            logger.info(f"Görev {task_id} için başka işçiden gelen iptal isteği uygulandı")
+        except PermissionError:
+            logger.warning(f"Görev {task_id} için iptal isteği reddedildi: görev bu lisansa ait değil")
+
+    def _prefetch(self, items):
+        """Toplu işteki görevlerin girdilerini çıkarımdan önce hazırlamaya başlar"""
+        if self.preprocessor is None:
+            return
+        # Bölge planı ayarları cihazdan bağımsızdır; ilk kopyanın yapılandırması kullanılır
+        inpainting_settings = self.pool.replicas[0].config["inpainting_settings"]
+        for _, _, _, job in items:
+            if "prepared" not in job:
+                job["prepared"] = self.preprocessor.submit(job, inpainting_settings)
+
+    def _discard_prepared(self, jobs):
+        """Başlatılmayan veya biten görevlerin ön getirme paylarını serbest bırakır"""
+        for job in jobs:
+            prepared = job.get("prepared")
+            if prepared is not None:
+                prepared.discard()
+
+    def _dispatch(self, items):
+        """Toplu işi en az yüklü sağlıklı kopyaya gönderir; kopya kalmadıysa görevleri başarısız sayar"""
+        cost = sum(job_cost(job) for _, _, _, job in items)
+        replica = self.pool.acquire(cost)
+        if replica is not None:
+            replica.jobs.put((items, cost))
+            return
+
+        self._discard_prepared(job for _, _, _, job in items)
+        for task_id, task_store, license_key, _ in items:
+            mark_failed(task_id, RuntimeError("Kullanılabilir model kopyası kalmadı"), task_store)
+            self._queue.task_done(license_key)
+        self._finish(items)
+
+    def _worker(self):
+        """Dağıtıcı: adil kuyruktan toplu işleri alıp model kopyalarına gönderir"""
+        stopping = False
+        while not stopping:
+            # Hazırlanıp çıkarımı bekleyen görev sınırı dolduysa görevler adil kuyrukta bekler
+            if self.preprocessor is not None:
+                self.preprocessor.wait_for_room()
+            item = self._queue.get()
+            if item is None:
+                break
+
+            items, stopping = self._collect_batch(item)
+            self._prefetch(items)
+            self._dispatch(items)
+
+    def _check_health(self, replica):
+        """Kopyayı sentetik çıkarımla dener; tahliye edildiyse True döner"""
+        try:
+            replica.probe()
+            error = None
+        except Exception as e:
+            error = e
+        return self.pool.record_probe(replica, error)
+
+    def _redispatch(self, replica):
+        """Tahliye edilen kopyanın bekleyen işlerini diğer kopyalara aktarır"""
+        while True:
+            try:
+                entry = replica.jobs.get_nowait()
+            except queue.Empty:
+                return
+            if entry is None:
+                continue
+            if isinstance(entry, threading.Barrier):
+                # Tahliye edilen kopya özel çalıştırmaya katılamaz
+                entry.abort()
+                continue
+            items, cost = entry
+            self.pool.release(replica, cost)
+            self._dispatch(items)
+
+    def _replica_worker(self, replica):
+        replica.bind_thread()
+        while True:
+            try:
+                entry = replica.jobs.get(timeout=self.health_check_interval or None)
+            except queue.Empty:
+                # Boşta kalan kopya düzenli olarak denenir
+                if self._check_health(replica):
+                    self._redispatch(replica)
+                    return
+                continue
+            if entry is None:
+                return
+            if isinstance(entry, threading.Barrier):
+                # run_exclusive: cihazdaki tüm kopyalar burada buluşur, biri fn'i çalıştırır
+                try:
+                    entry.wait()
+                except threading.BrokenBarrierError:
+                    pass
+                continue
+
+            items, cost = entry
+            if self._run_batch(replica, items, cost) and self._check_health(replica):
+                self._redispatch(replica)
+                return
+
+    def _run_batch(self, replica, items, cost):
+        """Toplu işi kopyada çalıştırır; beklenmeyen veya cihaz kaynaklı bir hata olduysa True döner"""
+        jobs = [
+            dict(job, task_id=task_id, task_store=task_store, progress=self._track(task_id, task_store, job))
+            for task_id, task_store, _, job in items
+        ]
+
+        replica.busy = True
+        started = time.time()
+        failed = False
+        try:
+            with inference_context(replica.config):
+                # Geçersiz girdi gibi görev hataları kopyanın hatası sayılmaz
+                failed = process_inpainting_batch(
+                    replica.model,
+                    replica.config,
+                    jobs,
+                    max_batch_size=self.max_batch_size
+                )
+        except Exception as e:
+            # Görev hataları kendi içinde kaydedilir; buraya düşen beklenmedik hatalardır
+            task_ids = ", ".join(job["task_id"] for job in jobs)
+            logger.error(f"Model kopyası {replica.replica_id} beklenmeyen hata ({task_ids}): {e}")
+            failed = True
+        finally:
+            elapsed = time.time() - started
+            replica.busy = False
+            self._discard_prepared(jobs)
+            self.pool.release(replica, cost, elapsed)
+            with self._lock:
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed / len(jobs)
+                self._completed += len(jobs)
+            self._finish(items)
+            for _, _, license_key, _ in items:
+                self._queue.task_done(license_key)
+        return failed
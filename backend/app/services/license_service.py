@@ -3,7 +3,12 @@ import time
 import os
 import json
 import logging
+import queue
+import sqlite3
 import hashlib
+import threading
+from contextlib import contextmanager
+from app.services.license_tokens import LicenseTokenVerifier, create_license_token, is_license_token
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -11,19 +16,25 @@ logger = logging.getLogger(__name__)
 # Örnek lisans veritabanı (gerçekte bir veritabanında saklanır)
 # Gerçek uygulamada bu PostgreSQL veya başka bir veritabanında tutulacaktır
 LICENSES_FILE = "config/licenses.json"
+LICENSES_DB_FILE = "config/licenses.db"
 
-def get_licenses():
+# Dosya değişikliği en fazla bu aralıkla (saniye) kontrol edilir
+RELOAD_CHECK_INTERVAL = 1.0
+
+def get_licenses(path=LICENSES_FILE):
     """Lisans veritabanını yükle"""
-    if os.path.exists(LICENSES_FILE):
-        with open(LICENSES_FILE, "r") as f:
+    if os.path.exists(path):
+        with open(path, "r") as f:
             return json.load(f)
     return {}
 
-def save_licenses(licenses):
-    """Lisans veritabanını kaydet"""
-    os.makedirs(os.path.dirname(LICENSES_FILE), exist_ok=True)
-    with open(LICENSES_FILE, "w") as f:
+def save_licenses(licenses, path=LICENSES_FILE):
+    """Lisans veritabanını kaydet (geçici dosyaya yazıp atomik olarak yeniden adlandırır)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "w") as f:
         json.dump(licenses, f, indent=2)
+    os.replace(tmp_file, path)
 
 def generate_license_key(customer_info):
     """Lisans anahtarı oluştur"""
@@ -33,57 +44,460 @@ def generate_license_key(customer_info):
     license_key = f"SDINPAINT-{hash_obj.hexdigest()[:16].upper()}"
     return license_key
 
-def validate_license(license_key):
-    """Lisans anahtarını doğrula"""
-    licenses = get_licenses()
-    
-    if license_key not in licenses:
-        return {
-            "valid": False,
-            "message": "Geçersiz lisans anahtarı"
-        }
-    
-    license_data = licenses[license_key]
-    
-    # Lisans süresi kontrolü
-    if datetime.now() > datetime.fromisoformat(license_data["expiry_date"]):
-        return {
-            "valid": False,
-            "message": "Lisans süresi dolmuş"
-        }
-    
-    # Aktiflik kontrolü
-    if not license_data["active"]:
-        return {
-            "valid": False,
-            "message": "Lisans deaktive edilmiş"
+class LicenseIndex:
+    """
+    Lisans dosyasının bellek içi indeksi. Dosya bir kez yüklenir, değişiklik
+    zamanı (mtime) değiştiğinde yeniden yüklenir; doğrulama sözlükte sabit
+    zamanlı bir aramadır. Kullanım artışları bellekte biriktirilir ve belirli
+    aralıklarla ve kapanışta toplu olarak dosyaya yazılır.
+    """
+
+    def __init__(self, path, flush_interval=10.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._licenses = {}
+        self._expiry = {}
+        self._mtime = None
+        self._last_check = 0.0
+        # Henüz dosyaya yazılmamış kullanım artışları: anahtar -> (artış, son kullanım)
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        self._mtime = self._file_mtime()
+        self._licenses = get_licenses(self.path)
+        # Tarih ayrıştırması her istekte tekrarlanmasın
+        self._expiry = {
+            key: datetime.fromisoformat(data["expiry_date"])
+            for key, data in self._licenses.items()
         }
-    
-    # Kullanım limiti kontrolü
-    if license_data["usage_count"] >= license_data["usage_limit"] and license_data["usage_limit"] > 0:
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL and self._mtime is not None:
+            return
+        self._last_check = now
+
+        if self._file_mtime() != self._mtime:
+            self._load()
+            logger.info(f"Lisans dosyası yeniden yüklendi ({len(self._licenses)} lisans)")
+
+    def validate(self, license_key):
+        """Lisans anahtarını doğrular ve kullanımı bellekte sayar"""
+        with self._lock:
+            self._maybe_reload()
+            license_data = self._licenses.get(license_key)
+
+            if license_data is None:
+                return {
+                    "valid": False,
+                    "message": "Geçersiz lisans anahtarı"
+                }
+
+            # Lisans süresi kontrolü
+            if datetime.now() > self._expiry[license_key]:
+                return {
+                    "valid": False,
+                    "message": "Lisans süresi dolmuş"
+                }
+
+            # Aktiflik kontrolü
+            if not license_data["active"]:
+                return {
+                    "valid": False,
+                    "message": "Lisans deaktive edilmiş"
+                }
+
+            # Kullanım limiti kontrolü (dosyaya yazılmamış artışlar dahil)
+            pending_count, _ = self._pending.get(license_key, (0, None))
+            usage_count = license_data["usage_count"] + pending_count
+            if usage_count >= license_data["usage_limit"] and license_data["usage_limit"] > 0:
+                return {
+                    "valid": False,
+                    "message": "Kullanım limiti aşıldı"
+                }
+
+            # Kullanım sayacını artır (dosyaya toplu olarak yazılır)
+            self._pending[license_key] = (pending_count + 1, datetime.now().isoformat())
+
+            return {
+                "valid": True,
+                "plan": license_data["plan"],
+                "customer": license_data["customer_name"],
+                "usage_count": usage_count,
+                "usage_limit": license_data["usage_limit"],
+                "expires": license_data["expiry_date"]
+            }
+
+    def modify(self, update):
+        """
+        Dosyayı güncel haliyle okuyup bekleyen kullanım artışlarını ve verilen
+        değişikliği uygular, atomik olarak kaydeder. update(licenses) None
+        dışında bir değer döndürürse o değer döndürülür.
+        """
+        with self._lock:
+            licenses = get_licenses(self.path)
+
+            for license_key, (count, last_used) in self._pending.items():
+                if license_key in licenses:
+                    licenses[license_key]["usage_count"] += count
+                    licenses[license_key]["last_used"] = last_used
+            self._pending = {}
+
+            result = update(licenses) if update is not None else None
+            save_licenses(licenses, self.path)
+            self._load()
+            return result
+
+    def flush(self):
+        """Bekleyen kullanım artışlarını dosyaya yaz"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            count = len(self._pending)
+            self.modify(None)
+        logger.debug(f"{count} lisansın kullanım sayacı kaydedildi")
+        return count
+
+    def start(self):
+        """Periyodik kaydetme iş parçacığını başlat"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name="license-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """İş parçacığını durdur ve bekleyen artışları kaydet"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _worker(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Lisans kullanım sayaçları kaydedilemedi: {e}")
+
+    def record_usage(self, license_key, count):
+        """
+        Doğrulaması başka yerde yapılmış kullanımları (imzalı token) sayar.
+        (kullanım sayısı, limit) döner; lisans bilinmiyorsa None.
+        """
+        with self._lock:
+            self._maybe_reload()
+            license_data = self._licenses.get(license_key)
+            if license_data is None:
+                return None
+            pending_count, _ = self._pending.get(license_key, (0, None))
+            self._pending[license_key] = (pending_count + count, datetime.now().isoformat())
+            return license_data["usage_count"] + pending_count + count, license_data["usage_limit"]
+
+    def create(self, license_key, license_data):
+        """Yeni lisansı ekler"""
+        def add(licenses):
+            licenses[license_key] = license_data
+        self.modify(add)
+
+    def deactivate(self, license_key):
+        """Lisansı deaktif eder; lisans yoksa False döner"""
+        def deactivate(licenses):
+            if license_key not in licenses:
+                return False
+            licenses[license_key]["active"] = False
+            return True
+        return self.modify(deactivate)
+
+    def extend(self, license_key, additional_days):
+        """Lisans süresini uzatır ve yeni bitiş tarihini döndürür; lisans yoksa None"""
+        def extend(licenses):
+            if license_key not in licenses:
+                return None
+            current_expiry = datetime.fromisoformat(licenses[license_key]["expiry_date"])
+            new_expiry = current_expiry + timedelta(days=additional_days)
+            licenses[license_key]["expiry_date"] = new_expiry.isoformat()
+            return new_expiry
+        return self.modify(extend)
+
+# SQLite lisans şeması (database/init.sql ile aynı tutulmalıdır)
+LICENSE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS licenses (
+    license_key TEXT PRIMARY KEY,
+    customer_name TEXT NOT NULL,
+    customer_email TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    creation_date TEXT NOT NULL,
+    expiry_date TEXT NOT NULL,
+    usage_count INTEGER NOT NULL DEFAULT 0,
+    usage_limit INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 1,
+    last_used TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_licenses_customer_email ON licenses (customer_email);
+"""
+
+LICENSE_COLUMNS = (
+    "customer_name", "customer_email", "plan", "creation_date", "expiry_date",
+    "usage_count", "usage_limit", "active", "last_used",
+)
+
+class SQLiteLicenseStore:
+    """
+    SQLite tabanlı lisans deposu. Veritabanı WAL modunda açılır, bağlantılar bir
+    havuzdan kullanılır. Kullanım sayacı tek bir koşullu UPDATE ile artırılır;
+    böylece birden fazla API işçisi aynı anda doğrulama yapabilir ve limit
+    kontrolü ile sayaç artışı atomik kalır.
+    """
+
+    def __init__(self, path, pool_size=4):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._pool = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._pool.put(conn)
+
+        with self._connection() as conn:
+            conn.executescript(LICENSE_SCHEMA)
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def import_json(self, path):
+        """JSON lisans dosyasındaki lisansları (yoksa) veritabanına aktarır"""
+        licenses = get_licenses(path)
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for license_key, data in licenses.items():
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO licenses (license_key, {', '.join(LICENSE_COLUMNS)}) "
+                        f"VALUES (?, {', '.join('?' * len(LICENSE_COLUMNS))})",
+                        (license_key, *(data.get(column) for column in LICENSE_COLUMNS))
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(licenses)
+
+    def count(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM licenses").fetchone()[0]
+
+    def validate(self, license_key):
+        """Lisans anahtarını doğrular ve geçerliyse kullanım sayacını atomik olarak artırır"""
+        now = datetime.now().isoformat()
+
+        with self._connection() as conn:
+            # Okunan satır bu isteğin artışını yansıtsın diye artış ve okuma tek işlemde yapılır
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute(
+                    """
+                    UPDATE licenses SET usage_count = usage_count + 1, last_used = ?
+                    WHERE license_key = ? AND active = 1 AND expiry_date > ?
+                      AND (usage_limit = 0 OR usage_count < usage_limit)
+                    """,
+                    (now, license_key, now)
+                )
+                row = conn.execute("SELECT * FROM licenses WHERE license_key = ?", (license_key,)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return {
+                "valid": False,
+                "message": "Geçersiz lisans anahtarı"
+            }
+
+        if cursor.rowcount == 0:
+            # Hangi koşulun sağlanmadığını belirle
+            if datetime.now() > datetime.fromisoformat(row["expiry_date"]):
+                message = "Lisans süresi dolmuş"
+            elif not row["active"]:
+                message = "Lisans deaktive edilmiş"
+            else:
+                message = "Kullanım limiti aşıldı"
+            return {
+                "valid": False,
+                "message": message
+            }
+
         return {
-            "valid": False,
-            "message": "Kullanım limiti aşıldı"
+            "valid": True,
+            "plan": row["plan"],
+            "customer": row["customer_name"],
+            # Bu istekten önceki kullanım sayısı
+            "usage_count": row["usage_count"] - 1,
+            "usage_limit": row["usage_limit"],
+            "expires": row["expiry_date"]
         }
-    
-    # Kullanım sayacını artır
-    licenses[license_key]["usage_count"] += 1
-    licenses[license_key]["last_used"] = datetime.now().isoformat()
-    save_licenses(licenses)
-    
-    return {
-        "valid": True,
-        "plan": license_data["plan"],
-        "customer": license_data["customer_name"],
-        "usage_count": license_data["usage_count"],
-        "usage_limit": license_data["usage_limit"],
-        "expires": license_data["expiry_date"]
-    }
+
+    def record_usage(self, license_key, count):
+        """
+        Doğrulaması başka yerde yapılmış kullanımları (imzalı token) sayar.
+        (kullanım sayısı, limit) döner; lisans bilinmiyorsa None.
+        """
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE licenses SET usage_count = usage_count + ?, last_used = ? WHERE license_key = ?",
+                (count, datetime.now().isoformat(), license_key)
+            )
+            row = conn.execute(
+                "SELECT usage_count, usage_limit FROM licenses WHERE license_key = ?", (license_key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row["usage_count"], row["usage_limit"]
+
+    def create(self, license_key, license_data):
+        """Yeni lisansı ekler"""
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT INTO licenses (license_key, {', '.join(LICENSE_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' * len(LICENSE_COLUMNS))})",
+                (license_key, *(license_data[column] for column in LICENSE_COLUMNS))
+            )
+
+    def deactivate(self, license_key):
+        """Lisansı deaktif eder; lisans yoksa False döner"""
+        with self._connection() as conn:
+            cursor = conn.execute("UPDATE licenses SET active = 0 WHERE license_key = ?", (license_key,))
+        return cursor.rowcount > 0
+
+    def extend(self, license_key, additional_days):
+        """Lisans süresini uzatır ve yeni bitiş tarihini döndürür; lisans yoksa None"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT expiry_date FROM licenses WHERE license_key = ?", (license_key,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return None
+
+                new_expiry = datetime.fromisoformat(row["expiry_date"]) + timedelta(days=additional_days)
+                conn.execute(
+                    "UPDATE licenses SET expiry_date = ? WHERE license_key = ?",
+                    (new_expiry.isoformat(), license_key)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return new_expiry
+
+    def flush(self):
+        # Sayaçlar doğrudan veritabanına yazılır
+        return 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        """Havuzdaki bağlantıları kapat"""
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+# Etkin lisans deposu (configure_license_store ile değiştirilebilir)
+license_store = LicenseIndex(LICENSES_FILE)
+
+# İmzalı lisans token'ları (configure_license_tokens ile etkinleştirilir)
+token_verifier = None
+token_signing_key = None
+token_algorithm = "HS256"
+
+def configure_license_store(backend="json", path=None, flush_interval=10.0, pool_size=4):
+    """
+    Lisans deposunu seçer. json: lisans dosyası üzerinde bellek içi indeks,
+    sqlite: SQLite veritabanı (ilk açılışta boşsa lisans dosyası içe aktarılır).
+    """
+    global license_store
+
+    if backend == "sqlite":
+        store = SQLiteLicenseStore(path or LICENSES_DB_FILE, pool_size=pool_size)
+        if store.count() == 0 and os.path.exists(LICENSES_FILE):
+            imported = store.import_json(LICENSES_FILE)
+            logger.info(f"{imported} lisans {LICENSES_FILE} dosyasından içe aktarıldı")
+    elif backend == "json":
+        store = LicenseIndex(path or LICENSES_FILE, flush_interval=flush_interval)
+    else:
+        raise ValueError(f"Bilinmeyen lisans deposu: {backend}")
+
+    license_store = store
+    logger.info(f"Lisans deposu: {backend}")
+    return store
+
+def configure_license_tokens(secret="", algorithm="HS256", private_key_path="", public_key_path="",
+                             revocation_file=None, cache_size=1024):
+    """
+    İmzalı lisans token desteğini yapılandırır. HS* algoritmalarında ortak
+    secret, RS*/ES*/EdDSA algoritmalarında anahtar dosyaları kullanılır (bunlar
+    için cryptography paketi gerekir). Anahtar verilmezse token desteği kapalıdır.
+    """
+    global token_verifier, token_signing_key, token_algorithm
+
+    if algorithm.startswith("HS"):
+        signing_key = verification_key = secret or None
+    else:
+        signing_key = open(private_key_path).read() if private_key_path else None
+        verification_key = open(public_key_path).read() if public_key_path else None
+
+    token_algorithm = algorithm
+    token_signing_key = signing_key
+    if verification_key is None:
+        token_verifier = None
+        return None
+
+    token_verifier = LicenseTokenVerifier(
+        verification_key,
+        algorithm=algorithm,
+        revocation_file=revocation_file,
+        cache_size=cache_size,
+        store_getter=lambda: license_store
+    )
+    logger.info(f"İmzalı lisans token desteği etkin ({algorithm})")
+    return token_verifier
+
+def validate_license(license_key):
+    """Lisans anahtarını doğrula (imzalı token'lar depoya erişmeden doğrulanır)"""
+    if is_license_token(license_key):
+        if token_verifier is None:
+            return {
+                "valid": False,
+                "message": "İmzalı lisans desteği etkin değil"
+            }
+        return token_verifier.verify(license_key)
+    return license_store.validate(license_key)
 
 def create_license(customer_info, plan_type, expiry_days=365, usage_limit=0):
     """Yeni bir lisans oluştur"""
-    licenses = get_licenses()
-    
     # Lisans anahtarı oluştur
     license_key = generate_license_key(customer_info)
     
@@ -101,26 +515,32 @@ def create_license(customer_info, plan_type, expiry_days=365, usage_limit=0):
     }
     
     # Veritabanına ekle
-    licenses[license_key] = license_data
-    save_licenses(licenses)
+    license_store.create(license_key, license_data)
     
-    return {
+    result = {
         "license_key": license_key,
         "license_data": license_data
     }
+    
+    # İmza anahtarı varsa çevrimdışı doğrulanabilen token da üret
+    if token_signing_key is not None:
+        result["license_token"] = create_license_token(
+            license_key, license_data, token_signing_key, token_algorithm
+        )
+    
+    return result
 
 def deactivate_license(license_key):
     """Lisansı deaktif et"""
-    licenses = get_licenses()
-    
-    if license_key not in licenses:
+    if not license_store.deactivate(license_key):
         return {
             "success": False,
             "message": "Lisans bulunamadı"
         }
     
-    licenses[license_key]["active"] = False
-    save_licenses(licenses)
+    # Bu lisans için verilmiş token'lar da geçersiz olsun
+    if token_verifier is not None and token_verifier.revocations is not None:
+        token_verifier.revocations.add(license_key)
     
     return {
         "success": True,
@@ -129,22 +549,16 @@ def deactivate_license(license_key):
 
 def extend_license(license_key, additional_days):
     """Lisans süresini uzat"""
-    licenses = get_licenses()
+    new_expiry = license_store.extend(license_key, additional_days)
     
-    if license_key not in licenses:
+    if new_expiry is None:
         return {
             "success": False,
             "message": "Lisans bulunamadı"
         }
     
-    current_expiry = datetime.fromisoformat(licenses[license_key]["expiry_date"])
-    new_expiry = current_expiry + timedelta(days=additional_days)
-    
-    licenses[license_key]["expiry_date"] = new_expiry.isoformat()
-    save_licenses(licenses)
-    
     return {
         "success": True,
         "message": f"Lisans {additional_days} gün uzatıldı",
         "new_expiry_date": new_expiry.isoformat()
-    }
\ No newline at end of file
+    }
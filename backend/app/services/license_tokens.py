@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+# İmzalı lisans token'larının issuer alanı
+TOKEN_ISSUER = "sd-inpainting"
+
+# İptal listesi dosyası en fazla bu aralıkla (saniye) kontrol edilir
+REVOCATION_CHECK_INTERVAL = 5.0
+
+# Limiti dolan lisansların reddedilme süresi (saniye); sonra depo tekrar sorulur
+# (limit artırılmış veya kullanım sıfırlanmış olabilir)
+EXHAUSTED_TTL_SECONDS = 60
+
+def is_license_token(license_key):
+    """Anahtarın imzalı token (JWT) olup olmadığını biçiminden anlar"""
+    return license_key.count(".") == 2
+
+def create_license_token(license_key, license_data, signing_key, algorithm="HS256"):
+    """
+    Lisans bilgilerini (plan, bitiş tarihi, limit) taşıyan imzalı token üretir.
+    Token yalnızca imza anahtarı ile doğrulanabilir; depoya erişim gerekmez.
+    """
+    expiry = datetime.fromisoformat(license_data["expiry_date"])
+    claims = {
+        "iss": TOKEN_ISSUER,
+        "sub": license_key,
+        "jti": uuid.uuid4().hex,
+        "iat": int(time.time()),
+        "exp": int(expiry.timestamp()),
+        "plan": license_data["plan"],
+        "customer": license_data["customer_name"],
+        "usage_limit": license_data["usage_limit"],
+    }
+    return jwt.encode(claims, signing_key, algorithm=algorithm)
+
+class RevocationList:
+    """
+    İptal edilmiş lisans anahtarları ve token ID'leri (jti). Dosya bir JSON
+    listesidir; değiştiğinde yeniden yüklenir. Dosya yoksa liste boştur.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._revoked = frozenset()
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < REVOCATION_CHECK_INTERVAL:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+
+        revoked = []
+        if mtime is not None:
+            try:
+                with open(self.path, "r") as f:
+                    revoked = json.load(f)
+            except (OSError, ValueError) as e:
+                # Bozuk dosyada önceki liste korunur
+                logger.error(f"İptal listesi okunamadı ({self.path}): {e}")
+                return
+        self._revoked = frozenset(revoked)
+        self._mtime = mtime
+        logger.info(f"Lisans iptal listesi yüklendi ({len(self._revoked)} kayıt)")
+
+    def add(self, identifier):
+        """Anahtarı veya token ID'sini iptal listesine ekler (atomik yazma)"""
+        with self._lock:
+            revoked = set(self._revoked)
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    revoked.update(json.load(f))
+            revoked.add(identifier)
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(sorted(revoked), f, indent=2)
+            os.replace(tmp_path, self.path)
+
+            self._revoked = frozenset(revoked)
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def is_revoked(self, *identifiers):
+        with self._lock:
+            self._maybe_reload()
+        return any(identifier in self._revoked for identifier in identifiers)
+
+class LicenseTokenVerifier:
+    """
+    İmzalı lisans token'larını yalnızca CPU kullanarak doğrular. İmza doğrulama
+    sonuçları küçük bir LRU önbellekte tutulur; önbellekten dönen sonuçlarda
+    yalnızca bitiş zamanı ve iptal listesi tekrar kontrol edilir.
+
+    Kullanım sayımı doğrulamayı bekletmez: artışlar bellekte biriktirilir ve
+    arka plan iş parçacığı tarafından lisans deposuna yazılır. Depo yavaş veya
+    erişilemez olsa bile doğrulama çalışmaya devam eder; yazılamayan artışlar
+    bir sonraki denemede tekrar gönderilir. Limiti dolduğu depodan öğrenilen
+    lisanslar EXHAUSTED_TTL_SECONDS boyunca reddedilir; süre dolunca veya depo
+    yeniden yer olduğunu bildirince kabul edilir.
+    """
+
+    def __init__(self, verification_key, algorithm="HS256", revocation_file=None,
+                 cache_size=1024, store_getter=None, flush_interval=2.0):
+        self.verification_key = verification_key
+        self.algorithm = algorithm
+        self.revocations = RevocationList(revocation_file) if revocation_file else None
+        self.cache_size = cache_size
+        # Her seferinde güncel depoyu almak için (depo yapılandırması değişebilir)
+        self.store_getter = store_getter
+        self.flush_interval = flush_interval
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._usage = {}
+        self._usage_lock = threading.Lock()
+        # Limiti dolan lisans -> reddedilmeye başlandığı zaman
+        self._exhausted = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {"cache_hits": 0, "cache_misses": 0, "metering_errors": 0}
+
+    def _decode(self, token):
+        return jwt.decode(
+            token,
+            self.verification_key,
+            algorithms=[self.algorithm],
+            issuer=TOKEN_ISSUER,
+            options={"require": ["exp", "sub", "iss"]}
+        )
+
+    def verify(self, token):
+        """Token'ı doğrular; sonuç validate_license ile aynı biçimdedir"""
+        with self._cache_lock:
+            claims = self._cache.get(token)
+            if claims is not None:
+                self._cache.move_to_end(token)
+                self._stats["cache_hits"] += 1
+
+        if claims is None:
+            try:
+                claims = self._decode(token)
+            except jwt.ExpiredSignatureError:
+                return {
+                    "valid": False,
+                    "message": "Lisans süresi dolmuş"
+                }
+            except jwt.InvalidTokenError:
+                return {
+                    "valid": False,
+                    "message": "Geçersiz lisans anahtarı"
+                }
+
+            with self._cache_lock:
+                self._stats["cache_misses"] += 1
+                self._cache[token] = claims
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        license_key = claims["sub"]
+
+        # Önbellekteki token'ın süresi o zamandan beri dolmuş olabilir
+        if time.time() >= claims["exp"]:
+            return {
+                "valid": False,
+                "message": "Lisans süresi dolmuş"
+            }
+
+        if self.revocations is not None and self.revocations.is_revoked(license_key, claims.get("jti")):
+            return {
+                "valid": False,
+                "message": "Lisans deaktive edilmiş"
+            }
+
+        if self._is_exhausted(license_key):
+            return {
+                "valid": False,
+                "message": "Kullanım limiti aşıldı"
+            }
+
+        # Kullanımı say (depoya arka planda yazılır)
+        with self._usage_lock:
+            self._usage[license_key] = self._usage.get(license_key, 0) + 1
+
+        return {
+            "valid": True,
+            "license_key": license_key,
+            "plan": claims["plan"],
+            "customer": claims.get("customer"),
+            "usage_limit": claims.get("usage_limit", 0),
+            "expires": datetime.fromtimestamp(claims["exp"]).isoformat()
+        }
+
+    def _is_exhausted(self, license_key):
+        with self._usage_lock:
+            exhausted_at = self._exhausted.get(license_key)
+            if exhausted_at is None:
+                return False
+            if time.monotonic() - exhausted_at < EXHAUSTED_TTL_SECONDS:
+                return True
+            # Süre doldu; sonraki kullanım depoya yazılınca durum yeniden öğrenilir
+            del self._exhausted[license_key]
+            return False
+
+    def flush_usage(self):
+        """Biriken kullanım artışlarını lisans deposuna yazar"""
+        with self._usage_lock:
+            usage, self._usage = self._usage, {}
+            # Bir daha sorulmayan lisansların kayıtları da süre dolunca silinir
+            now = time.monotonic()
+            for license_key, exhausted_at in list(self._exhausted.items()):
+                if now - exhausted_at >= EXHAUSTED_TTL_SECONDS:
+                    del self._exhausted[license_key]
+        if not usage or self.store_getter is None:
+            return
+
+        store = self.store_getter()
+        failed = {}
+        for license_key, count in usage.items():
+            try:
+                result = store.record_usage(license_key, count)
+            except Exception as e:
+                failed[license_key] = count
+                self._stats["metering_errors"] += 1
+                logger.warning(f"Lisans kullanımı kaydedilemedi ({license_key}): {e}")
+                continue
+
+            if result is not None:
+                usage_count, usage_limit = result
+                with self._usage_lock:
+                    if usage_limit > 0 and usage_count >= usage_limit:
+                        self._exhausted.setdefault(license_key, time.monotonic())
+                    else:
+                        self._exhausted.pop(license_key, None)
+
+        # Yazılamayan artışlar bir sonraki turda tekrar denenir
+        if failed:
+            with self._usage_lock:
+                for license_key, count in failed.items():
+                    self._usage[license_key] = self._usage.get(license_key, 0) + count
+
+    def stats(self):
+        with self._cache_lock:
+            cached = len(self._cache)
+        with self._usage_lock:
+            exhausted = len(self._exhausted)
+        return dict(self._stats, cached=cached, exhausted=exhausted)
+
+    def start(self):
+        """Kullanım sayacı yazma iş parçacığını başlat"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name="license-metering", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """İş parçacığını durdur ve kalan kullanımı yaz"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.flush_usage()
+
+    def _worker(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush_usage()
+            except Exception as e:
+                logger.error(f"Lisans kullanım sayımı sırasında hata: {e}")
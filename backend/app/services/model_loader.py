@@ -0,0 +1,229 @@
+import time
+import logging
+import threading
+
+import torch
+
+from app.utils.auto_device_detection import (
+    get_device_info, load_optimized_model, plan_replicas, clone_pipeline, synthetic_inference
+)
+from app.services.replica_pool import Replica
+from app.utils.cpu_engine import inference_context
+
+logger = logging.getLogger(__name__)
+
+# Yükleyicinin durumları: ağırlıklar yükleniyor, ayarlar ölçülüyor, ısıtma çıkarımı çalışıyor,
+# hazır, yükleme başarısız
+MODEL_STATES = ("loading", "tuning", "warming", "ready", "failed")
+
+def warmup_resolutions(config, resolutions=None):
+    """
+    Isıtılacak çözünürlükleri döndürür. Verilmemişse tiling gereken cihazlarda
+    parça boyutu, diğerlerinde en yüksek çözünürlüğü aşmayan 512 ve 768 kullanılır.
+    """
+    inpainting_settings = config["inpainting_settings"]
+    if not resolutions:
+        if inpainting_settings["tiling_required"]:
+            resolutions = [inpainting_settings["tile_size"]]
+        else:
+            resolutions = [512, 768]
+    return [size for size in resolutions if size % 8 == 0 and size <= inpainting_settings["max_resolution"]]
+
+def warmup_model(model, config, resolutions, steps=2):
+    """
+    Her çözünürlükte boş bir görüntü ve maskeyle kısa bir çıkarım yapar. İlk
+    çağrıdaki çekirdek seçimi, bellek ayırma ve boş prompt gömmesi böylece ilk
+    gerçek istekten önce hazırlanır.
+    """
+    timings = {}
+    for size in resolutions:
+        started = time.perf_counter()
+        with inference_context(config):
+            synthetic_inference(model, size, steps)
+        timings[size] = time.perf_counter() - started
+    return timings
+
+class ModelLoader:
+    """
+    Model kopyalarını arka plan iş parçacığında yükleyip ısıtan servis; API model
+    hazır olmadan da istek kabul eder. Her cihaz için model bir kez yüklenir; aynı
+    cihazdaki diğer kopyalar ağırlıkları paylaşır. Yükleme ve ısıtma bittikten
+    sonra on_ready(kopyalar) çağrılır (ör. çıkarım yürütücüsünü başlatmak için).
+    Isıtma başarısız olursa model yine de hazır sayılır; yüklenemeyen cihazlar atlanır.
+    autotuner verilirse ısıtmadan önce her cihaz için ölçülmüş ayar profili
+    uygulanır (kayıtlı değilse ölçülür); ölçüm başarısız olursa varsayılanlar kalır.
+
+    Soğuk başlangıç süreleri (cihaz tespiti, ağırlıklar, cihaza taşıma, ayar, ısıtma)
+    loglanır ve stats() ile raporlanır.
+    """
+
+    def __init__(self, model_id, use_safetensors=None, warmup_enabled=True,
+                 warmup_resolutions=None, warmup_steps=2, replica_devices=None, cpu_replicas=0,
+                 cpu_threads_per_replica=16, cpu_replica_memory_gb=4.0, cpu_engine=None, autotuner=None, on_ready=None):
+        self.model_id = model_id
+        self.replica_devices = replica_devices or []
+        self.cpu_replicas = cpu_replicas
+        self.cpu_threads_per_replica = cpu_threads_per_replica
+        self.cpu_replica_memory_gb = cpu_replica_memory_gb
+        self.cpu_engine = cpu_engine
+        self.autotuner = autotuner
+        self.use_safetensors = use_safetensors
+        self.warmup_enabled = warmup_enabled
+        self.warmup_resolutions = warmup_resolutions or []
+        self.warmup_steps = max(1, warmup_steps)
+        self.on_ready = on_ready
+        self.state = "loading"
+        self.error = None
+        self.timings = {}
+        self._started = None
+        self._ready_at = None
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        """Yükleme iş parçacığını başlat"""
+        if self._thread is not None:
+            return
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._worker, name="model-loader", daemon=True)
+        self._thread.start()
+        logger.info(f"Model arka planda yükleniyor: {self.model_id}")
+
+    def stop(self):
+        """Uygulama kapanıyor; yükleme bitse bile on_ready çağrılmaz"""
+        self._stopped = True
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def _worker(self):
+        started = time.perf_counter()
+        try:
+            replicas = self._load_replicas()
+
+            if self.autotuner is not None and self.autotuner.enabled:
+                self.state = "tuning"
+                self._autotune(replicas)
+
+            if self.warmup_enabled:
+                self.state = "warming"
+                # Aynı cihazdaki kopyalar ağırlıkları paylaştığından cihaz başına bir kez ısıtılır
+                warmed = set()
+                for replica in replicas:
+                    if replica.device not in warmed:
+                        warmed.add(replica.device)
+                        self._warmup(replica.model, replica.config, replica.device if len(replicas) > 1 else None)
+
+            if self._stopped:
+                return
+            if self.on_ready is not None:
+                self.on_ready(replicas)
+            self.state = "ready"
+            self._ready_at = time.time()
+        except Exception as e:
+            logger.error(f"Model yüklenirken hata oluştu: {e}")
+            self.error = str(e)
+            self.state = "failed"
+        finally:
+            self.timings["total"] = time.perf_counter() - started
+            breakdown = ", ".join(
+                f"{stage}: {seconds:.2f} sn" for stage, seconds in list(self.timings.items())
+                if not isinstance(seconds, dict)
+            )
+            logger.info(f"Soğuk başlangıç süreleri ({self.state}): {breakdown}")
+
+    def _add_timings(self, timings):
+        for stage, seconds in timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def _load_replicas(self):
+        """Planlanan her kopya için modeli yükler veya aynı cihazdaki yüklü modeli paylaşır"""
+        plan = plan_replicas(
+            get_device_info(),
+            devices=self.replica_devices,
+            cpu_replicas=self.cpu_replicas,
+            cpu_threads_per_replica=self.cpu_threads_per_replica,
+            cpu_replica_memory_gb=self.cpu_replica_memory_gb
+        )
+        logger.info(f"Model kopyaları planlandı: {', '.join(entry['device'] for entry in plan)}")
+
+        replicas = []
+        loaded = {}
+        last_error = None
+        for entry in plan:
+            device = entry["device"]
+            try:
+                if device in loaded:
+                    model, config = clone_pipeline(loaded[device][0]), loaded[device][1]
+                else:
+                    timings = {}
+                    model, config = load_optimized_model(
+                        model_id=self.model_id,
+                        use_safetensors=self.use_safetensors,
+                        timings=timings,
+                        device=device,
+                        cpu_engine=self.cpu_engine
+                    )
+                    self._add_timings(timings)
+                    loaded[device] = (model, config)
+                    logger.info(f"Model başarıyla yüklendi. Çalışma cihazı: {model.device}")
+            except Exception as e:
+                logger.error(f"Model {device} cihazına yüklenemedi: {e}")
+                last_error = e
+                continue
+            replicas.append(Replica(len(replicas), device, model, config, entry["cpu_cores"]))
+
+        if not replicas:
+            raise last_error or RuntimeError("Model kopyası planlanamadı")
+
+        # Çekirdekler kopyalara bölündüyse her kopya kendi payı kadar iş parçacığı kullanır
+        cpu_cores = [replica.cpu_cores for replica in replicas if replica.cpu_cores]
+        if cpu_cores:
+            torch.set_num_threads(len(cpu_cores[0]))
+            logger.info(f"{len(cpu_cores)} CPU kopyası, kopya başına {len(cpu_cores[0])} iş parçacığı")
+        return replicas
+
+    def _autotune(self, replicas):
+        """Her cihazın ilk kopyasına ayar profilini uygular (aynı cihazdaki kopyalar yapılandırmayı paylaşır)"""
+        started = time.perf_counter()
+        devices = {}
+        for replica in replicas:
+            devices.setdefault(replica.device, []).append(replica)
+        for device, device_replicas in devices.items():
+            first = device_replicas[0]
+            # Çekirdekler kopyalara bölündüyse iş parçacığı sayısı ölçülmez
+            tune_threads = all(replica.cpu_cores is None for replica in device_replicas)
+            try:
+                self.autotuner.prepare(first.model, first.config, device, tune_threads=tune_threads)
+            except Exception as e:
+                logger.warning(f"{device} için ayarlar ölçülemedi, varsayılanlar kullanılacak: {e}")
+        self._add_timings({"autotune": time.perf_counter() - started})
+
+    def _warmup(self, model, config, device=None):
+        resolutions = warmup_resolutions(config, self.warmup_resolutions)
+        logger.info(f"Model ısıtılıyor: {', '.join(f'{size}x{size}' for size in resolutions)}, {self.warmup_steps} adım")
+        started = time.perf_counter()
+        prefix = f"{device} " if device else ""
+        try:
+            self.timings.setdefault("warmup_resolutions", {}).update({
+                f"{prefix}{size}x{size}": round(seconds, 3)
+                for size, seconds in warmup_model(model, config, resolutions, self.warmup_steps).items()
+            })
+        except Exception as e:
+            # Isıtma hatası modeli kullanılamaz yapmaz; ilk istek soğuk çalışır
+            logger.warning(f"Model ısıtılamadı: {e}")
+        self._add_timings({"warmup": time.perf_counter() - started})
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "model_id": self.model_id,
+            "error": self.error,
+            "started_at": self._started,
+            "ready_at": self._ready_at,
+            "timings": {
+                stage: round(seconds, 3) if not isinstance(seconds, dict) else seconds
+                for stage, seconds in list(self.timings.items())
+            },
+        }
@@ -0,0 +1,135 @@
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.models.inpainting import prepare_inputs
+from app.utils.region_planner import plan_regions
+
+logger = logging.getLogger(__name__)
+
+# config/config.json içindeki "performance" bölümünün kullanılan ayarları.
+# num_workers: girdi hazırlayan iş parçacığı sayısı (0 = çıkarım iş parçacığında hazırla),
+# prefetch_factor: kopya başına çıkarımdan önce hazırlanabilecek görev sayısı
+PERFORMANCE_DEFAULTS = {
+    "num_workers": 2,
+    "prefetch_factor": 2,
+}
+
+def load_performance_settings(path):
+    """config.json'daki performance bölümünü varsayılanlarla birleştirerek okur"""
+    performance = dict(PERFORMANCE_DEFAULTS)
+    if not path or not os.path.exists(path):
+        return performance
+    try:
+        with open(path, "r") as f:
+            performance.update(json.load(f).get("performance", {}))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Performans ayarları okunamadı ({path}): {e}")
+    return performance
+
+def preprocess_job(job, inpainting_settings):
+    """
+    Görevin çıkarımdan önceki CPU aşamaları: resim ve maskeyi çözme, RGB/L
+    dönüşümü, 8'in katlarına boyutlandırma, maskeyi ters çevirme ve maske
+    bölgelerinin planlanması. (init_image, mask_image, seed, regions) döndürür.
+    """
+    init_image, mask_image, seed = prepare_inputs(job["image_data"], job["mask_data"], job["seed"])
+    regions = plan_regions(np.array(mask_image), inpainting_settings)
+    return init_image, mask_image, seed, regions
+
+class PreparedInputs:
+    """
+    Arka planda hazırlanan görev girdileri. Çıkarım başlarken get() ile alınır;
+    görev başlatılmadan biterse (iptal, hata) discard() çağrılır. İkisi de
+    görevin ön getirme payını bir kez serbest bırakır.
+    """
+
+    def __init__(self, future, release):
+        self._future = future
+        self._release = release
+        self._released = False
+
+    def get(self):
+        """Hazırlanan girdileri döndürür; hazırlık sürüyorsa bitmesini bekler"""
+        ready = self._future.done()
+        try:
+            return self._future.result()
+        finally:
+            self._finish(ready)
+
+    def discard(self):
+        """Girdiler kullanılmayacak; hazırlık başlamadıysa iptal edilir"""
+        self._future.cancel()
+        self._finish(None)
+
+    def _finish(self, ready):
+        if not self._released:
+            self._released = True
+            self._release(ready)
+
+class Preprocessor:
+    """
+    Çıkarımın önündeki aşama: girdileri çıkarım iş parçacığı dışında, num_workers
+    iş parçacıklı bir havuzda hazırlar. Görüntü çözme ve dönüştürme (PIL, NumPy)
+    çoğunlukla GIL'i bıraktığından hazırlık çalışan denoising ile örtüşür.
+
+    Hazırlanmakta olan veya hazırlanıp çıkarımı bekleyen görev sayısı
+    max_prefetched ile sınırlıdır: dağıtıcı wait_for_room() ile yer açılana kadar
+    adil kuyruktan yeni görev almaz (sınır, toplama penceresindeki bir toplu iş
+    kadar aşılabilir). Kodlama aşaması çıktı yazıcı havuzundadır (output_writer).
+    """
+
+    def __init__(self, num_workers=2, max_prefetched=2):
+        self.num_workers = max(1, num_workers)
+        self.max_prefetched = max(1, max_prefetched)
+        self._pool = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="preprocess")
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._submitted = 0
+        # Çıkarım başladığında girdileri hazır olan / beklenen / kullanılmadan atılan görevler
+        self._ready = 0
+        self._waited = 0
+        self._discarded = 0
+
+    def wait_for_room(self, timeout=None):
+        """Ön getirme sınırının altına inilene kadar bekler; timeout dolarsa False döner"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending < self.max_prefetched, timeout)
+
+    def submit(self, job, inpainting_settings):
+        """Görevin girdilerini hazırlamaya başlar ve PreparedInputs döndürür"""
+        with self._condition:
+            self._pending += 1
+            self._submitted += 1
+        future = self._pool.submit(preprocess_job, job, inpainting_settings)
+        return PreparedInputs(future, self._release)
+
+    def _release(self, ready):
+        with self._condition:
+            self._pending -= 1
+            if ready is None:
+                self._discarded += 1
+            elif ready:
+                self._ready += 1
+            else:
+                self._waited += 1
+            self._condition.notify_all()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "workers": self.num_workers,
+                "max_prefetched": self.max_prefetched,
+                "pending": self._pending,
+                "submitted": self._submitted,
+                "ready_at_start": self._ready,
+                "waited_at_start": self._waited,
+                "discarded": self._discarded,
+            }
@@ -0,0 +1,273 @@
+import time
+import asyncio
+import logging
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+from app.utils.image_utils import pil_to_base64
+
+logger = logging.getLogger(__name__)
+
+# İlerleme seviyeleri dıştan içe: bölge, çıktı, parça, denoising adımı
+PROGRESS_LEVELS = ("region", "output", "tile", "step")
+
+# Görev bitince yayınlanan durumlar
+FINAL_STATUSES = ("completed", "failed", "cancelled", "timed_out")
+
+# Kesilen görevlerin kayıtta görünen açıklamaları
+INTERRUPT_MESSAGES = {
+    "cancelled": "Görev iptal edildi",
+    "timed_out": "Görev süre sınırını aştı",
+}
+
+class TaskInterrupted(Exception):
+    """Görev iptal edildiğinde veya süre sınırı dolduğunda çıkarımı durdurmak için fırlatılır"""
+
+    def __init__(self, status):
+        super().__init__(INTERRUPT_MESSAGES.get(status, status))
+        self.status = status
+
+class BatchSplit(Exception):
+    """Toplu çağrı, kesilen görevlerin öğelerini atıp kalanları yeniden çalıştırmak için durduruldu"""
+
+# Başka işçiden gelen iptal isteklerinin görev deposunda en fazla bu aralıkla (saniye) kontrol edilmesi
+CANCEL_POLL_INTERVAL = 1.0
+
+# Abone başına bekleyen olay sınırı; yavaş istemcilerde eski ilerleme olayları atılır
+# (durum olayları sınırı aşsa bile atılmaz)
+SUBSCRIBER_QUEUE_SIZE = 64
+
+# SD 1.x/2.x latent kanallarından yaklaşık RGB'ye doğrusal dönüşüm (VAE çalıştırmadan önizleme için)
+LATENT_RGB_FACTORS = torch.tensor([
+    [0.298, 0.207, 0.208],
+    [0.187, 0.286, 0.173],
+    [-0.158, 0.189, 0.264],
+    [-0.184, -0.271, -0.473],
+])
+
+def latent_preview(latents):
+    """İlk öğenin latent'lerinden düşük çözünürlüklü (1/8) JPEG önizleme üretir"""
+    latents = latents[0].detach().float().cpu()
+    if latents.shape[0] != LATENT_RGB_FACTORS.shape[0]:
+        return None
+    rgb = torch.einsum("chw,cr->hwr", latents, LATENT_RGB_FACTORS)
+    rgb = ((rgb + 1) / 2).clamp(0, 1).mul(255).byte().numpy()
+    return pil_to_base64(Image.fromarray(np.ascontiguousarray(rgb)), "jpeg", quality=60)
+
+class TaskProgress:
+    """
+    Tek bir görevin ilerlemesi. Çıkarım kodu bölge, çıktı ve parça sırasını
+    set() ile, denoising adımlarını step() ile bildirir; genel oran iç içe
+    seviyelerden hesaplanır ve her adımda hub üzerinden yayınlanır.
+    preview_every > 0 ise her preview_every adımda latent önizlemesi eklenir.
+
+    Her adımda ve parçalar arasında check() ile iptal isteği ve süre sınırı
+    (deadline, Unix zamanı) kontrol edilir; gerekirse TaskInterrupted fırlatılır.
+    cancel_check verilirse en fazla CANCEL_POLL_INTERVAL saniyede bir çağrılır;
+    başka işçiden gelen iptal isteklerini interrupt() ile uygular.
+    """
+
+    def __init__(self, hub, task_id, num_outputs=1, num_inference_steps=1, preview_every=0, deadline=None,
+                 cancel_check=None):
+        self.hub = hub
+        self.task_id = task_id
+        self.preview_every = preview_every
+        self.deadline = deadline
+        self.cancel_check = cancel_check
+        self._next_cancel_check = 0.0
+        # None, "cancelled" veya "timed_out"
+        self.interrupted = None
+        self.started = time.time()
+        self._levels = {level: (0, 1, 1) for level in PROGRESS_LEVELS}
+        self._levels["output"] = (0, max(1, num_outputs), 1)
+        self._levels["step"] = (0, max(1, num_inference_steps), 1)
+
+    def set(self, level, index, total, span=1):
+        """
+        Seviyenin sırasını ayarlar ve iç seviyeleri sıfırlar. span, aynı anda
+        işlenen öğe sayısıdır (ör. toplu üretilen varyasyonlar).
+        """
+        position = PROGRESS_LEVELS.index(level)
+        self._levels[level] = (index, max(1, total), span)
+        for inner in PROGRESS_LEVELS[position + 1:]:
+            # Çıktı ve adım sayıları görev boyunca sabittir
+            total = self._levels[inner][1] if inner in ("output", "step") else 1
+            self._levels[inner] = (0, total, 1)
+
+    def interrupt(self, status="cancelled"):
+        """Görevin bir sonraki kontrol noktasında durdurulmasını ister (herhangi bir iş parçacığından)"""
+        if self.interrupted is None:
+            self.interrupted = status
+
+    def check(self):
+        """İptal istendiyse veya süre dolduysa TaskInterrupted fırlatır"""
+        if self.interrupted is None and self.cancel_check is not None:
+            now = time.monotonic()
+            if now >= self._next_cancel_check:
+                self._next_cancel_check = now + CANCEL_POLL_INTERVAL
+                try:
+                    self.cancel_check()
+                except Exception as e:
+                    logger.warning(f"İptal isteği kontrol edilemedi ({self.task_id}): {e}")
+        if self.interrupted is None and self.deadline is not None and time.time() > self.deadline:
+            self.interrupted = "timed_out"
+        if self.interrupted is not None:
+            raise TaskInterrupted(self.interrupted)
+
+    def fraction(self):
+        """Görevin tamamlanan oranı (0-1)"""
+        value = 0.0
+        for level in reversed(PROGRESS_LEVELS):
+            index, total, span = self._levels[level]
+            value = (index + span * value) / total if level != "step" else index / total
+        return min(1.0, value)
+
+    def step(self, step, latents=None):
+        """step numaralı (1'den başlar) denoising adımı tamamlandı"""
+        self.check()
+        _, total, _ = self._levels["step"]
+        self._levels["step"] = (step, total, 1)
+
+        fraction = self.fraction()
+        elapsed = time.time() - self.started
+        event = {
+            "type": "progress",
+            "step": step,
+            "steps": total,
+            "output": self._levels["output"][0] + 1,
+            "outputs": self._levels["output"][1],
+            "tile": self._levels["tile"][0] + 1,
+            "tiles": self._levels["tile"][1],
+            "region": self._levels["region"][0] + 1,
+            "regions": self._levels["region"][1],
+            "progress": round(fraction, 4),
+            "eta_seconds": round(elapsed * (1 - fraction) / fraction, 1) if fraction > 0 else None,
+        }
+
+        if latents is not None and self.preview_every > 0 and step % self.preview_every == 0:
+            try:
+                event["preview"] = latent_preview(latents)
+            except Exception as e:
+                logger.debug(f"Önizleme üretilemedi ({self.task_id}): {e}")
+
+        if self.hub is not None:
+            self.hub.publish(self.task_id, event)
+
+    def callback(self, offset=0):
+        """
+        diffusers pipeline'ının callback(step, timestep, latents) imzasına uygun
+        fonksiyon döndürür; offset, toplu çağrıdaki öğenin sırasıdır.
+        """
+        def on_step(step, timestep, latents):
+            self.step(step + 1, latents[offset:offset + 1])
+        return on_step
+
+def combine_callbacks(callbacks, split=None):
+    """
+    Toplu bir pipeline çağrısındaki birden fazla görevin adım callback'lerini birleştirir.
+    Tüm görevler kesildiyse çağrı TaskInterrupted ile durdurulur. Bazıları kesildiyse
+    split(adım) True döndüğünde çağrı BatchSplit ile durdurulur (kalan öğeler yeniden
+    çalıştırılır); aksi halde çağrı sürer ve kesilen görevlerin sonuçları atılır.
+    """
+    callbacks = [callback for callback in callbacks if callback is not None]
+    if not callbacks:
+        return None
+
+    def on_step(step, timestep, latents):
+        interrupted = None
+        active = 0
+        for callback in callbacks:
+            try:
+                callback(step, timestep, latents)
+                active += 1
+            except TaskInterrupted as e:
+                interrupted = e
+        if interrupted is None:
+            return
+        if active == 0:
+            raise interrupted
+        if split is not None and split(step + 1):
+            raise BatchSplit()
+    return on_step
+
+class ProgressHub:
+    """
+    Görev ilerleme olaylarını SSE aboneleri için event loop'a aktarır. Olaylar
+    çıkarım iş parçacığından yayınlanır; her abone kendi asyncio kuyruğunu alır.
+    Geç bağlanan abonelere son ilerleme olayı hemen gönderilir. Görev durum
+    değişiklikleri (tamamlandı, başarısız) görev deposundan bildirilir.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, task_id):
+        """Görevin olayları için kuyruk döndürür (event loop içinden çağrılmalıdır)"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(subscriber)
+            latest = self._latest.get(task_id)
+        if latest is not None:
+            subscriber[1].put_nowait(latest)
+        return subscriber
+
+    def unsubscribe(self, task_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    @staticmethod
+    def _offer(queue, event):
+        """
+        Olayı abonenin kuyruğuna ekler. Kuyruk doluysa en eski ilerleme olayı
+        atılır; kuyrukta ilerleme olayı yoksa yeni ilerleme olayı atılır. Durum
+        olayları (tamamlandı, iptal vb.) hiçbir zaman atılmaz.
+        """
+        if queue.qsize() >= SUBSCRIBER_QUEUE_SIZE:
+            pending = [queue.get_nowait() for _ in range(queue.qsize())]
+            progress = [i for i, queued in enumerate(pending) if queued["type"] == "progress"]
+            if progress:
+                del pending[progress[0]]
+            elif event["type"] == "progress":
+                event = None
+            for queued in pending:
+                queue.put_nowait(queued)
+        if event is not None:
+            queue.put_nowait(event)
+
+    def publish(self, task_id, event):
+        """Olayı görevin tüm abonelerine iletir (herhangi bir iş parçacığından çağrılabilir)"""
+        with self._lock:
+            if event["type"] == "progress":
+                # Önizleme büyük olabileceğinden son olayda saklanmaz
+                self._latest[task_id] = {key: value for key, value in event.items() if key != "preview"}
+            subscribers = list(self._subscribers.get(task_id, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Event loop kapanmış
+                pass
+
+    def on_status(self, task_id, status):
+        """Görev deposundan gelen durum değişikliği"""
+        if status in FINAL_STATUSES:
+            with self._lock:
+                self._latest.pop(task_id, None)
+        self.publish(task_id, {"type": "status", "status": status})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "tracked": len(self._latest),
+            }
@@ -0,0 +1,172 @@
+import os
+import queue
+import logging
+import threading
+
+import torch
+
+from app.utils.auto_device_detection import synthetic_inference
+from app.utils.cpu_engine import inference_context
+
+logger = logging.getLogger(__name__)
+
+# Sağlık kontrolündeki sentetik çıkarımın çözünürlüğü
+PROBE_SIZE = 64
+
+class Replica:
+    """
+    Tek bir model kopyası: cihaz, pipeline, yerel iş kuyruğu ve yük/sağlık durumu.
+    cpu_cores verilirse kopyanın iş parçacığı bu çekirdeklere bağlanır.
+    """
+
+    def __init__(self, replica_id, device, model, config, cpu_cores=None):
+        self.replica_id = replica_id
+        self.device = device
+        self.model = model
+        self.config = config
+        self.cpu_cores = cpu_cores
+        # Dağıtıcının gönderdiği (görevler, maliyet) toplu işleri
+        self.jobs = queue.Queue()
+        # Gönderilmiş ama bitmemiş işlerin toplam maliyeti ve sayısı
+        self.outstanding = 0.0
+        self.pending = 0
+        self.busy = False
+        self.healthy = True
+        self.failures = 0
+        self.completed = 0
+        self.last_error = None
+        # Maliyet birimi başına ölçülen süre (saniye); ilk iş bitene kadar None
+        self.seconds_per_cost = None
+
+    def bind_thread(self):
+        """Çağıran iş parçacığını (ve açacağı OpenMP iş parçacıklarını) kopyanın çekirdeklerine bağlar"""
+        if self.cpu_cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.cpu_cores)
+
+    def probe(self):
+        """Kısa bir sentetik çıkarımla kopyanın çalıştığını doğrular; hata varsa fırlatır"""
+        with inference_context(self.config):
+            synthetic_inference(self.model, PROBE_SIZE, 1)
+
+    def release_model(self):
+        """Tahliye edilen kopyanın modelini bırakır"""
+        self.model = None
+        if self.device.startswith("cuda"):
+            torch.cuda.empty_cache()
+
+class ReplicaPool:
+    """
+    Model kopyaları arasında en az bekleyen işe göre dağıtım. Her toplu iş,
+    bekleyen işinin tahmini süresi (bekleyen maliyet x ölçülen hız) en düşük olan
+    sağlıklı kopyaya gönderilir; kopya başına en fazla queue_depth toplu iş
+    (çalışan + bekleyen) verilir. Sağlık kontrolünde max_failures kez üst üste
+    başarısız olan kopya tahliye edilir.
+    """
+
+    def __init__(self, replicas, queue_depth=2, max_failures=2, initial_seconds_per_cost=30.0):
+        self.replicas = list(replicas)
+        self.queue_depth = max(1, queue_depth)
+        self.max_failures = max(1, max_failures)
+        self.initial_seconds_per_cost = initial_seconds_per_cost
+        self._condition = threading.Condition()
+        self._evicted = 0
+
+    def healthy_count(self):
+        with self._condition:
+            return sum(1 for replica in self.replicas if replica.healthy)
+
+    def busy_count(self):
+        with self._condition:
+            return sum(1 for replica in self.replicas if replica.healthy and replica.busy)
+
+    def _expected_seconds(self, replica, cost):
+        rate = replica.seconds_per_cost or self.initial_seconds_per_cost
+        return (replica.outstanding + cost) * rate
+
+    def acquire(self, cost, timeout=None):
+        """
+        İşi bitirme süresi en kısa olacak sağlıklı kopyayı seçer ve maliyeti ona
+        yazar. Tüm kopyalar doluysa yer açılana kadar bekler; sağlıklı kopya
+        kalmadıysa (veya timeout dolarsa) None döner.
+        """
+        with self._condition:
+            while True:
+                candidates = [
+                    replica for replica in self.replicas
+                    if replica.healthy and replica.pending < self.queue_depth
+                ]
+                if candidates:
+                    replica = min(
+                        candidates,
+                        key=lambda r: (self._expected_seconds(r, cost), r.pending, r.replica_id)
+                    )
+                    replica.outstanding += cost
+                    replica.pending += 1
+                    return replica
+
+                if not any(replica.healthy for replica in self.replicas):
+                    return None
+                if not self._condition.wait(timeout):
+                    return None
+
+    def release(self, replica, cost, elapsed=None):
+        """Kopyaya gönderilen iş bitti; elapsed verilirse kopyanın hızı güncellenir"""
+        with self._condition:
+            replica.outstanding = max(0.0, replica.outstanding - cost)
+            replica.pending = max(0, replica.pending - 1)
+            if elapsed is not None and cost > 0:
+                replica.completed += 1
+                rate = elapsed / cost
+                if replica.seconds_per_cost is None:
+                    replica.seconds_per_cost = rate
+                else:
+                    replica.seconds_per_cost = 0.8 * replica.seconds_per_cost + 0.2 * rate
+            self._condition.notify_all()
+
+    def record_probe(self, replica, error=None):
+        """Sağlık kontrolünün sonucunu kaydeder; kopya tahliye edildiyse True döner"""
+        with self._condition:
+            if error is None:
+                replica.failures = 0
+                return False
+
+            replica.failures += 1
+            replica.last_error = str(error)
+            logger.warning(
+                f"Model kopyası {replica.replica_id} ({replica.device}) sağlık kontrolünde başarısız "
+                f"({replica.failures}/{self.max_failures}): {error}"
+            )
+            if replica.failures < self.max_failures or not replica.healthy:
+                return False
+
+            replica.healthy = False
+            self._evicted += 1
+            self._condition.notify_all()
+
+        logger.error(f"Model kopyası {replica.replica_id} ({replica.device}) tahliye edildi")
+        replica.release_model()
+        return True
+
+    def stats(self):
+        with self._condition:
+            return {
+                "healthy": sum(1 for replica in self.replicas if replica.healthy),
+                "evicted": self._evicted,
+                "queue_depth": self.queue_depth,
+                "replicas": [
+                    {
+                        "id": replica.replica_id,
+                        "device": replica.device,
+                        "cpu_cores": len(replica.cpu_cores) if replica.cpu_cores else None,
+                        "healthy": replica.healthy,
+                        "busy": replica.busy,
+                        "pending": replica.pending,
+                        "outstanding": round(replica.outstanding, 2),
+                        "completed": replica.completed,
+                        "seconds_per_cost": round(replica.seconds_per_cost, 2) if replica.seconds_per_cost else None,
+                        "failures": replica.failures,
+                        "last_error": replica.last_error,
+                    }
+                    for replica in self.replicas
+                ],
+            }
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from app.utils.image_utils import write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+# Bu durumlardaki görevlere aynı istekler bağlanabilir
+ACTIVE_STATUSES = ("pending", "processing")
+
+# Çıktıyı etkileyen inpainting_settings alanları (parçalama ve bölge planlama)
+PIPELINE_SETTINGS = (
+    "max_resolution", "tiling_required", "tile_size", "tile_overlap",
+    "region_padding", "region_merge_distance", "region_min_size", "region_max_coverage",
+)
+
+# Çıktıyı etkileyen CPU motoru alanları
+PIPELINE_CPU_ENGINE = ("mode", "bf16_autocast", "channels_last", "compile", "attention")
+
+def pipeline_fingerprint(configs):
+    """
+    Model kopyalarının yapılandırmalarından çıktıyı etkileyen ayarların özeti:
+    otomatik ayar donanım parmak izi, cihaz ve veri tipi, CPU motoru ayarları ve
+    parça/bölge ayarları. Yeniden ayarlama veya farklı donanım önbellekteki eski
+    sonuçların döndürülmesini engeller.
+    """
+    parts = []
+    for config in configs:
+        inpainting_settings = config.get("inpainting_settings", {})
+        cpu_engine = config.get("cpu_engine", {})
+        parts.append({
+            "autotune": config.get("autotune", {}).get("fingerprint"),
+            "device": config.get("device"),
+            "dtype": str(config.get("torch_dtype")),
+            "cpu_engine": [cpu_engine.get(key) for key in PIPELINE_CPU_ENGINE],
+            "inpainting_settings": [inpainting_settings.get(key) for key in PIPELINE_SETTINGS],
+        })
+    # Aynı yapılandırmayı paylaşan kopyalar bir kez sayılır
+    unique = sorted({json.dumps(part, sort_keys=True) for part in parts})
+    return hashlib.blake2b("|".join(unique).encode(), digest_size=8).hexdigest()
+
+def result_cache_key(image_data, mask_data, model_id, pipeline, **params):
+    """
+    Girdi baytları ve çıktıyı belirleyen parametrelerden içerik adresli anahtar üretir.
+    pipeline: pipeline_fingerprint() değeri. params: prompt, negative_prompt,
+    guidance_scale, num_inference_steps, seed, num_outputs ve çıktı kodlama ayarları.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(hashlib.blake2b(image_data, digest_size=20).digest())
+    digest.update(hashlib.blake2b(mask_data, digest_size=20).digest())
+    digest.update(json.dumps(dict(params, model_id=model_id, pipeline=pipeline), sort_keys=True).encode())
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Sabit seed'li isteklerin sonuçları için iki katmanlı önbellek.
+
+    - Bellek katmanı: anahtar -> görüntü kayıtları, en fazla max_entries kayıt (LRU).
+    - Disk katmanı: çıktı dosyaları cache_dir altına sabit bağlantı (veya kopya)
+      olarak alınır ve {anahtar}.json manifest'i yazılır. Toplam boyut max_bytes'ı
+      aşarsa en uzun süredir kullanılmayan kayıtlar silinir. Görev çıktıları
+      temizleyici tarafından silinse bile önbellekteki dosyalar kalır.
+
+    Aynı anahtarlı bir görev hâlâ kuyrukta veya işlenirken gelen istekler yeni
+    bir çıkarım başlatmak yerine çalışan göreve bağlanır.
+    """
+
+    def __init__(self, cache_dir, max_entries=256, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        # 0 = disk katmanı kapalı
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._in_flight = {}
+        self._disk = {}
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "stored": 0}
+
+        if self.max_bytes > 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._scan()
+
+    def _manifest_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _scan(self):
+        """Disk katmanının indeksini (anahtar -> boyut, son erişim) oluşturur"""
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    images = json.load(f)
+                self._disk[entry.name[:-5]] = {
+                    "bytes": sum(image["size"] for image in images),
+                    "accessed": entry.stat().st_mtime,
+                }
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Önbellek manifest'i okunamadı ({entry.path}): {e}")
+
+    def _remember(self, key, images):
+        self._memory[key] = images
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load_disk(self, key):
+        """Disk katmanından kaydı okur; dosyalardan biri eksikse kaydı siler"""
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._manifest_path(key), "r") as f:
+                images = json.load(f)
+        except (OSError, ValueError):
+            self._evict_disk(key)
+            return None
+
+        if not all(os.path.exists(image["path"]) for image in images):
+            self._evict_disk(key)
+            return None
+
+        now = time.time()
+        self._disk[key]["accessed"] = now
+        try:
+            os.utime(self._manifest_path(key), (now, now))
+        except OSError:
+            pass
+        return images
+
+    def _lookup(self, key):
+        images = self._memory.get(key)
+        if images is not None:
+            if all(os.path.exists(image["path"]) for image in images):
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return images
+            del self._memory[key]
+
+        images = self._load_disk(key)
+        if images is not None:
+            self._remember(key, images)
+            self._stats["disk_hits"] += 1
+        return images
+
+    def claim(self, key, task_id, task_store):
+        """
+        İsteği önbelleğe karşı çözer:
+        - ("hit", görüntü kayıtları): sonuç önbellekte,
+        - ("attach", görev ID'si): aynı istek hâlâ çalışıyor,
+        - ("miss", None): task_id bu anahtarın çalışan görevi olarak kaydedildi.
+        """
+        with self._lock:
+            images = self._lookup(key)
+            if images is not None:
+                return "hit", images
+
+            leader = self._in_flight.get(key)
+            if leader is not None and leader != task_id:
+                record = task_store.get(leader)
+                if record is not None and record["status"] in ACTIVE_STATUSES:
+                    self._stats["coalesced"] += 1
+                    return "attach", leader
+
+            self._in_flight[key] = task_id
+            self._stats["misses"] += 1
+            if len(self._in_flight) > self.max_entries:
+                self._prune_in_flight(task_store)
+            return "miss", None
+
+    def _prune_in_flight(self, task_store):
+        """Başarısız olan veya depodan silinen görevlerin kayıtlarını temizler (kilit alınmış olmalı)"""
+        for key, leader in list(self._in_flight.items()):
+            record = task_store.get(leader)
+            if record is None or record["status"] not in ACTIVE_STATUSES:
+                del self._in_flight[key]
+
+    def release(self, key, task_id):
+        """Görev başlatılamadıysa çalışan görev kaydını kaldırır"""
+        with self._lock:
+            if self._in_flight.get(key) == task_id:
+                del self._in_flight[key]
+
+    def store(self, key, task_id, images):
+        """Tamamlanan görevin çıktılarını önbelleğe alır"""
+        if self.max_bytes > 0:
+            try:
+                images = self._store_disk(key, images)
+            except OSError as e:
+                logger.warning(f"Sonuç önbelleğe yazılamadı ({key}): {e}")
+
+        with self._lock:
+            if self._in_flight.get(key) == task_id:
+                del self._in_flight[key]
+            self._remember(key, images)
+            self._stats["stored"] += 1
+
+        if self.max_bytes > 0:
+            self._enforce_quota()
+
+    def _store_disk(self, key, images):
+        cached = []
+        for i, image in enumerate(images):
+            extension = os.path.splitext(image["path"])[1]
+            path = os.path.join(self.cache_dir, f"{key}_{i}{extension}")
+            if not os.path.exists(path):
+                tmp_path = f"{path}.tmp"
+                try:
+                    # Sabit bağlantı disk alanı kullanmaz; farklı dosya sistemlerinde kopyalanır
+                    os.link(image["path"], tmp_path)
+                except OSError:
+                    shutil.copyfile(image["path"], tmp_path)
+                os.replace(tmp_path, path)
+            cached.append(dict(image, path=path))
+
+        write_file_atomic(self._manifest_path(key), json.dumps(cached).encode())
+        with self._lock:
+            self._disk[key] = {"bytes": sum(image["size"] for image in cached), "accessed": time.time()}
+        return cached
+
+    def _evict_disk(self, key):
+        """Disk kaydını ve dosyalarını siler (kilit alınmış olmalı)"""
+        self._disk.pop(key, None)
+        self._memory.pop(key, None)
+        paths = [self._manifest_path(key)]
+        try:
+            with open(paths[0], "r") as f:
+                paths.extend(image["path"] for image in json.load(f))
+        except (OSError, ValueError):
+            pass
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _enforce_quota(self):
+        with self._lock:
+            total = sum(entry["bytes"] for entry in self._disk.values())
+            if total <= self.max_bytes:
+                return
+            for key in sorted(self._disk, key=lambda k: self._disk[k]["accessed"]):
+                if total <= self.max_bytes:
+                    break
+                total -= self._disk[key]["bytes"]
+                self._evict_disk(key)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                memory_entries=len(self._memory),
+                disk_entries=len(self._disk),
+                disk_bytes=sum(entry["bytes"] for entry in self._disk.values()),
+                in_flight=len(self._in_flight),
+            )
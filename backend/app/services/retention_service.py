@@ -0,0 +1,232 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Yazımı yarıda kalmış geçici dosyalar bu süreden (saniye) eskiyse silinir
+STALE_TMP_SECONDS = 3600
+
+class OutputJanitor:
+    """
+    Çıktı klasörünü görev bazında indeksleyen ve saklama politikasını uygulayan
+    arka plan servisi. Her turda:
+
+    - max_age_days'ten eski görevlerin dosyaları silinir,
+    - toplam boyut max_bytes'ı aşarsa en uzun süredir erişilmeyen görevler
+      kota altına inilene kadar silinir.
+
+    Silmeler diski yormamak için batch_size dosyalık gruplar halinde, gruplar
+    arasında batch_pause saniye beklenerek yapılır. Dosyaları silinen görevler
+    görev deposundan da kaldırılır.
+    """
+
+    def __init__(self, output_dir, max_age_days=7, max_bytes=0, interval_seconds=300,
+                 batch_size=200, batch_pause=0.05, task_store=None):
+        self.output_dir = output_dir
+        self.max_age_seconds = max_age_days * 86400
+        # 0 = kota yok
+        self.max_bytes = max_bytes
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = batch_pause
+        self.task_store = task_store
+
+        self._index = {}
+        self._last_access = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread = None
+        self._stats = {
+            "runs": 0,
+            "deleted_files": 0,
+            "deleted_bytes": 0,
+            "expired_tasks": 0,
+            "evicted_tasks": 0,
+            "last_run": None,
+            "last_duration": None,
+        }
+
+    def start(self):
+        """Temizlik iş parçacığını başlat"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._worker, name="output-janitor", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Çıktı temizleyici başlatıldı (saklama: {self.max_age_seconds // 86400} gün, "
+            f"kota: {self.max_bytes // (1024 * 1024) if self.max_bytes else 'yok'} MB)"
+        )
+
+    def stop(self, timeout=None):
+        """Temizlik iş parçacığını durdur (devam eden silme grubu tamamlanır)"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._wake_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("Çıktı temizleyici durduruldu")
+
+    def wake(self):
+        """Bir sonraki turu beklemeden temizlik yap"""
+        self._wake_event.set()
+
+    def touch(self, task_id):
+        """
+        Görevin çıktılarına erişildiğini kaydeder (LRU tahliyesi için). Henüz
+        taranmamış görevlerin erişimi de tutulur; bir sonraki taramada indekse
+        girmeyen görevlerin kayıtları silinir.
+        """
+        with self._lock:
+            self._last_access[task_id] = time.time()
+
+    def scan(self):
+        """
+        Çıktı klasörünü tarar ve görev bazında indeksi yeniler.
+        Dosya adları {task_id}_{index}.{uzantı} biçimindedir.
+        """
+        index = {}
+        now = time.time()
+
+        try:
+            entries = list(os.scandir(self.output_dir))
+        except FileNotFoundError:
+            entries = []
+
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+
+            name = entry.name
+            if name.endswith(".tmp"):
+                if now - stat.st_mtime > STALE_TMP_SECONDS:
+                    self._remove_file(entry.path)
+                continue
+
+            stem, _, _ = name.partition(".")
+            task_id, separator, suffix = stem.rpartition("_")
+            if not separator or not suffix.isdigit():
+                # Görev çıktısı olmayan dosyalar (ör. görev veritabanı) yönetilmez
+                continue
+
+            task = index.setdefault(task_id, {"files": [], "bytes": 0, "created": stat.st_mtime})
+            task["files"].append(entry.path)
+            task["bytes"] += stat.st_size
+            task["created"] = min(task["created"], stat.st_mtime)
+
+        with self._lock:
+            self._index = index
+            self._last_access = {
+                task_id: self._last_access.get(task_id, task["created"])
+                for task_id, task in index.items()
+            }
+
+        return index
+
+    def run_once(self):
+        """Tek bir temizlik turu: tara, süresi dolanları sil, kotayı uygula"""
+        started = time.time()
+        index = self.scan()
+
+        # Süresi dolan görevler
+        if self.max_age_seconds > 0:
+            expired = [
+                task_id for task_id, task in index.items()
+                if started - task["created"] > self.max_age_seconds
+            ]
+            if expired:
+                self._delete_tasks(expired, "expired_tasks")
+
+        # Kota: en uzun süredir erişilmeyen görevlerden başlayarak sil
+        if self.max_bytes > 0:
+            with self._lock:
+                total = sum(task["bytes"] for task in self._index.values())
+                by_access = sorted(self._index, key=lambda task_id: self._last_access.get(task_id, 0))
+
+            if total > self.max_bytes:
+                # Her turda kotanın biraz altına inilir, böylece sürekli sınırda çalışılmaz
+                target = int(self.max_bytes * 0.9)
+                evict = []
+                for task_id in by_access:
+                    if total <= target:
+                        break
+                    evict.append(task_id)
+                    total -= self._index[task_id]["bytes"]
+                logger.warning(f"Çıktı kotası aşıldı, {len(evict)} görevin çıktıları silinecek")
+                self._delete_tasks(evict, "evicted_tasks")
+
+        self._stats["runs"] += 1
+        self._stats["last_run"] = started
+        self._stats["last_duration"] = round(time.time() - started, 3)
+
+    def _remove_file(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"Çıktı dosyası silinemedi ({path}): {e}")
+            return 0
+        self._stats["deleted_files"] += 1
+        self._stats["deleted_bytes"] += size
+        return size
+
+    def _delete_tasks(self, task_ids, counter):
+        """Görevlerin dosyalarını hız sınırlı gruplar halinde siler"""
+        deleted_in_batch = 0
+
+        for task_id in task_ids:
+            if self._stop_event.is_set():
+                return
+
+            with self._lock:
+                task = self._index.pop(task_id, None)
+                self._last_access.pop(task_id, None)
+            if task is None:
+                continue
+
+            for path in task["files"]:
+                self._remove_file(path)
+                deleted_in_batch += 1
+                if deleted_in_batch >= self.batch_size:
+                    deleted_in_batch = 0
+                    time.sleep(self.batch_pause)
+
+            if self.task_store is not None:
+                self.task_store.delete(task_id)
+            self._stats[counter] += 1
+
+    def stats(self):
+        """Temizleyicinin ve çıktı klasörünün anlık durumunu döndür"""
+        with self._lock:
+            total_bytes = sum(task["bytes"] for task in self._index.values())
+            total_files = sum(len(task["files"]) for task in self._index.values())
+            tasks = len(self._index)
+
+        return dict(
+            self._stats,
+            tasks=tasks,
+            files=total_files,
+            bytes=total_bytes,
+            max_bytes=self.max_bytes,
+            max_age_days=self.max_age_seconds // 86400,
+        )
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Çıktı temizliği sırasında hata: {e}")
+
+            self._wake_event.wait(self.interval_seconds)
+            self._wake_event.clear()
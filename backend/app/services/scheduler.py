@@ -0,0 +1,249 @@
+import math
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Çıkarım kuyruğu dolu olduğunda fırlatılır"""
+
+    def __init__(self, retry_after, message="Sunucu şu anda yoğun, lütfen daha sonra tekrar deneyin"):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.message = message
+
+class RateLimitedError(QueueFullError):
+    """Lisansın istek hızı veya kuyruk payı aşıldığında fırlatılır"""
+
+# Plan ayarı bulunmayan lisanslar için kullanılan değerler
+DEFAULT_PLAN_SETTINGS = {
+    "weight": 1,
+    "max_in_flight": 1,
+    "max_queued": 2,
+    "rate_per_minute": 6,
+    "burst": 3,
+}
+
+class TokenBucket:
+    """Saniyede rate jeton dolan, en fazla capacity jeton tutan kova"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        """Jeton varsa alır ve 0 döner; yoksa bir jeton için beklenecek süreyi (saniye) döner"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60
+
+class _LicenseQueue:
+    def __init__(self, plan, plan_settings):
+        self.plan = plan
+        self.settings = plan_settings
+        self.jobs = deque()
+        self.in_flight = 0
+        # Bu lisansın son görevinin sanal bitiş zamanı
+        self.last_finish = 0.0
+        self.bucket = TokenBucket(
+            plan_settings["rate_per_minute"] / 60.0,
+            plan_settings["burst"]
+        )
+
+class FairQueue:
+    """
+    Lisanslar arası ağırlıklı adil kuyruk (start-time fair queuing).
+
+    Her lisansın kendi FIFO kuyruğu vardır. Eklenen göreve başlangıç etiketi
+    max(sanal zaman, lisansın son bitiş etiketi) ve bitiş etiketi
+    başlangıç + maliyet / plan ağırlığı olarak verilir. Sıradaki görev, aynı
+    anda çalışan görev sınırına (max_in_flight) ulaşmamış lisansların
+    kuyruk başları arasından en küçük başlangıç etiketine sahip olandır.
+    Ağırlığı yüksek planlar daha sık sıra alır, ancak hiçbir lisans aç kalmaz.
+
+    Ekleme sırasında lisans başına jeton kovası ile hız sınırı ve plan başına
+    kuyrukta bekleyebilecek görev sınırı uygulanır.
+
+    InferenceExecutor'ın kullandığı queue.Queue arayüzünün (put_nowait, get,
+    qsize) karşılığını sağlar; task_done tamamlanan öğeyi alır. on_take(item)
+    verilirse görev kuyruktan alınırken kilit altında çağrılır; böylece görev
+    remove() ile bulunamıyorsa on_take'in çalışmış olduğu kesindir.
+    """
+
+    def __init__(self, maxsize, plan_settings=None, default_plan="basic", on_take=None):
+        self.maxsize = maxsize
+        self.on_take = on_take
+        self.plan_settings = plan_settings or {}
+        self.default_plan = default_plan
+        self._licenses = {}
+        self._size = 0
+        self._virtual_time = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _settings_for(self, plan):
+        return dict(DEFAULT_PLAN_SETTINGS, **self.plan_settings.get(plan, {}))
+
+    def _license_queue(self, license_key, plan):
+        state = self._licenses.get(license_key)
+        if state is None or state.plan != plan:
+            settings = self._settings_for(plan)
+            previous = state
+            state = _LicenseQueue(plan, settings)
+            if previous is not None:
+                # Plan değiştiyse bekleyen görevler ve sayaçlar korunur
+                state.jobs = previous.jobs
+                state.in_flight = previous.in_flight
+                state.last_finish = previous.last_finish
+            self._licenses[license_key] = state
+        return state
+
+    def qsize(self):
+        with self._condition:
+            return self._size
+
+    def put_nowait(self, item, license_key="anonymous", plan=None, cost=1.0):
+        """
+        Görevi lisansın kuyruğuna ekler. Kuyruk doluysa queue.Full, lisansın
+        hız veya kuyruk payı aşıldıysa RateLimitedError fırlatır.
+        """
+        plan = plan or self.default_plan
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Kuyruk kapatıldı")
+            if self._size >= self.maxsize:
+                raise queue.Full
+
+            state = self._license_queue(license_key, plan)
+            if len(state.jobs) >= state.settings["max_queued"]:
+                raise RateLimitedError(
+                    30,
+                    f"'{plan}' planı için kuyrukta bekleyen görev sınırına ({state.settings['max_queued']}) ulaşıldı"
+                )
+
+            wait = state.bucket.try_take()
+            if wait > 0:
+                raise RateLimitedError(
+                    max(1, math.ceil(wait)),
+                    f"'{plan}' planı için istek hızı sınırı aşıldı"
+                )
+
+            start = max(self._virtual_time, state.last_finish)
+            finish = start + cost / state.settings["weight"]
+            state.last_finish = finish
+            state.jobs.append((start, item))
+            self._size += 1
+            self._condition.notify()
+
+    def _pick(self):
+        """Sıradaki lisansı seçer (kilit alınmış olmalı)"""
+        best = None
+        for license_key, state in self._licenses.items():
+            if not state.jobs or state.in_flight >= state.settings["max_in_flight"]:
+                continue
+            if best is None or state.jobs[0][0] < best[1].jobs[0][0]:
+                best = (license_key, state)
+        return best
+
+    def get(self, timeout=None):
+        """
+        Sıradaki görevi döndürür. Kuyruk kapatılıp boşaldığında None döner;
+        timeout dolarsa queue.Empty fırlatır.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                picked = self._pick()
+                if picked is not None:
+                    _, state = picked
+                    start, item = state.jobs.popleft()
+                    state.in_flight += 1
+                    self._size -= 1
+                    self._virtual_time = max(self._virtual_time, start)
+                    if self.on_take is not None:
+                        self.on_take(item)
+                    return item
+
+                if self._closed and self._size == 0:
+                    return None
+
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._condition.wait(remaining)
+
+    def task_done(self, license_key):
+        """Lisansın çalışan görevlerinden biri bitti"""
+        with self._condition:
+            state = self._licenses.get(license_key)
+            if state is not None:
+                state.in_flight = max(0, state.in_flight - 1)
+                # Boşta kalan ve kovası dolmuş lisansların durumu tutulmaz
+                if not state.jobs and state.in_flight == 0 and state.bucket.tokens >= state.bucket.capacity:
+                    del self._licenses[license_key]
+            self._condition.notify_all()
+
+    def remove(self, match):
+        """
+        match(item) True olan bekleyen görevi kuyruktan çıkarır ve döndürür; yoksa
+        None. Yalnızca bekleyen görev sayıları değişir: görev hiç alınmadığı için
+        çalışan görev sayısına dokunulmaz ve task_done çağrılmamalıdır.
+        """
+        with self._condition:
+            for state in self._licenses.values():
+                for entry in state.jobs:
+                    if match(entry[1]):
+                        state.jobs.remove(entry)
+                        self._size -= 1
+                        self._condition.notify_all()
+                        return entry[1]
+            return None
+
+    def close(self):
+        """Yeni görev kabulünü durdurur; bekleyenler işlendikten sonra get None döner"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def position(self, match):
+        """
+        match(item) True olan görevin tahmini sırasını (1'den başlar) döndürür,
+        kuyrukta değilse None. Sıralama başlangıç etiketlerine göredir.
+        """
+        with self._condition:
+            target = None
+            tags = []
+            for state in self._licenses.values():
+                for start, item in state.jobs:
+                    tags.append(start)
+                    if target is None and match(item):
+                        target = start
+            if target is None:
+                return None
+            return sum(1 for start in tags if start < target) + 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                "licenses": len(self._licenses),
+                "queued_by_plan": {
+                    plan: sum(len(state.jobs) for state in self._licenses.values() if state.plan == plan)
+                    for plan in {state.plan for state in self._licenses.values()}
+                },
+                "in_flight": sum(state.in_flight for state in self._licenses.values()),
+            }
@@ -0,0 +1,393 @@
+import os
+import abc
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Bitmiş görevlerin durumları; yalnızca bunlar tahliye edilebilir
+FINISHED_STATUSES = ("completed", "failed", "cancelled", "timed_out")
+
+# SQL sorgularında bitmiş durumlar için yer tutucular
+_FINISHED_PLACEHOLDERS = ", ".join("?" * len(FINISHED_STATUSES))
+
+# Süresi dolan görevlerin en fazla bu aralıkla (saniye) temizlenmesi
+PURGE_INTERVAL = 30
+
+class TaskStore(abc.ABC):
+    """
+    Görev durumlarının saklandığı depo arayüzü. Depoda yalnızca küçük meta veriler
+    tutulur; çıktı görüntüleri çıktı klasörüne yazılır ve kayıtta dosya yolları
+    saklanır. Görüntüler /inpaint/{task_id}/images/{i} üzerinden diskten sunulur.
+
+    Görev kaydı: status, created_at, updated_at, completed_at, params, images, error,
+    cancel_requested (görevi başka bir işçiden iptal etmek isteyen lisans)
+    """
+
+    @abc.abstractmethod
+    def create(self, task_id, params):
+        pass
+
+    @abc.abstractmethod
+    def get(self, task_id):
+        """Görev kaydının bir kopyasını döndürür, görev yoksa None"""
+
+    @abc.abstractmethod
+    def update(self, task_id, **fields):
+        """Görev alanlarını günceller; görev tahliye edilmişse False döner"""
+
+    @abc.abstractmethod
+    def delete(self, task_id):
+        pass
+
+    @abc.abstractmethod
+    def list_ids(self):
+        pass
+
+    @abc.abstractmethod
+    def stats(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __contains__(self, task_id):
+        return self.get(task_id) is not None
+
+    # Durum değişikliklerini dinleyenler (ör. ilerleme akışı)
+    _listeners = ()
+
+    def add_listener(self, listener):
+        """listener(task_id, status) görev durumu değiştiğinde çağrılır"""
+        self._listeners = tuple(self._listeners) + (listener,)
+
+    def _notify(self, task_id, status):
+        for listener in self._listeners:
+            try:
+                listener(task_id, status)
+            except Exception as e:
+                logger.warning(f"Görev durumu dinleyicisi hata verdi ({task_id}): {e}")
+
+    def _set_status(self, task_id, status, **fields):
+        updated = self.update(task_id, status=status, **fields)
+        if updated:
+            self._notify(task_id, status)
+        return updated
+
+    def mark_processing(self, task_id):
+        return self._set_status(task_id, "processing")
+
+    def complete(self, task_id, images):
+        """images: path, media_type, size, etag, seed ve prompt alanlarını içeren sözlükler"""
+        return self._set_status(task_id, "completed", images=images, completed_at=time.time())
+
+    def fail(self, task_id, error):
+        return self._set_status(task_id, "failed", error=str(error), completed_at=time.time())
+
+    def interrupt(self, task_id, status, message):
+        """Görevi cancelled veya timed_out olarak sonlandırır"""
+        return self._set_status(task_id, status, error=message, completed_at=time.time())
+
+    def request_cancel(self, task_id, license_key):
+        """
+        Görevi çalıştıran işçi için iptal isteği kaydeder (depoyu paylaşan işçiler
+        arasında). İstek sahibi işçide bir sonraki kontrol noktasında işlenir.
+        """
+        return self.update(task_id, cancel_requested=license_key)
+
+    def pop_cancel_request(self, task_id):
+        """Görevin bekleyen iptal isteğini (isteyen lisans) döndürür ve siler; yoksa None"""
+        record = self.get(task_id)
+        license_key = record.get("cancel_requested") if record is not None else None
+        if license_key is not None:
+            self.update(task_id, cancel_requested=None)
+        return license_key
+
+def _new_record(params):
+    now = time.time()
+    return {
+        "status": "pending",
+        "created_at": now,
+        "updated_at": now,
+        "completed_at": None,
+        "params": params,
+        "images": None,
+        "error": None,
+        "cancel_requested": None,
+    }
+
+def _record_size(record):
+    """Kaydın bellekte kapladığı alanın kaba tahmini (bayt)"""
+    return len(json.dumps(record, default=str)) + 256
+
+class MemoryTaskStore(TaskStore):
+    """
+    Tek süreç için bellek içi görev deposu. Bitmiş görevler TTL süresi dolunca
+    silinir; görev sayısı veya tahmini bellek kullanımı sınırı aşarsa en uzun
+    süredir erişilmeyen bitmiş görevler tahliye edilir. Bekleyen ve işlenen
+    görevler tahliye edilmez.
+    """
+
+    def __init__(self, ttl_seconds=3600, max_tasks=1000, max_memory_bytes=64 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_tasks = max_tasks
+        self.max_memory_bytes = max_memory_bytes
+        self._tasks = OrderedDict()
+        self._sizes = {}
+        self._memory_bytes = 0
+        self._evicted = 0
+        self._expired = 0
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+    def _set(self, task_id, record):
+        size = _record_size(record)
+        self._memory_bytes += size - self._sizes.get(task_id, 0)
+        self._sizes[task_id] = size
+        self._tasks[task_id] = record
+        self._tasks.move_to_end(task_id)
+
+    def _remove(self, task_id):
+        self._tasks.pop(task_id, None)
+        self._memory_bytes -= self._sizes.pop(task_id, 0)
+
+    def _purge_expired(self, now):
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+
+        expired = [
+            task_id for task_id, record in self._tasks.items()
+            if record["status"] in FINISHED_STATUSES and now - record["updated_at"] > self.ttl_seconds
+        ]
+        for task_id in expired:
+            self._remove(task_id)
+        self._expired += len(expired)
+
+    def _enforce_limits(self):
+        # OrderedDict başı en uzun süredir erişilmeyen kayıttır
+        for task_id in list(self._tasks):
+            if len(self._tasks) <= self.max_tasks and self._memory_bytes <= self.max_memory_bytes:
+                break
+            if self._tasks[task_id]["status"] in FINISHED_STATUSES:
+                self._remove(task_id)
+                self._evicted += 1
+
+    def create(self, task_id, params):
+        with self._lock:
+            self._purge_expired(time.time())
+            self._set(task_id, _new_record(params))
+            self._enforce_limits()
+
+    def get(self, task_id):
+        with self._lock:
+            now = time.time()
+            self._purge_expired(now)
+            record = self._tasks.get(task_id)
+            if record is None:
+                return None
+            if record["status"] in FINISHED_STATUSES and now - record["updated_at"] > self.ttl_seconds:
+                self._remove(task_id)
+                self._expired += 1
+                return None
+            self._tasks.move_to_end(task_id)
+            return dict(record)
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            record = self._tasks.get(task_id)
+            if record is None:
+                return False
+            record = dict(record, updated_at=time.time(), **fields)
+            self._set(task_id, record)
+            self._enforce_limits()
+            return True
+
+    def delete(self, task_id):
+        with self._lock:
+            self._remove(task_id)
+
+    def list_ids(self):
+        with self._lock:
+            self._purge_expired(time.time())
+            return list(self._tasks.keys())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "tasks": len(self._tasks),
+                "max_tasks": self.max_tasks,
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "evicted": self._evicted,
+                "expired": self._expired,
+            }
+
+class SQLiteTaskStore(TaskStore):
+    """
+    SQLite tabanlı görev deposu. Aynı veritabanı dosyasını kullanan birden fazla
+    uvicorn işçisi görev durumlarını paylaşabilir. Her iş parçacığı kendi
+    bağlantısını kullanır; veritabanı WAL modunda açılır.
+    """
+
+    def __init__(self, path, ttl_seconds=3600, max_tasks=1000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_tasks = max_tasks
+        self._local = threading.local()
+        # close() tüm iş parçacıklarının bağlantılarını kapatabilsin diye
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                completed_at REAL,
+                params TEXT,
+                images TEXT,
+                error TEXT,
+                cancel_requested TEXT
+            )
+        """)
+        # Önceki sürümlerin oluşturduğu tabloya iptal isteği sütunu eklenir
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if "cancel_requested" not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN cancel_requested TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_updated ON tasks (status, updated_at)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn not in self._connections:
+            # Bağlantı yalnızca kendi iş parçacığında kullanılır; close() başka iş parçacığından kapatır
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._connections_lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def _purge(self, conn, now):
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+
+        with conn:
+            conn.execute(
+                f"DELETE FROM tasks WHERE status IN ({_FINISHED_PLACEHOLDERS}) AND updated_at < ?",
+                (*FINISHED_STATUSES, now - self.ttl_seconds)
+            )
+            # Sınır aşıldıysa en eski bitmiş görevleri sil
+            conn.execute(
+                f"""
+                DELETE FROM tasks WHERE id IN (
+                    SELECT id FROM tasks WHERE status IN ({_FINISHED_PLACEHOLDERS})
+                    ORDER BY updated_at
+                    LIMIT max(0, (SELECT COUNT(*) FROM tasks) - ?)
+                )
+                """,
+                (*FINISHED_STATUSES, self.max_tasks)
+            )
+
+    def create(self, task_id, params):
+        conn = self._connection()
+        record = _new_record(params)
+        self._purge(conn, record["created_at"])
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (id, status, created_at, updated_at, params) VALUES (?, ?, ?, ?, ?)",
+                (task_id, record["status"], record["created_at"], record["updated_at"], json.dumps(params))
+            )
+
+    def get(self, task_id):
+        conn = self._connection()
+        now = time.time()
+        self._purge(conn, now)
+        row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        if row["status"] in FINISHED_STATUSES and now - row["updated_at"] > self.ttl_seconds:
+            return None
+        return {
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "completed_at": row["completed_at"],
+            "params": json.loads(row["params"]) if row["params"] else None,
+            "images": json.loads(row["images"]) if row["images"] else None,
+            "error": row["error"],
+            "cancel_requested": row["cancel_requested"],
+        }
+
+    def update(self, task_id, **fields):
+        fields["updated_at"] = time.time()
+        for key in ("params", "images"):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(f"UPDATE tasks SET {columns} WHERE id = ?", (*fields.values(), task_id))
+        return cursor.rowcount > 0
+
+    def delete(self, task_id):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def list_ids(self):
+        conn = self._connection()
+        self._purge(conn, time.time())
+        return [row["id"] for row in conn.execute("SELECT id FROM tasks ORDER BY created_at")]
+
+    def stats(self):
+        conn = self._connection()
+        count = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "tasks": count,
+            "max_tasks": self.max_tasks,
+            "path": self.path,
+        }
+
+    def close(self):
+        """Tüm iş parçacıklarının açtığı bağlantıları kapatır"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local.conn = None
+
+def create_task_store(settings):
+    """Ayarlara göre görev deposunu oluşturur"""
+    if settings.task_store_backend == "sqlite":
+        store = SQLiteTaskStore(
+            settings.task_store_path,
+            ttl_seconds=settings.task_ttl_seconds,
+            max_tasks=settings.max_tasks
+        )
+    else:
+        store = MemoryTaskStore(
+            ttl_seconds=settings.task_ttl_seconds,
+            max_tasks=settings.max_tasks,
+            max_memory_bytes=settings.task_store_max_memory_mb * 1024 * 1024
+        )
+    logger.info(f"Görev deposu oluşturuldu: {settings.task_store_backend}")
+    return store
@@ -1,9 +1,18 @@
 import torch
+import copy
 import logging
 import os
+import time
 import psutil
 import numpy as np
+from PIL import Image
 from diffusers import StableDiffusionInpaintPipeline
+from app.utils.variations import is_out_of_memory
+from app.utils.tile_compositor import TileCompositor
+from app.utils.mask_index import MaskIndex
+from app.utils.prompt_cache import prompt_cache
+from app.services.progress import TaskInterrupted
+from app.utils.cpu_engine import apply_cpu_engine
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +45,31 @@ def get_system_memory():
     """Sistemdeki toplam bellek miktarını GB cinsinden döndürür"""
     return psutil.virtual_memory().total / (1024**3)
 
+def list_gpus():
+    """Tüm CUDA cihazlarını (indeks, ad, VRAM, SD için uygunluk) listeler"""
+    gpus = []
+    if not torch.cuda.is_available():
+        return gpus
+    for index in range(torch.cuda.device_count()):
+        try:
+            gpu_properties = torch.cuda.get_device_properties(index)
+            vram = gpu_properties.total_memory / (1024**3)
+            gpus.append({
+                "index": index,
+                "name": gpu_properties.name,
+                "vram_gb": vram,
+                "suitable_for_sd": vram >= 4.5,
+            })
+        except Exception as e:
+            logger.warning(f"GPU {index} bilgilerini alırken hata: {e}")
+    return gpus
+
+def available_cpu_cores():
+    """Sürecin çalışabileceği CPU çekirdekleri"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(psutil.cpu_count(logical=True) or 1))
+
 def get_device_info():
     """Mevcut hesaplama kaynaklarını tespit eder ve bilgilerini döndürür"""
     info = {
@@ -45,7 +79,8 @@ def get_device_info():
         "has_gpu": torch.cuda.is_available(),
         "gpu_count": torch.cuda.device_count() if torch.cuda.is_available() else 0,
         "cuda_version": torch.version.cuda if torch.cuda.is_available() else None,
-        "device": "cpu"
+        "device": "cpu",
+        "gpus": list_gpus()
     }
     
     if info["has_gpu"]:
@@ -64,12 +99,100 @@ def get_device_info():
             
     return info
 
-def load_optimized_model(model_id="stabilityai/stable-diffusion-2-inpainting"):
+def select_device(system_info, device):
+    """Sistem bilgilerini belirli bir cihaz (ör. cuda:1 veya cpu) için uyarlar"""
+    if not device.startswith("cuda"):
+        return dict(system_info, device="cpu")
+
+    index = torch.device(device).index or 0
+    gpu = next((gpu for gpu in system_info.get("gpus", []) if gpu["index"] == index), None)
+    if gpu is None:
+        raise ValueError(f"Cihaz bulunamadı: {device}")
+    return dict(
+        system_info,
+        device="cuda",
+        gpu_name=gpu["name"],
+        gpu_vram_gb=gpu["vram_gb"],
+        suitable_for_sd=gpu["suitable_for_sd"],
+        recommended_precision="float16" if gpu["vram_gb"] >= 6.0 else "float32"
+    )
+
+def plan_replicas(system_info, devices=None, cpu_replicas=0, cpu_threads_per_replica=16, cpu_replica_memory_gb=4.0):
     """
-    Sistem kaynaklarına göre optimum yapılandırma ile modeli yükler
+    Model kopyalarının cihazlarını planlar. devices verilmemişse uygun her GPU'ya
+    bir kopya, GPU yoksa çekirdek ve RAM'e göre (cpu_replicas = 0 ise) CPU kopyaları
+    planlanır. Birden fazla CPU kopyası varsa çekirdekler eşit bölünür.
+
+    [{"device": "cuda:1" veya "cpu", "cpu_cores": [çekirdekler] veya None}] döndürür.
     """
+    if not devices:
+        gpus = [gpu for gpu in system_info.get("gpus", []) if gpu["suitable_for_sd"]]
+        if system_info["device"] == "cuda" and gpus:
+            devices = [f"cuda:{gpu['index']}" for gpu in gpus]
+        else:
+            count = cpu_replicas or min(
+                len(available_cpu_cores()) // max(1, cpu_threads_per_replica),
+                int(system_info["ram_total_gb"] // max(0.1, cpu_replica_memory_gb))
+            )
+            devices = ["cpu"] * max(1, count)
+
+    cpu_count = devices.count("cpu")
+    partitions = [None] * cpu_count
+    if cpu_count > 1:
+        cores = available_cpu_cores()
+        size = len(cores) // cpu_count
+        if size > 0:
+            partitions = [cores[i * size:(i + 1) * size] for i in range(cpu_count)]
+        else:
+            # Çekirdek sayısı kopya sayısından azsa kopyalar tüm çekirdekleri paylaşır
+            partitions = [cores] * cpu_count
+
+    replicas = []
+    for device in devices:
+        cpu_cores = partitions.pop(0) if device == "cpu" else None
+        replicas.append({"device": device, "cpu_cores": cpu_cores})
+    return replicas
+
+def clone_pipeline(pipe):
+    """
+    Ağırlıkları paylaşan yeni bir pipeline döndürür. Scheduler çağrı sırasında
+    durum tuttuğundan her kopyanın kendi scheduler'ı olur; aynı cihazdaki
+    kopyalar böylece ağırlıkları bir kez yükleyerek paralel çalışabilir.
+    """
+    components = dict(pipe.components, scheduler=copy.deepcopy(pipe.scheduler))
+    return type(pipe)(**components, requires_safety_checker=False)
+
+def estimate_tile_batch_size(system_info):
+    """Cihaz belleğine göre tek pipeline çağrısında işlenebilecek parça sayısını tahmin eder"""
+    if system_info["device"] == "cuda":
+        vram = system_info.get("gpu_vram_gb", 0)
+        if vram >= 12.0:
+            return 4
+        if vram >= 8.0:
+            return 2
+        return 1
+    
+    # CPU'da her 8GB RAM için bir parça (256px parçalar için yeterli pay bırakır)
+    return max(1, min(4, int(system_info["ram_total_gb"] // 8)))
+
+def load_optimized_model(model_id="stabilityai/stable-diffusion-2-inpainting", use_safetensors=None, timings=None,
+                         device=None, cpu_engine=None):
+    """
+    Sistem kaynaklarına göre optimum yapılandırma ile modeli yükler.
+    device verilirse (ör. cuda:1) cihaz tespiti yerine o cihaz kullanılır.
+    cpu_engine, CPU'da uygulanacak motor ayarlarıdır (bkz. app.utils.cpu_engine).
+    Ağırlıklar low_cpu_mem_usage ile (boş modele doğrudan) yüklenir; safetensors
+    dosyaları bellek eşlemeli okunduğundan .bin'e göre tercih edilir.
+    use_safetensors: None ise safetensors varsa kullanılır, yoksa .bin'e dönülür.
+    timings verilirse aşama süreleri (saniye) bu sözlüğe yazılır.
+    """
+    timings = timings if timings is not None else {}
+    started = time.perf_counter()
+
     # Sistem bilgilerini al
     system_info = get_device_info()
+    if device is not None:
+        system_info = select_device(system_info, device)
     logger.info(f"Sistem bilgileri: {system_info}")
     
     # Yapılandırmayı belirle
@@ -82,6 +205,12 @@ def load_optimized_model(model_id="stabilityai/stable-diffusion-2-inpainting"):
             "tiling_required": system_info["device"] == "cpu" or system_info.get("gpu_vram_gb", 0) < 8.0,
             "tile_size": 512 if system_info["device"] == "cuda" else 256,
             "tile_overlap": 64 if system_info["device"] == "cuda" else 32,
+            "tile_batch_size": estimate_tile_batch_size(system_info),
+            # Maske bölgesi planlama ayarları
+            "region_padding": 32,  # Bölge etrafına eklenen bağlam payı (px)
+            "region_merge_distance": 64,  # Bu mesafeden yakın bölgeler birleştirilir (px)
+            "region_min_size": 512 if system_info["device"] == "cuda" else 256,  # Küçük bölgelerin büyütüleceği boyut
+            "region_max_coverage": 0.6,  # Bölgeler bu orandan fazlasını kaplıyorsa tam kare işlenir
         }
     }
     
@@ -96,19 +225,26 @@ def load_optimized_model(model_id="stabilityai/stable-diffusion-2-inpainting"):
         
         logger.info(f"CPU: {system_info['cpu_count']} çekirdek, {system_info['ram_total_gb']:.2f}GB RAM")
         
+    timings["device_detection"] = time.perf_counter() - started
+    
     # Modeli yükle
     logger.info(f"Model yükleniyor: {model_id}")
     logger.info(f"Cihaz: {config['device']}, Veri Tipi: {config['torch_dtype']}")
     
+    started = time.perf_counter()
     pipe = StableDiffusionInpaintPipeline.from_pretrained(
         model_id,
         torch_dtype=config["torch_dtype"],
+        use_safetensors=use_safetensors,
+        low_cpu_mem_usage=True,
         safety_checker=None  # Hızı artırmak için güvenlik kontrolünü devre dışı bırak
     )
+    timings["weights"] = time.perf_counter() - started
     
+    started = time.perf_counter()
     # Cihaza göre optimize et
     if config["device"] == "cuda":
-        pipe = pipe.to("cuda")
+        pipe = pipe.to(device or "cuda")
         
         # GPU için optimizasyonlar
         if system_info.get("gpu_vram_gb", 0) < 8.0:
@@ -123,19 +259,177 @@ def load_optimized_model(model_id="stabilityai/stable-diffusion-2-inpainting"):
     else:
         pipe = pipe.to("cpu")
         
-        # CPU için optimizasyonlar
-        logger.info("CPU optimizasyonları uygulanıyor")
-        pipe.enable_attention_slicing(slice_size=1)
-        
-        # CPU iş parçacığı sayısını ayarla
-        torch.set_num_threads(max(4, min(system_info["cpu_count_logical"] - 2, 8)))
-        
+        # CPU için optimizasyonlar (dikkat, bellek düzeni, bf16, derleme ve iş parçacığı sayısı)
+        config["cpu_engine"] = apply_cpu_engine(pipe, system_info, cpu_engine)
+        logger.info(f"CPU optimizasyonları uygulandı: {config['cpu_engine']}")
+    
+    timings["device_placement"] = time.perf_counter() - started
     return pipe, config
 
+def requires_tiling(config, width, height):
+    """Verilen boyuttaki bir görüntünün tiling ile işlenmesi gerekip gerekmediğini döndürür"""
+    inpainting_settings = config["inpainting_settings"]
+    return inpainting_settings["tiling_required"] or max(width, height) > inpainting_settings["max_resolution"]
+
+def process_batch(pipe, images, mask_images, prompts, negative_prompts, guidance_scale,
+                  num_inference_steps, seeds, callback=None):
+    """
+    Aynı boyuttaki birden fazla görüntüyü tek bir pipeline çağrısında işler.
+    Her öğe kendi prompt, maske ve seed'ine sahiptir; öğe başına generator
+    kullanıldığı için sonuçlar tek tek çağrılarla aynı seed'den üretilebilir.
+    callback(step, timestep, latents) her denoising adımından sonra çağrılır.
+    """
+    width, height = images[0].size
+    generators = [torch.Generator(device=pipe.device).manual_seed(seed) for seed in seeds]
+    # Metin gömmeleri önbellekten alınır (parçalar ve tekrar eden promptlar kodlayıcıyı yeniden çalıştırmaz)
+    prompt_embeds, negative_prompt_embeds = prompt_cache.get_batch(pipe, prompts, negative_prompts)
+
+    return pipe(
+        prompt_embeds=prompt_embeds,
+        negative_prompt_embeds=negative_prompt_embeds,
+        image=list(images),
+        mask_image=list(mask_images),
+        height=height,
+        width=width,
+        guidance_scale=guidance_scale,
+        num_inference_steps=num_inference_steps,
+        generator=generators,
+        callback=callback,
+    ).images
+
+def synthetic_inference(pipe, size, num_inference_steps=1, batch_size=1):
+    """Boş görüntü ve tam maskeyle kısa bir çıkarım yapar (ısıtma, sağlık kontrolü ve ayar ölçümü için)"""
+    return process_batch(
+        pipe=pipe,
+        images=[Image.new("RGB", (size, size))] * batch_size,
+        mask_images=[Image.new("RGB", (size, size), (255, 255, 255))] * batch_size,
+        prompts=[""] * batch_size,
+        negative_prompts=[""] * batch_size,
+        guidance_scale=7.5,
+        num_inference_steps=num_inference_steps,
+        seeds=list(range(batch_size)),
+    )
+
+def process_tiles_batched(pipe, tile_images, tile_masks, prompt, negative_prompt, guidance_scale,
+                          num_inference_steps, seed, batch_size=1, progress=None):
+    """
+    Parçaları aynı boyuttakiler birlikte olacak şekilde toplu pipeline çağrılarıyla işler.
+    Bellek yetmezse toplu boyut yarıya indirilir. Başarısız olan parçalar için None döner.
+    progress verilirse parça sırası ve denoising adımları bildirilir; görev iptal
+    edildiyse veya süresi dolduysa parçalar arasında TaskInterrupted fırlatılır.
+    """
+    results = [None] * len(tile_images)
+    processed = 0
+    
+    # Toplu çağrıda tüm görüntülerin aynı boyutta olması gerekir
+    groups = {}
+    for index, tile_img in enumerate(tile_images):
+        groups.setdefault(tile_img.size, []).append(index)
+    
+    for indices in groups.values():
+        position = 0
+        while position < len(indices):
+            chunk = indices[position:position + batch_size]
+            logger.debug(f"Parça grubu işleniyor: {len(chunk)} parça")
+            if progress is not None:
+                progress.check()
+                progress.set("tile", processed, len(tile_images), span=len(chunk))
+            try:
+                images = process_batch(
+                    pipe=pipe,
+                    images=[tile_images[i] for i in chunk],
+                    mask_images=[tile_masks[i] for i in chunk],
+                    prompts=[prompt] * len(chunk),
+                    negative_prompts=[negative_prompt] * len(chunk),
+                    guidance_scale=guidance_scale,
+                    num_inference_steps=num_inference_steps,
+                    seeds=[seed] * len(chunk),
+                    callback=progress.callback() if progress is not None else None,
+                )
+                for i, tile_result in zip(chunk, images):
+                    results[i] = tile_result
+            except TaskInterrupted:
+                raise
+            except Exception as e:
+                if is_out_of_memory(e) and batch_size > 1:
+                    if torch.cuda.is_available():
+                        torch.cuda.empty_cache()
+                    batch_size = max(1, batch_size // 2)
+                    logger.warning(f"Parçalar için bellek yetersiz, toplu boyut {batch_size} olarak düşürüldü")
+                    continue
+                logger.error(f"Parça işlenirken hata: {e}")
+            position += len(chunk)
+            processed += len(chunk)
+    
+    return results
+
+# Ortalama maske değeri 10/255'in altındaki parçalar işlenmez
+MIN_TILE_COVERAGE = 10 / 255
+# Bu oranın altındaki seyrek parçalarda maske sığıyorsa daha küçük parça kullanılır
+SPARSE_TILE_COVERAGE = 0.25
+
+def plan_tiles(mask_index, width, height, tile_size, tile_overlap):
+    """
+    Maske indeksini kullanarak işlenecek parçaları planlar. Seyrek parçalarda maske
+    yarım boyutlu bir parçaya sığıyorsa parça maskenin etrafına küçültülür; küçültme
+    sonrası maskesi hâlâ neredeyse boş olan parçalar atlanır. Parçalar kapsama
+    oranına göre azalan sırada döner.
+    """
+    # Parça koordinatlarını hesapla
+    x_tiles = np.arange(0, width, tile_size - tile_overlap)
+    y_tiles = np.arange(0, height, tile_size - tile_overlap)
+    
+    # Son parçaların doğru kenardan başlamasını sağla
+    # (görüntü parçadan küçükse negatif başlangıç oluşmaması için 0'a sabitlenir)
+    if len(x_tiles) > 1 and x_tiles[-1] + tile_size > width:
+        x_tiles[-1] = max(0, width - tile_size)
+    if len(y_tiles) > 1 and y_tiles[-1] + tile_size > height:
+        y_tiles[-1] = max(0, height - tile_size)
+    x_tiles = np.unique(x_tiles)
+    y_tiles = np.unique(y_tiles)
+    
+    # Küçük parça boyutu: yarım parça, 8'in katı ve en az 64px
+    small_tile_size = max(64, (tile_size // 2) // 8 * 8)
+    
+    planned = {}
+    for x_start in x_tiles:
+        for y_start in y_tiles:
+            x_start, y_start = int(x_start), int(y_start)
+            x_end = min(x_start + tile_size, width)
+            y_end = min(y_start + tile_size, height)
+            
+            # Maskede inpainting gerekli mi kontrol et (sabit zamanlı sorgu)
+            if mask_index.count(x_start, y_start, x_end, y_end) == 0:
+                continue
+            
+            tile = (x_start, y_start, x_end, y_end)
+            coverage = mask_index.coverage(*tile)
+            
+            # Seyrek maske kenarlarında maskeyi kapsayan daha küçük bir parça yeterli olabilir
+            if coverage < SPARSE_TILE_COVERAGE and small_tile_size < min(x_end - x_start, y_end - y_start):
+                bx0, by0, bx1, by1 = mask_index.bounding_box(x_start, y_start, x_end, y_end)
+                if bx1 - bx0 <= small_tile_size and by1 - by0 <= small_tile_size:
+                    # Küçük parçayı maskenin ortasına yerleştir, görüntü içinde ve 8'in katında tut
+                    sx = ((bx0 + bx1) // 2 - small_tile_size // 2) // 8 * 8
+                    sy = ((by0 + by1) // 2 - small_tile_size // 2) // 8 * 8
+                    sx = min(max(sx, 0), width - small_tile_size)
+                    sy = min(max(sy, 0), height - small_tile_size)
+                    tile = (sx, sy, sx + small_tile_size, sy + small_tile_size)
+                    coverage = mask_index.coverage(*tile)
+            
+            if coverage < MIN_TILE_COVERAGE:
+                continue
+            planned[tile] = coverage
+    
+    # Yoğun parçalar önce işlenir
+    return sorted(planned, key=lambda tile: planned[tile], reverse=True)
+
 def process_with_auto_tiling(pipe, image, mask_image, prompt, negative_prompt, guidance_scale, 
-                            num_inference_steps, seed, config):
+                            num_inference_steps, seed, config, mask_index=None, progress=None):
     """
-    Sistem durumuna göre otomatik olarak tiling uygulayan veya doğrudan işlem yapan fonksiyon
+    Sistem durumuna göre otomatik olarak tiling uygulayan veya doğrudan işlem yapan fonksiyon.
+    Aynı maske için tekrar tekrar çağrılıyorsa önceden oluşturulmuş mask_index verilebilir.
+    progress verilirse parça ve adım ilerlemesi bildirilir.
     """
     import torch
     import numpy as np
@@ -145,22 +439,22 @@ def process_with_auto_tiling(pipe, image, mask_image, prompt, negative_prompt, g
     width, height = image.size
     
     # Tiling gerekli mi kontrol et
-    max_res = config["inpainting_settings"]["max_resolution"]
     tile_size = config["inpainting_settings"]["tile_size"]
     tile_overlap = config["inpainting_settings"]["tile_overlap"]
-    requires_tiling = config["inpainting_settings"]["tiling_required"] or max(width, height) > max_res
     
     # Tiling gerekmiyorsa doğrudan işle
-    if not requires_tiling:
+    if not requires_tiling(config, width, height):
         generator = torch.Generator(device=pipe.device).manual_seed(seed)
+        prompt_embeds, negative_prompt_embeds = prompt_cache.get(pipe, prompt, negative_prompt)
         return pipe(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
+            prompt_embeds=prompt_embeds,
+            negative_prompt_embeds=negative_prompt_embeds,
             image=image,
             mask_image=mask_image,
             guidance_scale=guidance_scale,
             num_inference_steps=num_inference_steps,
             generator=generator,
+            callback=progress.callback() if progress is not None else None,
         ).images[0]
     
     # Tiling gerekiyorsa parçalara bölerek işle
@@ -168,87 +462,48 @@ def process_with_auto_tiling(pipe, image, mask_image, prompt, negative_prompt, g
     
     # Resmi NumPy dizisine dönüştür
     img_np = np.array(image)
-    mask_np = np.array(mask_image.convert("L"))
+    # Maske prepare_inputs'ta L moduna getirilip ters çevrildi (beyaz=inpaint)
+    mask_np = np.array(mask_image if mask_image.mode == "L" else mask_image.convert("L"))
     
-    # Maskeyi işle (beyaz=inpaint)
-    mask_np = 255 - mask_np  # Invertle
+    # İşlenmesi gereken parçaları maske indeksi ile planla
+    if mask_index is None:
+        mask_index = MaskIndex(mask_np)
+    tiles = plan_tiles(mask_index, width, height, tile_size, tile_overlap)
     
-    # Sonuç görüntüsünü oluştur
-    result_np = np.copy(img_np)
+    # Parçaları cihaz belleğine uygun boyutta toplu çağrılarla işle
+    tile_batch_size = config["inpainting_settings"].get("tile_batch_size", 1)
+    logger.info(f"{len(tiles)} parça işlenecek (toplu boyut: {tile_batch_size})")
     
-    # Parça koordinatlarını hesapla
-    x_tiles = np.arange(0, width, tile_size - tile_overlap)
-    y_tiles = np.arange(0, height, tile_size - tile_overlap)
+    tile_results = process_tiles_batched(
+        pipe=pipe,
+        tile_images=[Image.fromarray(img_np[y0:y1, x0:x1]) for x0, y0, x1, y1 in tiles],
+        tile_masks=[Image.fromarray(mask_np[y0:y1, x0:x1]) for x0, y0, x1, y1 in tiles],
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        guidance_scale=guidance_scale,
+        num_inference_steps=num_inference_steps,
+        seed=seed,
+        batch_size=tile_batch_size,
+        progress=progress
+    )
     
-    # Son parçaların doğru kenardan başlamasını sağla
-    if len(x_tiles) > 1 and x_tiles[-1] + tile_size > width:
-        x_tiles[-1] = width - tile_size
-    if len(y_tiles) > 1 and y_tiles[-1] + tile_size > height:
-        y_tiles[-1] = height - tile_size
+    # İşlenen parçaları ağırlıklı birikim ile birleştir
+    # (tamponlar yalnızca işlenen parçaları kapsayan alan için ayrılır)
+    region = None
+    if tiles:
+        region = (
+            min(t[0] for t in tiles), min(t[1] for t in tiles),
+            max(t[2] for t in tiles), max(t[3] for t in tiles),
+        )
+    compositor = TileCompositor(width, height, overlap=tile_overlap, region=region)
+    for (x_start, y_start, x_end, y_end), tile_result in zip(tiles, tile_results):
+        # Hata durumunda bu parçayı atla
+        if tile_result is None:
+            continue
+        compositor.add(np.asarray(tile_result), x_start, y_start)
     
-    # Her bir parçayı işle
-    for x_start in x_tiles:
-        for y_start in y_tiles:
-            # Parça koordinatlarını ayarla
-            x_end = min(x_start + tile_size, width)
-            y_end = min(y_start + tile_size, height)
-            
-            # Parçayı kes
-            tile_img = Image.fromarray(img_np[y_start:y_end, x_start:x_end])
-            tile_mask = Image.fromarray(mask_np[y_start:y_end, x_start:x_end])
-            
-            # Maskede inpainting gerekli mi kontrol et
-            if np.mean(mask_np[y_start:y_end, x_start:x_end]) < 10:  # Maske neredeyse tamamen siyah ise (işlem gerekmiyor)
-                continue
-            
-            logger.debug(f"Parça işleniyor: ({x_start},{y_start}) - ({x_end},{y_end})")
-            
-            # Parçayı işle
-            generator = torch.Generator(device=pipe.device).manual_seed(seed)
-            try:
-                tile_result = pipe(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    image=tile_img,
-                    mask_image=tile_mask,
-                    guidance_scale=guidance_scale,
-                    num_inference_steps=num_inference_steps,
-                    generator=generator,
-                ).images[0]
-                
-                # İşlenmiş parçayı NumPy dizisine dönüştür
-                tile_result_np = np.array(tile_result)
-                
-                # Kenar yumuşatma için maskeleme
-                if tile_overlap > 0 and (x_start > 0 or y_start > 0):
-                    blend_mask = np.ones((y_end - y_start, x_end - x_start))
-                    
-                    # Yatay geçiş maskesi
-                    if x_start > 0:
-                        for i in range(tile_overlap):
-                            blend_mask[:, i] = i / tile_overlap
-                    
-                    # Dikey geçiş maskesi
-                    if y_start > 0:
-                        for i in range(tile_overlap):
-                            blend_mask[i, :] *= i / tile_overlap
-                    
-                    # Geçiş maskeleme ile sonuç görüntüsünü güncelle
-                    blend_mask = np.expand_dims(blend_mask, axis=2).repeat(3, axis=2)
-                    result_np[y_start:y_end, x_start:x_end] = (
-                        tile_result_np * blend_mask + 
-                        result_np[y_start:y_end, x_start:x_end] * (1 - blend_mask)
-                    ).astype(np.uint8)
-                else:
-                    # Maskelenmiş bölgeleri güncelle
-                    mask_region = (mask_np[y_start:y_end, x_start:x_end] > 128)
-                    mask_region = np.expand_dims(mask_region, axis=2).repeat(3, axis=2)
-                    result_np[y_start:y_end, x_start:x_end][mask_region] = tile_result_np[mask_region]
-            
-            except Exception as e:
-                logger.error(f"Parça işlenirken hata: {e}")
-                # Hata durumunda bu parçayı atla
-                continue
+    # Maske dışındaki pikseller orijinal görüntüden korunur
+    result_np = compositor.result(img_np, mask_np)
     
     # Sonuç görüntüsünü döndür
     return Image.fromarray(result_np)
\ No newline at end of file
@@ -0,0 +1,117 @@
+import os
+import json
+import logging
+import contextlib
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# config/config.json içindeki "cpu_engine" bölümünün varsayılanları.
+# mode: "legacy" (dilimlenmiş dikkat, 4-8 iş parçacığı) veya "optimized".
+# Dağıtılan yapılandırma "legacy" ile gelir; "optimized" modu açıkça seçilmelidir
+# (README'deki "CPU Motoru" bölümü). legacy modunda diğer anahtarlar kullanılmaz.
+CPU_ENGINE_DEFAULTS = {
+    "mode": "legacy",
+    "bf16_autocast": "auto",  # "auto": yalnızca CPU bf16 destekliyorsa (AVX512-BF16/AMX)
+    "channels_last": True,
+    "compile": "none",  # "none" veya "torch_compile" (UNet ve VAE çözücüsü)
+    "attention": "auto",  # "auto": RAM yetiyorsa SDPA, yoksa dilimleme; "sdpa" veya "sliced"
+    "sdpa_min_ram_gb": 16,  # "auto" dikkat modunda SDPA için gereken toplam RAM (GB)
+    "num_threads": 0,  # 0 = fiziksel çekirdek sayısı
+}
+
+def load_cpu_engine_settings(path):
+    """config.json'daki cpu_engine bölümünü varsayılanlarla birleştirerek okur"""
+    engine = dict(CPU_ENGINE_DEFAULTS)
+    if not path or not os.path.exists(path):
+        return engine
+    try:
+        with open(path, "r") as f:
+            engine.update(json.load(f).get("cpu_engine", {}))
+    except (OSError, ValueError) as e:
+        logger.warning(f"CPU motoru ayarları okunamadı ({path}): {e}")
+    return engine
+
+def bf16_supported():
+    """CPU'nun oneDNN üzerinden bfloat16 hesaplamayı donanımla destekleyip desteklemediği"""
+    check = getattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", None)
+    try:
+        return bool(check()) if check is not None else False
+    except Exception:
+        return False
+
+def set_attention(pipe, attention):
+    """
+    Dikkat hesaplamasını seçer ve uygulananı döndürür: "sdpa" (tek seferde,
+    scaled_dot_product_attention), "sliced" (iki dilim) veya "max" (slice_size=1,
+    en az bellek). SDPA yoksa "sliced" kullanılır.
+    """
+    if attention == "sdpa" and hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+        from diffusers.models.attention_processor import AttnProcessor2_0
+        pipe.unet.set_attn_processor(AttnProcessor2_0())
+        # Bu diffusers sürümünde VAE'nin dikkat bloğu SDPA'yı zaten kendisi kullanır
+        if hasattr(pipe.vae, "set_attn_processor"):
+            pipe.vae.set_attn_processor(AttnProcessor2_0())
+        return "sdpa"
+    if attention == "max":
+        pipe.enable_attention_slicing(slice_size=1)
+        return "max"
+    pipe.enable_attention_slicing("auto")
+    return "sliced"
+
+def physical_cores(system_info):
+    """Sürecin kullanabileceği fiziksel çekirdek sayısı (CPU kısıtlı konteynerlerde affinity ile sınırlanır)"""
+    cores = system_info.get("cpu_count") or system_info["cpu_count_logical"]
+    if hasattr(os, "sched_getaffinity"):
+        cores = min(cores, len(os.sched_getaffinity(0)))
+    return max(1, cores)
+
+def apply_cpu_engine(pipe, system_info, engine=None):
+    """
+    CPU pipeline'ına motor ayarlarını uygular ve uygulananları döndürür.
+    legacy modu önceki davranıştır: slice_size=1 dikkat dilimleme ve 4-8 iş parçacığı.
+    optimized modunda SDPA (RAM yetiyorsa), channels_last, isteğe bağlı bf16
+    autocast ve torch.compile kullanılır; iş parçacığı sayısı çekirdek sayısına göre seçilir.
+    """
+    engine = dict(CPU_ENGINE_DEFAULTS, **(engine or {}))
+    applied = {"mode": engine["mode"], "bf16_autocast": False}
+
+    if engine["mode"] != "optimized":
+        set_attention(pipe, "max")
+        num_threads = max(4, min(system_info["cpu_count_logical"] - 2, 8))
+        torch.set_num_threads(num_threads)
+        applied.update(attention="max", num_threads=num_threads)
+        return applied
+
+    # Dikkat: SDPA tüm dikkat matrisini tek seferde hesaplar; az RAM'de yarım dilimleme kullanılır
+    attention = engine["attention"]
+    if attention == "auto":
+        attention = "sdpa" if system_info["ram_total_gb"] >= engine["sdpa_min_ram_gb"] else "sliced"
+    applied["attention"] = set_attention(pipe, "sdpa" if attention == "sdpa" else "sliced")
+
+    if engine["channels_last"]:
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+        applied["channels_last"] = True
+
+    bf16 = engine["bf16_autocast"]
+    if bf16 == "auto":
+        bf16 = bf16_supported()
+    applied["bf16_autocast"] = bool(bf16)
+
+    if engine["compile"] == "torch_compile" and hasattr(torch, "compile"):
+        pipe.unet = torch.compile(pipe.unet)
+        pipe.vae.decoder = torch.compile(pipe.vae.decoder)
+        applied["compile"] = "torch_compile"
+
+    num_threads = engine["num_threads"] or physical_cores(system_info)
+    torch.set_num_threads(num_threads)
+    applied["num_threads"] = num_threads
+    return applied
+
+def inference_context(config):
+    """Model yapılandırmasına göre çıkarım bağlamı (CPU'da bf16 autocast veya boş bağlam)"""
+    if not (config or {}).get("cpu_engine", {}).get("bf16_autocast"):
+        return contextlib.nullcontext()
+    return torch.autocast("cpu", dtype=torch.bfloat16)
@@ -1,14 +1,61 @@
 from PIL import Image
 import numpy as np
 import io
+import os
 import base64
 
-def pil_to_base64(image, format="PNG"):
-    """PIL görüntüsünü base64'e dönüştür"""
+# API'deki çıktı formatları: PIL formatı, dosya uzantısı, MIME tipi ve ek kaydetme ayarları
+OUTPUT_FORMATS = {
+    "png": ("PNG", "png", "image/png", {}),
+    "jpeg": ("JPEG", "jpg", "image/jpeg", {}),
+    "webp": ("WEBP", "webp", "image/webp", {"method": 4}),
+    # Kayıpsız WebP'de quality sıkıştırma eforudur; düşük efor aynı boyutta çok daha hızlıdır
+    "webp_lossless": ("WEBP", "webp", "image/webp", {"lossless": True, "method": 1, "quality": 25}),
+}
+
+def get_output_format(format):
+    """Format adını (büyük/küçük harf duyarsız, 'jpg' dahil) OUTPUT_FORMATS girdisine çevirir"""
+    name = format.lower()
+    if name == "jpg":
+        name = "jpeg"
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Desteklenmeyen çıktı formatı: {format}")
+    return OUTPUT_FORMATS[name]
+
+def encode_image(image, format="png", quality=90, compress_level=6):
+    """
+    PIL görüntüsünü verilen formatta bir kez kodlayıp baytlarını döndür.
+    quality JPEG ve kayıplı WebP için (1-100), compress_level yalnızca PNG
+    içindir (0-9). Kayıpsız WebP sabit bir sıkıştırma eforu kullanır.
+    """
+    pil_format, _, _, options = get_output_format(format)
+    options = dict(options)
+
+    if pil_format == "PNG":
+        options["compress_level"] = compress_level
+    else:
+        options.setdefault("quality", quality)
+
+    # JPEG alfa kanalını desteklemez
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
     buffered = io.BytesIO()
-    image.save(buffered, format=format)
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return f"data:image/{format.lower()};base64,{img_str}"
+    image.save(buffered, format=pil_format, **options)
+    return buffered.getvalue()
+
+def write_file_atomic(path, data):
+    """Baytları önce geçici dosyaya yazıp yeniden adlandırır; okuyucular yarım dosya görmez"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def pil_to_base64(image, format="PNG", **options):
+    """PIL görüntüsünü base64'e dönüştür (encode_image ile aynı kodlayıcı)"""
+    media_type = get_output_format(format)[2]
+    img_str = base64.b64encode(encode_image(image, format, **options)).decode()
+    return f"data:{media_type};base64,{img_str}"
 
 def base64_to_pil(base64_str):
     """Base64 string'i PIL görüntüsüne dönüştür"""
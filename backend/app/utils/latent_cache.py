@@ -0,0 +1,30 @@
+import hashlib
+from app.utils.tensor_cache import TensorLRUCache
+
+class MaskedImageLatentCache(TensorLRUCache):
+    """
+    Maskelenmiş görüntünün VAE latent dağılımı (ortalama ve standart sapma) için
+    LRU önbellek. Anahtar VAE, görüntü+maske özeti ve çözünürlüktür. Aynı yükleme
+    farklı seed veya promptlarla yeniden çalıştırıldığında VAE kodlaması atlanır;
+    örnekleme her seed için dağılımdan ayrıca yapıldığından sonuçlar değişmez.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        super().__init__(max_bytes)
+
+    @staticmethod
+    def key(pipe, image, mask_image):
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (image, mask_image):
+            digest.update(part.mode.encode())
+            digest.update(part.tobytes())
+        vae = pipe.vae
+        return (
+            vae.config.get("_name_or_path", ""),
+            str(vae.dtype),
+            digest.hexdigest(),
+            image.size,
+        )
+
+# Süreç genelinde paylaşılan önbellek; boyutu uygulama başlarken ayarlanır
+latent_cache = MaskedImageLatentCache()
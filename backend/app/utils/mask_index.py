@@ -0,0 +1,72 @@
+import numpy as np
+
+class MaskIndex:
+    """
+    Maske için integral görüntü (summed-area table) indeksi. İstek başına bir kez
+    oluşturulur; herhangi bir dikdörtgendeki maskeli piksel sayısı ve kapsama oranı
+    sabit zamanda, maskeli alanın sınırlayıcı kutusu ise logaritmik zamanda bulunur.
+    """
+
+    def __init__(self, mask_np, threshold=128):
+        binary = mask_np > threshold
+        self.height, self.width = binary.shape
+
+        # Toplam piksel sayısına göre en küçük yeterli tamsayı tipi
+        dtype = np.int32 if self.height * self.width < 2**31 else np.int64
+        self._sat = np.zeros((self.height + 1, self.width + 1), dtype=dtype)
+        np.cumsum(np.cumsum(binary, axis=0, dtype=dtype), axis=1, out=self._sat[1:, 1:])
+
+    @property
+    def total(self):
+        """Maskedeki toplam maskeli piksel sayısı"""
+        return int(self._sat[-1, -1])
+
+    def _clamp(self, x0, y0, x1, y1):
+        return (
+            min(max(int(x0), 0), self.width),
+            min(max(int(y0), 0), self.height),
+            min(max(int(x1), 0), self.width),
+            min(max(int(y1), 0), self.height),
+        )
+
+    def count(self, x0, y0, x1, y1):
+        """[x0, x1) x [y0, y1) dikdörtgenindeki maskeli piksel sayısı"""
+        x0, y0, x1, y1 = self._clamp(x0, y0, x1, y1)
+        if x1 <= x0 or y1 <= y0:
+            return 0
+        sat = self._sat
+        return int(sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0])
+
+    def coverage(self, x0, y0, x1, y1):
+        """Dikdörtgenin maskeli piksel oranı (0-1)"""
+        x0, y0, x1, y1 = self._clamp(x0, y0, x1, y1)
+        area = (x1 - x0) * (y1 - y0)
+        if area <= 0:
+            return 0.0
+        return self.count(x0, y0, x1, y1) / area
+
+    def bounding_box(self, x0, y0, x1, y1):
+        """
+        Dikdörtgen içindeki maskeli piksellerin sınırlayıcı kutusunu döndürür.
+        Maskeli piksel yoksa None döner.
+        """
+        x0, y0, x1, y1 = self._clamp(x0, y0, x1, y1)
+        if self.count(x0, y0, x1, y1) == 0:
+            return None
+
+        def first(lo, hi, has_any):
+            # has_any(k) monoton olduğundan ilk True değerini ikili arama ile bul
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if has_any(mid):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            return lo
+
+        left = first(x0, x1 - 1, lambda k: self.count(x0, y0, k + 1, y1) > 0)
+        right = first(x0, x1 - 1, lambda k: self.count(k + 1, y0, x1, y1) == 0)
+        top = first(y0, y1 - 1, lambda k: self.count(x0, y0, x1, k + 1) > 0)
+        bottom = first(y0, y1 - 1, lambda k: self.count(x0, k + 1, x1, y1) == 0)
+
+        return (left, top, right + 1, bottom + 1)
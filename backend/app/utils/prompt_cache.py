@@ -0,0 +1,51 @@
+import torch
+import logging
+from app.utils.tensor_cache import TensorLRUCache
+
+logger = logging.getLogger(__name__)
+
+class PromptEmbeddingCache(TensorLRUCache):
+    """
+    Metin kodlayıcı çıktıları için istekler, parçalar ve varyasyonlar arasında
+    paylaşılan LRU önbellek. Anahtar (model, prompt, negatif prompt) üçlüsüdür;
+    değer tek öğelik prompt_embeds ve negative_prompt_embeds tensörleridir.
+    Toplam tensör boyutu max_bytes'ı aşarsa en uzun süredir kullanılmayan
+    kayıtlar çıkarılır.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        super().__init__(max_bytes)
+
+    @staticmethod
+    def _model_key(pipe):
+        # Gömmeler yalnızca metin kodlayıcıya ve veri tipine bağlıdır
+        text_encoder = pipe.text_encoder
+        return (getattr(text_encoder.config, "_name_or_path", ""), str(text_encoder.dtype))
+
+    def get(self, pipe, prompt, negative_prompt):
+        """Tek bir prompt için (prompt_embeds, negative_prompt_embeds) döndürür"""
+        device = pipe._execution_device
+        key = (self._model_key(pipe), prompt, negative_prompt or "")
+
+        entry = self.lookup(key)
+        if entry is None:
+            # Negatif gömme guidance kapalı olsa da hesaplanır, böylece kayıt her çağrıda kullanılabilir
+            with torch.no_grad():
+                embeds = pipe._encode_prompt(prompt, device, 1, True, negative_prompt or None)
+            # Autocast altında kodlansa da gömmeler metin kodlayıcının veri tipinde saklanır
+            embeds = embeds.to(pipe.text_encoder.dtype)
+            negative_embeds, prompt_embeds = embeds.chunk(2)
+            entry = (prompt_embeds, negative_embeds)
+            self.store(key, entry)
+
+        prompt_embeds, negative_embeds = entry
+        # Farklı cihazdaki bir pipeline da aynı kaydı kullanabilir
+        return prompt_embeds.to(device), negative_embeds.to(device)
+
+    def get_batch(self, pipe, prompts, negative_prompts):
+        """Öğe başına prompt listeleri için toplu (prompt_embeds, negative_prompt_embeds) döndürür"""
+        pairs = [self.get(pipe, prompt, negative_prompt) for prompt, negative_prompt in zip(prompts, negative_prompts)]
+        return torch.cat([pair[0] for pair in pairs]), torch.cat([pair[1] for pair in pairs])
+
+# Süreç genelinde paylaşılan önbellek; boyutu uygulama başlarken ayarlanır
+prompt_cache = PromptEmbeddingCache()
@@ -0,0 +1,143 @@
+import logging
+import numpy as np
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Bağlı bölge analizi bu boyuttaki bloklar üzerinde yapılır (latent hizalamasıyla uyumlu)
+BLOCK_SIZE = 8
+
+def _snap_box(box, width, height, multiple=8):
+    """Kutuyu dışa doğru verilen katlara hizalar ve görüntü sınırlarına sığdırır"""
+    x0, y0, x1, y1 = box
+    x0 = max(0, (x0 // multiple) * multiple)
+    y0 = max(0, (y0 // multiple) * multiple)
+    x1 = min(width, -(-x1 // multiple) * multiple)
+    y1 = min(height, -(-y1 // multiple) * multiple)
+    return (x0, y0, x1, y1)
+
+def _boxes_near(a, b, distance):
+    """İki kutu arasındaki boşluk verilen mesafeden küçük veya eşitse True döner"""
+    return (
+        a[0] <= b[2] + distance and b[0] <= a[2] + distance and
+        a[1] <= b[3] + distance and b[1] <= a[3] + distance
+    )
+
+def merge_boxes(boxes, distance):
+    """Birbirine verilen mesafeden yakın kutuları kararlı hale gelene kadar birleştirir"""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        while boxes:
+            current = boxes.pop()
+            i = 0
+            while i < len(boxes):
+                if _boxes_near(current, boxes[i], distance):
+                    other = boxes.pop(i)
+                    current = (
+                        min(current[0], other[0]), min(current[1], other[1]),
+                        max(current[2], other[2]), max(current[3], other[3]),
+                    )
+                    merged = True
+                else:
+                    i += 1
+            result.append(current)
+        boxes = result
+    return boxes
+
+def find_mask_regions(mask_np, threshold=128):
+    """
+    Maskedeki (beyaz=inpaint) bağlı bölgelerin sınırlayıcı kutularını döndürür.
+    Analiz BLOCK_SIZE piksellik bloklar üzerinde yapılır; kutular blok sınırlarına hizalıdır.
+    """
+    height, width = mask_np.shape
+    grid_h = -(-height // BLOCK_SIZE)
+    grid_w = -(-width // BLOCK_SIZE)
+
+    # Blok içinde en az bir maskeli piksel varsa blok doludur
+    padded = np.zeros((grid_h * BLOCK_SIZE, grid_w * BLOCK_SIZE), dtype=bool)
+    padded[:height, :width] = mask_np > threshold
+    occupied = padded.reshape(grid_h, BLOCK_SIZE, grid_w, BLOCK_SIZE).any(axis=(1, 3))
+
+    visited = np.zeros_like(occupied)
+    boxes = []
+    for start_y, start_x in zip(*np.nonzero(occupied)):
+        if visited[start_y, start_x]:
+            continue
+
+        # 8-komşuluk ile taşma doldurma
+        min_x = max_x = start_x
+        min_y = max_y = start_y
+        visited[start_y, start_x] = True
+        queue = deque([(start_y, start_x)])
+        while queue:
+            y, x = queue.popleft()
+            min_x, max_x = min(min_x, x), max(max_x, x)
+            min_y, max_y = min(min_y, y), max(max_y, y)
+            for ny in (y - 1, y, y + 1):
+                for nx in (x - 1, x, x + 1):
+                    if 0 <= ny < grid_h and 0 <= nx < grid_w and occupied[ny, nx] and not visited[ny, nx]:
+                        visited[ny, nx] = True
+                        queue.append((ny, nx))
+
+        boxes.append((
+            int(min_x) * BLOCK_SIZE,
+            int(min_y) * BLOCK_SIZE,
+            min(width, (int(max_x) + 1) * BLOCK_SIZE),
+            min(height, (int(max_y) + 1) * BLOCK_SIZE),
+        ))
+
+    return boxes
+
+def plan_regions(mask_np, inpainting_settings):
+    """
+    İşlenecek bölgeleri planlar.
+
+    - Maske boşsa boş liste döner (girdi doğrudan döndürülebilir).
+    - Bölgeler görüntünün büyük kısmını kaplıyorsa tam kare [(0, 0, w, h)] döner.
+    - Aksi halde yakın bölgeler birleştirilir, bağlam payı eklenir ve kutular 8'in katlarına hizalanır.
+    """
+    height, width = mask_np.shape
+    full_frame = [(0, 0, width, height)]
+
+    padding = inpainting_settings.get("region_padding", 32)
+    merge_distance = inpainting_settings.get("region_merge_distance", 64)
+    max_coverage = inpainting_settings.get("region_max_coverage", 0.6)
+
+    boxes = find_mask_regions(mask_np)
+    if not boxes:
+        return []
+
+    boxes = merge_boxes(boxes, merge_distance)
+    boxes = [
+        _snap_box((x0 - padding, y0 - padding, x1 + padding, y1 + padding), width, height)
+        for x0, y0, x1, y1 in boxes
+    ]
+    # Bağlam payı eklendikten sonra örtüşen kutular tekrar birleştirilir
+    boxes = merge_boxes(boxes, 0)
+
+    covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes)
+    if covered >= max_coverage * width * height:
+        return full_frame
+
+    logger.info(
+        f"{len(boxes)} maske bölgesi planlandı, işlenen alan: %{100 * covered / (width * height):.1f}"
+    )
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+def crop_scale(box, min_size):
+    """
+    Kırpılan bölge modelin doğal çözünürlüğünden küçükse büyütme hedef boyutunu döndürür
+    (8'in katlarına hizalı). Büyütme gerekmiyorsa None döner.
+    """
+    crop_w = box[2] - box[0]
+    crop_h = box[3] - box[1]
+    if max(crop_w, crop_h) >= min_size:
+        return None
+
+    scale = min_size / max(crop_w, crop_h)
+    target_w = max(8, int(round(crop_w * scale / 8)) * 8)
+    target_h = max(8, int(round(crop_h * scale / 8)) * 8)
+    return (target_w, target_h)
@@ -0,0 +1,91 @@
+import os
+import re
+import hmac
+import hashlib
+import secrets
+import logging
+import threading
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Görüntü ve ilerleme akışı adresleri lisans doğrulamasından geçmez (<img src> ve
+# EventSource başlık gönderemez); adresteki imza görevin sahibine verilen URL'yi doğrular
+IMAGE_PATH_PATTERN = re.compile(r"^/inpaint/[^/]+/images/\d+$")
+EVENTS_PATH_PATTERN = re.compile(r"^/inpaint/[^/]+/events$")
+
+# image_url_secret ayarlanmamışsa ve görevler bellekte tutuluyorsa süreç başına rastgele anahtar
+# (görevler de yeniden başlatmada kaybolduğu için adreslerin geçersizleşmesi sorun değildir)
+_fallback_secret = secrets.token_bytes(32)
+
+# SQLite görev deposunda görev veritabanının yanında saklanan anahtar dosyası
+IMAGE_URL_SECRET_FILE = "image_url_secret"
+
+_persisted_secret = None
+_persisted_secret_lock = threading.Lock()
+
+def load_or_create_secret(path):
+    """
+    Dosyadaki anahtarı okur; dosya yoksa rastgele anahtar üretip yazar. Aynı anda
+    başlayan işçiler aynı anahtarı kullansın diye dosya geçici dosyadan os.link ile
+    tek seferde oluşturulur; yarışı kaybeden işçi kazananın anahtarını okur.
+    """
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(temp_path, path)
+            logger.info(f"Görüntü adresi anahtarı oluşturuldu: {path}")
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    with open(path, "r") as f:
+        return f.read().strip().encode()
+
+def _image_url_key():
+    global _persisted_secret
+    if settings.image_url_secret:
+        return settings.image_url_secret.encode()
+    if settings.task_store_backend != "sqlite":
+        return _fallback_secret
+    # Görev deposunu paylaşan işçiler ve yeniden başlatmalar aynı anahtarı kullanmalıdır
+    if _persisted_secret is None:
+        with _persisted_secret_lock:
+            if _persisted_secret is None:
+                path = os.path.join(os.path.dirname(settings.task_store_path), IMAGE_URL_SECRET_FILE)
+                _persisted_secret = load_or_create_secret(path)
+    return _persisted_secret
+
+def _sign(message):
+    return hmac.new(_image_url_key(), message.encode(), hashlib.sha256).hexdigest()[:32]
+
+def sign_image_url(task_id, index):
+    """Görevin index numaralı görüntüsü için tahmin edilemeyen imza"""
+    return _sign(f"{task_id}/{index}")
+
+def verify_image_signature(task_id, index, signature):
+    """Adresteki imza bu görüntü için üretilmişse True"""
+    return hmac.compare_digest(sign_image_url(task_id, index), signature or "")
+
+def sign_events_url(task_id):
+    """Görevin ilerleme akışı için tahmin edilemeyen imza"""
+    return _sign(f"{task_id}/events")
+
+def verify_events_signature(task_id, signature):
+    """Adresteki imza bu görevin ilerleme akışı için üretilmişse True"""
+    return hmac.compare_digest(sign_events_url(task_id), signature or "")
+
+def is_image_request(request):
+    """İstek imzalı görüntü adresine yapılan bir GET ise True"""
+    return request.method in ("GET", "HEAD") and IMAGE_PATH_PATTERN.match(request.url.path) is not None
+
+def is_events_request(request):
+    """İstek imzalı ilerleme akışı adresine yapılan bir GET ise True"""
+    return request.method == "GET" and EVENTS_PATH_PATTERN.match(request.url.path) is not None
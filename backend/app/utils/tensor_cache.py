@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+
+def tensor_bytes(tensors):
+    """Tensör grubunun bellekte kapladığı alan (bayt)"""
+    return sum(tensor.element_size() * tensor.nelement() for tensor in tensors)
+
+class TensorLRUCache:
+    """
+    Değerleri tensör grupları olan, toplam tensör boyutuyla sınırlı LRU önbellek.
+    Boyut max_bytes'ı aşarsa en uzun süredir kullanılmayan kayıtlar çıkarılır;
+    tek başına sınırı aşan kayıtlar saklanmaz.
+    """
+
+    def __init__(self, max_bytes):
+        # 0 = önbellek kapalı
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def lookup(self, key):
+        """Kaydı döndürür, yoksa None (isabet/ıska sayaçları güncellenir)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def store(self, key, entry):
+        size = tensor_bytes(entry)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= tensor_bytes(previous)
+            self._entries[key] = entry
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= tensor_bytes(evicted)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
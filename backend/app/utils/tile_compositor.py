@@ -0,0 +1,126 @@
+import numpy as np
+from functools import lru_cache
+
+@lru_cache(maxsize=64)
+def feather_weights(height, width, channels, overlap, left, top, right, bottom):
+    """
+    Parça için yumuşatma ağırlıklarını (height, width, channels) olarak döndürür.
+    Komşu parçası olan her kenarda ağırlık overlap piksel boyunca doğrusal olarak
+    artar; görüntü sınırındaki kenarlarda ağırlık 1'dir. Sonuç önbelleğe alınır
+    ve salt okunurdur.
+    """
+    ramp_x = np.ones(width, dtype=np.float32)
+    ramp_y = np.ones(height, dtype=np.float32)
+
+    if overlap > 0:
+        # Sıfır ağırlıktan kaçınmak için piksel merkezleri kullanılır
+        ramp = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+        span_x = min(overlap, width)
+        span_y = min(overlap, height)
+
+        if left:
+            ramp_x[:span_x] = np.minimum(ramp_x[:span_x], ramp[:span_x])
+        if right:
+            ramp_x[width - span_x:] = np.minimum(ramp_x[width - span_x:], ramp[:span_x][::-1])
+        if top:
+            ramp_y[:span_y] = np.minimum(ramp_y[:span_y], ramp[:span_y])
+        if bottom:
+            ramp_y[height - span_y:] = np.minimum(ramp_y[height - span_y:], ramp[:span_y][::-1])
+
+    # Kanal boyutu önceden genişletilir; böylece harmanlama sırasında yayın (broadcast) gerekmez
+    weights = np.repeat(np.outer(ramp_y, ramp_x)[:, :, None], channels, axis=2)
+    weights.flags.writeable = False
+    return weights
+
+class TileCompositor:
+    """
+    Parçaları float32 birikim ve ağırlık tamponlarında toplayarak birleştirir.
+    Tüm parçalar eklendikten sonra tek bir normalizasyon yapılır; böylece örtüşen
+    bölgelerde dört kenar da doğru şekilde harmanlanır.
+
+    region (x_start, y_start, x_end, y_end) verilirse tamponlar yalnızca bu alan
+    için ayrılır; parçaların tamamı bu alanın içinde kalmalıdır.
+    """
+
+    def __init__(self, width, height, overlap=0, channels=3, region=None):
+        self.width = width
+        self.height = height
+        self.overlap = overlap
+        self.channels = channels
+        self.region = tuple(int(v) for v in region) if region is not None else (0, 0, width, height)
+
+        region_width = self.region[2] - self.region[0]
+        region_height = self.region[3] - self.region[1]
+        self._accumulator = np.zeros((region_height, region_width, channels), dtype=np.float32)
+        self._weights = np.zeros((region_height, region_width, channels), dtype=np.float32)
+        # Parça boyutu başına yeniden kullanılan ara tampon
+        self._scratch = {}
+        # Eklenen parçaları kapsayan dikdörtgen (normalizasyon yalnızca burada yapılır)
+        self._bounds = None
+
+    def add(self, tile_np, x_start, y_start):
+        """İşlenmiş bir parçayı (H, W, C) verilen konuma ekler"""
+        tile_height, tile_width = tile_np.shape[:2]
+        x_end = x_start + tile_width
+        y_end = y_start + tile_height
+
+        weights = feather_weights(
+            tile_height,
+            tile_width,
+            self.channels,
+            self.overlap,
+            x_start > 0,
+            y_start > 0,
+            x_end < self.width,
+            y_end < self.height,
+        )
+
+        scratch = self._scratch.get(weights.shape)
+        if scratch is None:
+            scratch = self._scratch[weights.shape] = np.empty(weights.shape, dtype=np.float32)
+        np.multiply(tile_np, weights, out=scratch)
+
+        # Tampon koordinatlarına çevir
+        left, top = self.region[0], self.region[1]
+        target = (slice(y_start - top, y_end - top), slice(x_start - left, x_end - left))
+        self._accumulator[target] += scratch
+        self._weights[target] += weights
+
+        if self._bounds is None:
+            self._bounds = [x_start, y_start, x_end, y_end]
+        else:
+            bounds = self._bounds
+            self._bounds = [min(bounds[0], x_start), min(bounds[1], y_start), max(bounds[2], x_end), max(bounds[3], y_end)]
+
+    def result(self, base_np, mask_np=None):
+        """
+        Birleştirilmiş görüntüyü uint8 olarak döndürür. Hiçbir parçanın kapsamadığı
+        pikseller ve (maske verilmişse) maske dışındaki pikseller base_np'den alınır.
+        Birikim tamponunu tükettiği için yalnızca bir kez çağrılmalıdır.
+        """
+        result_np = np.copy(base_np)
+        if self._bounds is None:
+            return result_np
+
+        x_start, y_start, x_end, y_end = self._bounds
+        left, top = self.region[0], self.region[1]
+        region = (slice(y_start, y_end), slice(x_start, x_end))
+        local = (slice(y_start - top, y_end - top), slice(x_start - left, x_end - left))
+        weights = self._weights[local]
+
+        # Korunacak pikseller: parça kapsamı dışı veya maske dışı
+        keep = weights[:, :, 0] == 0
+        if mask_np is not None:
+            keep |= mask_np[region] <= 128
+
+        # Tek seferlik normalizasyon (tamponlar yerinde yeniden kullanılır)
+        blended = self._accumulator[local]
+        np.maximum(weights, 1e-6, out=weights)
+        np.divide(blended, weights, out=blended)
+        blended += 0.5
+        np.clip(blended, 0, 255, out=blended)
+
+        region_np = blended.astype(np.uint8)
+        region_np[keep] = base_np[region][keep]
+        result_np[region] = region_np
+        return result_np
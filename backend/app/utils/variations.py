@@ -0,0 +1,182 @@
+import torch
+import logging
+from diffusers.utils import randn_tensor
+from diffusers.pipelines.stable_diffusion.pipeline_stable_diffusion_inpaint import prepare_mask_and_masked_image
+from app.utils.prompt_cache import prompt_cache
+from app.utils.latent_cache import latent_cache
+
+logger = logging.getLogger(__name__)
+
+def is_out_of_memory(error):
+    """Hatanın bellek yetersizliğinden kaynaklanıp kaynaklanmadığını döndürür (GPU veya CPU)"""
+    if isinstance(error, getattr(torch.cuda, "OutOfMemoryError", ())):
+        return True
+    message = str(error).lower()
+    return "out of memory" in message or "can't allocate memory" in message
+
+def _repeat_batch(tensor, batch_size):
+    """Tek öğelik bir tensörü toplu boyuta çoğaltır"""
+    return tensor.repeat(batch_size, *([1] * (tensor.dim() - 1)))
+
+def prepare_variation_inputs(pipe, image, mask_image, prompt, negative_prompt, guidance_scale):
+    """
+    Tüm varyasyonlar için ortak olan ön işlemeyi bir kez yapar: metin kodlaması,
+    görüntü/maske hazırlığı ve maskelenmiş görüntünün VAE ile kodlanması. Metin
+    gömmeleri ve VAE latent dağılımı önbellekteyse yeniden hesaplanmaz.
+    """
+    device = pipe._execution_device
+    do_classifier_free_guidance = guidance_scale > 1.0
+    width, height = image.size
+
+    # Metin kodlaması önbellekten ([negatif, pozitif] sırasıyla, her biri tek öğe)
+    prompt_embeds, negative_prompt_embeds = prompt_cache.get(pipe, prompt, negative_prompt)
+    if do_classifier_free_guidance:
+        prompt_embeds = torch.cat([negative_prompt_embeds, prompt_embeds])
+    dtype = prompt_embeds.dtype
+
+    # Görüntü ve maskeyi tensöre dönüştür
+    mask, masked_image = prepare_mask_and_masked_image(image, mask_image)
+    mask = torch.nn.functional.interpolate(
+        mask, size=(height // pipe.vae_scale_factor, width // pipe.vae_scale_factor)
+    ).to(device=device, dtype=dtype)
+
+    # Maskelenmiş görüntü dağılımı önbellekte yoksa bir kez kodlanır; dağılımdan örnekleme
+    # varyasyon başına yapılır. VAE düşük VRAM'li sistemlerde CPU'da olabileceği için
+    # kendi cihazında çalıştırılır.
+    latent_key = latent_cache.key(pipe, image, mask_image)
+    latents = latent_cache.lookup(latent_key)
+    if latents is None:
+        masked_image = masked_image.to(device=pipe.vae.device, dtype=pipe.vae.dtype)
+        latent_dist = pipe.vae.encode(masked_image).latent_dist
+        # Autocast altında kodlansa da dağılım VAE'nin veri tipinde saklanır
+        latents = (latent_dist.mean.to(pipe.vae.dtype), latent_dist.std.to(pipe.vae.dtype))
+        latent_cache.store(latent_key, latents)
+    latent_mean, latent_std = latents
+
+    return {
+        "prompt_embeds": prompt_embeds,
+        "mask": mask,
+        "latent_mean": latent_mean.to(device),
+        "latent_std": latent_std.to(device),
+        "width": width,
+        "height": height,
+        "dtype": dtype,
+        "device": device,
+        "do_classifier_free_guidance": do_classifier_free_guidance,
+    }
+
+def _decode_latents(pipe, latents):
+    """Latent'leri PIL görüntülerine dönüştürür (VAE kendi cihazında çalışır)"""
+    latents = 1 / pipe.vae.config.scaling_factor * latents
+    image = pipe.vae.decode(latents.to(device=pipe.vae.device, dtype=pipe.vae.dtype)).sample
+    image = (image / 2 + 0.5).clamp(0, 1)
+    image = image.cpu().permute(0, 2, 3, 1).float().numpy()
+    return pipe.numpy_to_pil(image)
+
+def run_variation_batch(pipe, inputs, guidance_scale, num_inference_steps, seeds, progress=None):
+    """
+    Hazırlanmış ortak girdilerle verilen seed'ler için tek bir toplu denoising döngüsü çalıştırır.
+    progress verilirse her adım bildirilir.
+    """
+    batch_size = len(seeds)
+    device = inputs["device"]
+    dtype = inputs["dtype"]
+    do_classifier_free_guidance = inputs["do_classifier_free_guidance"]
+    generators = [torch.Generator(device=pipe.device).manual_seed(seed) for seed in seeds]
+
+    # Başlangıç gürültüsü (her öğe kendi generator'ı ile, pipeline ile aynı sırada)
+    shape = (
+        batch_size,
+        pipe.vae.config.latent_channels,
+        inputs["height"] // pipe.vae_scale_factor,
+        inputs["width"] // pipe.vae_scale_factor,
+    )
+    latents = randn_tensor(shape, generator=generators, device=device, dtype=dtype)
+
+    pipe.scheduler.set_timesteps(num_inference_steps, device=device)
+    timesteps = pipe.scheduler.timesteps
+    latents = latents * pipe.scheduler.init_noise_sigma
+
+    # Maskelenmiş görüntü latent'leri: kodlama ortak, örnekleme öğe başına
+    latent_mean = inputs["latent_mean"]
+    latent_std = inputs["latent_std"]
+    masked_image_latents = torch.cat([
+        latent_mean + latent_std * randn_tensor(
+            latent_mean.shape, generator=generator, device=device, dtype=latent_mean.dtype
+        )
+        for generator in generators
+    ])
+    masked_image_latents = pipe.vae.config.scaling_factor * masked_image_latents
+    masked_image_latents = masked_image_latents.to(device=device, dtype=dtype)
+
+    mask = _repeat_batch(inputs["mask"], batch_size)
+    prompt_embeds = inputs["prompt_embeds"]
+    if do_classifier_free_guidance:
+        negative_embeds, positive_embeds = prompt_embeds.chunk(2)
+        prompt_embeds = torch.cat([
+            _repeat_batch(negative_embeds, batch_size),
+            _repeat_batch(positive_embeds, batch_size),
+        ])
+        mask = torch.cat([mask] * 2)
+        masked_image_latents = torch.cat([masked_image_latents] * 2)
+    else:
+        prompt_embeds = _repeat_batch(prompt_embeds, batch_size)
+
+    extra_step_kwargs = pipe.prepare_extra_step_kwargs(generators, 0.0)
+
+    for step, t in enumerate(timesteps):
+        latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
+        latent_model_input = pipe.scheduler.scale_model_input(latent_model_input, t)
+        latent_model_input = torch.cat([latent_model_input, mask, masked_image_latents], dim=1)
+
+        noise_pred = pipe.unet(latent_model_input, t, encoder_hidden_states=prompt_embeds).sample
+
+        if do_classifier_free_guidance:
+            noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+            noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_text - noise_pred_uncond)
+
+        latents = pipe.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).prev_sample
+
+        if progress is not None:
+            progress.step(step + 1, latents)
+
+    return _decode_latents(pipe, latents)
+
+@torch.no_grad()
+def generate_variations(pipe, image, mask_image, prompt, negative_prompt, guidance_scale,
+                        num_inference_steps, seeds, max_batch_size=4, on_result=None, progress=None):
+    """
+    Aynı görüntü ve maske için birden fazla varyasyonu üretir. Ön işleme bir kez
+    yapılır, denoising toplu olarak çalışır. Her çıktı yalnızca kendi seed'ine
+    bağlıdır. Bellek yetmezse toplu boyut yarıya indirilerek parça parça devam edilir.
+    on_result(index, image) her toplu parça bittiğinde o parçanın çıktıları için çağrılır.
+    progress verilirse çıktı sırası ve denoising adımları bildirilir.
+    """
+    inputs = prepare_variation_inputs(pipe, image, mask_image, prompt, negative_prompt, guidance_scale)
+
+    results = []
+    chunk_size = max(1, min(max_batch_size, len(seeds)))
+    position = 0
+
+    while position < len(seeds):
+        chunk = seeds[position:position + chunk_size]
+        if progress is not None:
+            progress.set("output", position, len(seeds), span=len(chunk))
+        try:
+            chunk_results = run_variation_batch(
+                pipe, inputs, guidance_scale, num_inference_steps, chunk, progress=progress
+            )
+            if on_result is not None:
+                for offset, result in enumerate(chunk_results):
+                    on_result(position + offset, result)
+            results.extend(chunk_results)
+            position += len(chunk)
+        except Exception as e:
+            if not is_out_of_memory(e) or chunk_size == 1:
+                raise
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            chunk_size = max(1, chunk_size // 2)
+            logger.warning(f"Varyasyonlar için bellek yetersiz, toplu boyut {chunk_size} olarak düşürüldü")
+
+    return results
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from app.services import autotuner as autotuner_module
+from app.services.autotuner import Autotuner
+
+SYSTEM_INFO = {"device": "cpu", "cpu_count": 4, "cpu_count_logical": 8, "ram_total_gb": 16.0}
+
+def make_config(**cpu_engine):
+    return {
+        "device": "cpu",
+        "torch_dtype": "torch.float32",
+        "inpainting_settings": {"tile_size": 512, "max_resolution": 512},
+        "cpu_engine": dict({"mode": "optimized", "bf16_autocast": False, "compile": False}, **cpu_engine),
+    }
+
+@pytest.fixture
+def tunes(monkeypatch):
+    """Gerçek ölçüm yerine sabit profil döndürür; ölçüm çağrılarını sayar"""
+    calls = []
+
+    def fake_tune(pipe, config, system_info, autotune=None, tune_threads=True):
+        calls.append(config)
+        return {
+            "num_threads": 4,
+            "attention": "sdpa",
+            "tile_size": 384,
+            "tile_overlap": 48,
+            "tile_batch_size": 2,
+            "tiling_required": False,
+            "max_resolution": 768,
+            "measurements": {"attention=sdpa": 0.5},
+        }
+
+    monkeypatch.setattr(autotuner_module, "get_device_info", lambda: dict(SYSTEM_INFO))
+    monkeypatch.setattr(autotuner_module, "select_device", lambda info, device: info)
+    monkeypatch.setattr(autotuner_module, "tune_profile", fake_tune)
+    monkeypatch.setattr(autotuner_module, "set_attention", lambda pipe, attention: attention)
+    monkeypatch.setattr(autotuner_module.torch, "set_num_threads", lambda count: None)
+    return calls
+
+def make_autotuner(tmp_path, model_id="model"):
+    return Autotuner(model_id, {"enabled": True, "profile_path": str(tmp_path / "profiles.json")})
+
+def test_missing_profile_is_measured_and_saved(tmp_path, tunes):
+    autotuner = make_autotuner(tmp_path)
+    config = make_config()
+    profile = autotuner.prepare(None, config, "cpu")
+
+    assert len(tunes) == 1
+    assert config["autotune"]["source"] == "measured"
+    assert config["inpainting_settings"]["tile_size"] == 384
+    assert config["cpu_engine"]["num_threads"] == 4
+    stored = json.loads((tmp_path / "profiles.json").read_text())
+    assert stored[profile["fingerprint"]]["tile_batch_size"] == 2
+
+def test_stored_profile_is_reused_without_measuring(tmp_path, tunes):
+    make_autotuner(tmp_path).prepare(None, make_config(), "cpu")
+
+    # Yeni süreç: profil dosyadan okunur
+    autotuner = make_autotuner(tmp_path)
+    config = make_config()
+    autotuner.prepare(None, config, "cpu")
+
+    assert len(tunes) == 1
+    assert config["autotune"]["source"] == "stored"
+    assert config["inpainting_settings"]["max_resolution"] == 768
+    assert autotuner.current["cpu"]["source"] == "stored"
+    assert "measurements" not in autotuner.current["cpu"]
+
+def test_force_measures_again(tmp_path, tunes):
+    autotuner = make_autotuner(tmp_path)
+    autotuner.prepare(None, make_config(), "cpu")
+    config = make_config()
+    autotuner.prepare(None, config, "cpu", force=True)
+
+    assert len(tunes) == 2
+    assert config["autotune"]["source"] == "measured"
+
+@pytest.mark.parametrize("change", [
+    {"cpu_engine": {"mode": "legacy"}},
+    {"cpu_engine": {"bf16_autocast": True}},
+    {"torch_dtype": "torch.bfloat16"},
+    {"model_id": "other-model"},
+])
+def test_fingerprint_change_measures_again(tmp_path, tunes, change):
+    make_autotuner(tmp_path).prepare(None, make_config(), "cpu")
+
+    config = make_config(**change.get("cpu_engine", {}))
+    if "torch_dtype" in change:
+        config["torch_dtype"] = change["torch_dtype"]
+    autotuner = make_autotuner(tmp_path, change.get("model_id", "model"))
+    autotuner.prepare(None, config, "cpu")
+
+    assert len(tunes) == 2
+    assert config["autotune"]["source"] == "measured"
+    assert autotuner.stats()["stored_profiles"] == 2
+
+def test_profile_without_threads_is_remeasured_when_tuning_threads(tmp_path, tunes):
+    """Çekirdekleri bölünmüş kopyalarla ölçülen profil tam çekirdekli kopyada kullanılmaz"""
+    autotuner = make_autotuner(tmp_path)
+    config = make_config()
+    fingerprint = autotuner.prepare(None, config, "cpu")["fingerprint"]
+    autotuner._profiles[fingerprint]["num_threads"] = None
+
+    autotuner.prepare(None, make_config(), "cpu", tune_threads=False)
+    assert len(tunes) == 1
+    autotuner.prepare(None, make_config(), "cpu")
+    assert len(tunes) == 2
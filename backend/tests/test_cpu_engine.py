@@ -0,0 +1,113 @@
+import json
+
+import pytest
+import torch
+
+from app.utils import cpu_engine
+from app.utils.cpu_engine import CPU_ENGINE_DEFAULTS, apply_cpu_engine, inference_context, load_cpu_engine_settings
+
+SYSTEM = {"cpu_count": 16, "cpu_count_logical": 32, "ram_total_gb": 32}
+
+class FakeModule:
+    def __init__(self):
+        self.processors = []
+        self.memory_format = None
+
+    def set_attn_processor(self, processor):
+        self.processors.append(type(processor).__name__)
+
+    def to(self, memory_format=None):
+        self.memory_format = memory_format
+        return self
+
+class FakePipe:
+    """apply_cpu_engine'in çağırdığı pipeline yöntemlerini kaydeder"""
+
+    def __init__(self):
+        self.unet = FakeModule()
+        self.vae = FakeModule()
+        self.vae.decoder = FakeModule()
+        self.slice_size = None
+
+    def enable_attention_slicing(self, slice_size="auto"):
+        self.slice_size = slice_size
+
+@pytest.fixture
+def threads(monkeypatch):
+    """torch.set_num_threads çağrıları (test süreci iş parçacığı sayısını değiştirmez)"""
+    calls = []
+    monkeypatch.setattr(cpu_engine.torch, "set_num_threads", calls.append)
+    monkeypatch.setattr(cpu_engine.os, "sched_getaffinity", lambda pid: set(range(64)), raising=False)
+    return calls
+
+def test_legacy_mode_keeps_previous_behaviour(threads):
+    pipe = FakePipe()
+    applied = apply_cpu_engine(pipe, SYSTEM, {"mode": "legacy", "bf16_autocast": True})
+
+    assert applied == {"mode": "legacy", "bf16_autocast": False, "attention": "max", "num_threads": 8}
+    assert pipe.slice_size == 1
+    assert pipe.unet.memory_format is None
+    assert threads == [8]
+    # Az çekirdekte en az 4 iş parçacığı
+    assert apply_cpu_engine(FakePipe(), dict(SYSTEM, cpu_count_logical=4))["num_threads"] == 4
+
+def test_optimized_mode_uses_sdpa_with_enough_ram(threads, monkeypatch):
+    monkeypatch.setattr(cpu_engine, "bf16_supported", lambda: True)
+    pipe = FakePipe()
+    applied = apply_cpu_engine(pipe, SYSTEM, {"mode": "optimized"})
+
+    assert applied["attention"] == "sdpa"
+    assert pipe.unet.processors == ["AttnProcessor2_0"]
+    assert pipe.unet.memory_format == torch.channels_last
+    assert applied["bf16_autocast"] is True
+    # 0 = kullanılabilir fiziksel çekirdek sayısı
+    assert applied["num_threads"] == 16 and threads == [16]
+
+def test_optimized_mode_falls_back_to_slicing_and_fp32(threads, monkeypatch):
+    monkeypatch.setattr(cpu_engine, "bf16_supported", lambda: False)
+    pipe = FakePipe()
+    applied = apply_cpu_engine(pipe, dict(SYSTEM, ram_total_gb=8), {"mode": "optimized", "num_threads": 6})
+
+    # Az RAM'de dilimleme, bf16 desteklenmiyorsa float32
+    assert applied["attention"] == "sliced"
+    assert pipe.slice_size == "auto"
+    assert applied["bf16_autocast"] is False
+    assert applied["num_threads"] == 6
+
+def test_sdpa_falls_back_when_unavailable(threads, monkeypatch):
+    monkeypatch.delattr(torch.nn.functional, "scaled_dot_product_attention")
+    pipe = FakePipe()
+    applied = apply_cpu_engine(pipe, SYSTEM, {"mode": "optimized", "attention": "sdpa", "bf16_autocast": False})
+
+    assert applied["attention"] == "sliced"
+    assert pipe.unet.processors == []
+
+def test_compile_is_applied_only_when_available(threads, monkeypatch):
+    monkeypatch.setattr(cpu_engine.torch, "compile", lambda module: ("compiled", module), raising=False)
+    pipe = FakePipe()
+    applied = apply_cpu_engine(pipe, SYSTEM, {"mode": "optimized", "compile": "torch_compile", "bf16_autocast": False})
+    assert applied["compile"] == "torch_compile"
+    assert pipe.unet[0] == "compiled"
+
+    monkeypatch.delattr(cpu_engine.torch, "compile")
+    applied = apply_cpu_engine(FakePipe(), SYSTEM, {"mode": "optimized", "compile": "torch_compile", "bf16_autocast": False})
+    assert "compile" not in applied
+
+def test_inference_context_autocasts_only_with_bf16():
+    matrix = torch.ones(2, 2)
+    with inference_context({"cpu_engine": {"bf16_autocast": True}}):
+        assert (matrix @ matrix).dtype == torch.bfloat16
+    for config in ({"cpu_engine": {"bf16_autocast": False}}, {}, None):
+        with inference_context(config):
+            assert (matrix @ matrix).dtype == torch.float32
+
+def test_settings_merge_with_defaults(tmp_path):
+    path = tmp_path / "config.json"
+    assert load_cpu_engine_settings(str(path)) == CPU_ENGINE_DEFAULTS
+
+    path.write_text(json.dumps({"cpu_engine": {"mode": "optimized"}}))
+    assert load_cpu_engine_settings(str(path)) == dict(CPU_ENGINE_DEFAULTS, mode="optimized")
+
+    # Bozuk dosyada varsayılanlar (legacy) kullanılır
+    path.write_text("{")
+    assert load_cpu_engine_settings(str(path))["mode"] == "legacy"
@@ -0,0 +1,102 @@
+import queue
+
+import pytest
+
+from app.services.inpainting_service import InferenceExecutor
+from app.services.progress import TaskInterrupted
+from app.services.replica_pool import Replica
+from app.services.task_store import MemoryTaskStore
+
+PLANS = {"basic": {"weight": 1, "max_in_flight": 1, "max_queued": 4, "rate_per_minute": 600, "burst": 10}}
+
+def make_executor(replicas=None, **kwargs):
+    replicas = replicas or [Replica(0, "cpu", None, {})]
+    return InferenceExecutor(replicas, plan_settings=PLANS, default_plan="basic", preprocess_workers=0, **kwargs)
+
+def queue_item(task_id, license_key="license"):
+    return (task_id, None, license_key, {"num_outputs": 1, "num_inference_steps": 30})
+
+def test_cancel_queued_job_keeps_in_flight_limit():
+    executor = make_executor()
+    for task_id in ("a", "b", "c"):
+        executor._queue.put_nowait(queue_item(task_id), "license", "basic")
+
+    assert executor._queue.get(timeout=0.1)[0] == "a"
+    assert executor.cancel("b") is True
+
+    # "a" hâlâ çalışıyor; lisansın tek çalışma hakkı serbest kalmamalı
+    with pytest.raises(queue.Empty):
+        executor._queue.get(timeout=0.05)
+
+def test_cancel_finished_job_records_nothing():
+    executor = make_executor()
+
+    # Yürütücünün bilmediği (ör. az önce bitmiş) görev
+    assert executor.cancel("done") is None
+    assert executor._interrupts == {}
+    assert executor.stats()["cancelled"] == 0
+
+def test_cancel_dispatched_job_interrupts_once():
+    executor = make_executor()
+    executor._queue.put_nowait(queue_item("a"), "license", "basic")
+    item = executor._queue.get(timeout=0.1)
+
+    # Kuyruktan alınmış ama henüz çalışmayan görev ilk kontrol noktasında kesilir
+    assert executor.cancel("a") is False
+    assert executor.cancel("a") is False
+    assert executor._interrupts == {"a": "cancelled"}
+    assert executor.stats()["cancelled"] == 1
+
+    executor._finish([item])
+    assert executor._interrupts == {}
+    assert executor.cancel("a") is None
+
+def test_cancel_waits_for_last_attached_client():
+    executor = make_executor()
+    # Yalnızca kuyruk kullanılır; dağıtıcı başlatılmaz
+    executor._running = True
+    executor.submit("a", None, license_key="owner", num_outputs=1, num_inference_steps=30)
+    assert executor.attach("a", "other") is True
+
+    # Başka lisans görevi iptal edemez; bekleyenlerden biri ayrılınca görev sürer
+    with pytest.raises(PermissionError):
+        executor.cancel("a", license_key="stranger")
+    assert executor.cancel("a", license_key="owner") is False
+    assert executor.queue_position("a") == 1
+
+    assert executor.cancel("a", license_key="other") is True
+    assert executor.queue_position("a") is None
+    assert executor.attach("a", "other") is False
+
+def test_invalid_input_is_not_a_replica_failure():
+    """Geçersiz girdiyle başarısız olan görev kopyayı sağlık kontrolüne göndermez"""
+    task_store = MemoryTaskStore()
+    task_store.create("bad", {})
+    executor = make_executor()
+    replica = executor.pool.replicas[0]
+    job = {"image_data": b"not an image", "mask_data": b"", "seed": 1, "num_outputs": 1, "num_inference_steps": 30}
+
+    assert executor._run_batch(replica, [("bad", task_store, "license", job)], 1.0) is False
+    assert task_store.get("bad")["status"] == "failed"
+
+def test_cancel_request_from_other_worker_interrupts_running_job():
+    """Depoyu paylaşan başka işçinin kaydettiği iptal isteği görevi çalıştıran işçide uygulanır"""
+    task_store = MemoryTaskStore()
+    task_store.create("a", {})
+    executor = make_executor()
+    executor._running = True
+    executor.submit("a", task_store, license_key="owner", num_outputs=1, num_inference_steps=30)
+    executor._queue.get(timeout=0.1)
+    progress = executor._track("a", task_store, {"num_outputs": 1, "num_inference_steps": 30})
+
+    # Görevi beklemeyen lisansın isteği atılır
+    task_store.request_cancel("a", "stranger")
+    progress.check()
+    assert progress.interrupted is None
+    assert task_store.get("a")["cancel_requested"] is None
+
+    task_store.request_cancel("a", "owner")
+    progress._next_cancel_check = 0.0
+    with pytest.raises(TaskInterrupted):
+        progress.check()
+    assert progress.interrupted == "cancelled"
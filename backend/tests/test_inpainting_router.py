@@ -0,0 +1,61 @@
+import pytest
+
+from app.routers.inpainting import parse_range, image_urls, events_url
+from app.utils import security
+from app.utils.security import verify_image_signature, sign_image_url, verify_events_signature
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    # Dosya sonunu aşan bitiş dosya sonuna çekilir
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", ["items=0-1", "bytes=0-1,5-6", "bytes=a-b", "bytes=-"])
+def test_parse_range_ignores_invalid_headers(header):
+    assert parse_range(header, 1000) is None
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-100", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+def test_image_urls_are_signed_per_image():
+    url = image_urls("task", [{"media_type": "image/png", "seed": 1, "prompt": "kedi"}])[0]["url"]
+    path, _, query = url.partition("?sig=")
+
+    assert path == "/inpaint/task/images/0"
+    assert verify_image_signature("task", 0, query)
+    # İmza başka görevin veya görüntünün adresi için geçerli değildir
+    assert not verify_image_signature("task", 1, query)
+    assert not verify_image_signature("other", 0, query)
+    assert not verify_image_signature("task", 0, "")
+
+def test_events_url_is_signed_per_task():
+    path, _, query = events_url("task").partition("?sig=")
+
+    assert path == "/inpaint/task/events"
+    assert security.EVENTS_PATH_PATTERN.match(path)
+    assert verify_events_signature("task", query)
+    assert not verify_events_signature("other", query)
+    # Akış imzası görüntü adresi için kullanılamaz
+    assert not verify_image_signature("task", 0, query)
+
+def test_sqlite_task_store_shares_persisted_image_url_secret(tmp_path, monkeypatch):
+    """Anahtar ayarlanmamışsa görev veritabanını paylaşan işçiler aynı dosyadaki anahtarı kullanır"""
+    monkeypatch.setattr(security.settings, "image_url_secret", "")
+    monkeypatch.setattr(security.settings, "task_store_backend", "sqlite")
+    monkeypatch.setattr(security.settings, "task_store_path", str(tmp_path / "tasks.db"))
+    monkeypatch.setattr(security, "_persisted_secret", None)
+    signature = sign_image_url("task", 0)
+
+    # Başka bir işçi veya yeniden başlatılan süreç
+    monkeypatch.setattr(security, "_persisted_secret", None)
+    monkeypatch.setattr(security, "_fallback_secret", b"baska-surec")
+    assert verify_image_signature("task", 0, signature)
+    assert (tmp_path / security.IMAGE_URL_SECRET_FILE).exists()
+    assert list(tmp_path.iterdir()) == [tmp_path / security.IMAGE_URL_SECRET_FILE]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from app.utils import variations
+from app.utils.latent_cache import MaskedImageLatentCache
+from app.utils.prompt_cache import PromptEmbeddingCache
+
+def make_inputs(seed=0):
+    rng = np.random.RandomState(seed)
+    image = Image.fromarray(rng.randint(0, 255, (64, 64, 3), dtype=np.uint8))
+    mask = np.zeros((64, 64), dtype=np.uint8)
+    mask[16:48, 16:48] = 255
+    return image, Image.fromarray(mask)
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = MaskedImageLatentCache()
+    monkeypatch.setattr(variations, "latent_cache", cache)
+    monkeypatch.setattr(variations, "prompt_cache", PromptEmbeddingCache())
+    return cache
+
+@pytest.fixture
+def encodes(tiny_pipe, monkeypatch):
+    """VAE kodlama çağrılarının sayacı"""
+    calls = []
+    encode = tiny_pipe.vae.encode
+    monkeypatch.setattr(tiny_pipe.vae, "encode", lambda *args, **kwargs: calls.append(1) or encode(*args, **kwargs))
+    return calls
+
+def prepare(pipe, image, mask):
+    with torch.no_grad():
+        return variations.prepare_variation_inputs(pipe, image, mask, "kedi", "", 7.5)
+
+def test_masked_image_is_encoded_once(tiny_pipe, cache, encodes):
+    image, mask = make_inputs()
+    first = prepare(tiny_pipe, image, mask)
+    second = prepare(tiny_pipe, image, mask)
+
+    assert len(encodes) == 1
+    assert cache.stats()["hits"] == 1
+    assert torch.equal(first["latent_mean"], second["latent_mean"])
+    assert torch.equal(first["latent_std"], second["latent_std"])
+
+    # Farklı maske veya görüntü yeniden kodlanır
+    other_mask = Image.fromarray(np.full((64, 64), 255, dtype=np.uint8))
+    prepare(tiny_pipe, image, other_mask)
+    prepare(tiny_pipe, make_inputs(seed=1)[0], mask)
+    assert len(encodes) == 3
+    assert cache.stats()["entries"] == 3
+
+def test_cached_latents_give_same_variations(tiny_pipe, cache, encodes):
+    """Örnekleme seed başına dağılımdan yapıldığı için önbellek sonucu değiştirmez"""
+    image, mask = make_inputs()
+    cold = variations.generate_variations(tiny_pipe, image, mask, "kedi", "", 7.5, 2, [3, 4])
+    warm = variations.generate_variations(tiny_pipe, image, mask, "kedi", "", 7.5, 2, [3, 4])
+
+    assert len(encodes) == 1
+    for first, second in zip(cold, warm):
+        assert np.array_equal(np.asarray(first), np.asarray(second))
+
+def test_least_recently_used_latents_are_evicted(tiny_pipe, cache, encodes):
+    image, mask = make_inputs()
+    prepare(tiny_pipe, image, mask)
+    entry_bytes = cache.stats()["bytes"]
+    cache.max_bytes = 2 * entry_bytes
+
+    other_images = [make_inputs(seed=seed)[0] for seed in (1, 2)]
+    for other in other_images:
+        prepare(tiny_pipe, other, mask)
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    # İlk görüntünün kaydı çıkarıldı, yeniden kodlanır
+    prepare(tiny_pipe, image, mask)
+    assert len(encodes) == 4
@@ -0,0 +1,59 @@
+from app.services import license_tokens
+from app.services.license_tokens import LicenseTokenVerifier, create_license_token
+
+SECRET = "test-secret"
+LICENSE = {"plan": "basic", "customer_name": "Test", "usage_limit": 2, "expiry_date": "2099-01-01T00:00:00"}
+
+class FakeLicenseStore:
+    """record_usage'ı (kullanım, limit) döndüren lisans deposu"""
+
+    def __init__(self, usage_limit):
+        self.usage = 0
+        self.usage_limit = usage_limit
+
+    def record_usage(self, license_key, count):
+        self.usage += count
+        return self.usage, self.usage_limit
+
+def test_exhausted_license_is_rechecked_after_ttl(monkeypatch):
+    store = FakeLicenseStore(usage_limit=2)
+    verifier = LicenseTokenVerifier(SECRET, store_getter=lambda: store)
+    token = create_license_token("key", LICENSE, SECRET)
+
+    assert verifier.verify(token)["valid"]
+    assert verifier.verify(token)["valid"]
+    verifier.flush_usage()
+    assert not verifier.verify(token)["valid"]
+    assert verifier.stats()["exhausted"] == 1
+
+    # Limit artırıldı; süre dolunca lisans tekrar kabul edilir ve kaydı silinir
+    store.usage_limit = 10
+    now = license_tokens.time.monotonic()
+    monkeypatch.setattr(license_tokens.time, "monotonic", lambda: now + license_tokens.EXHAUSTED_TTL_SECONDS)
+    assert verifier.verify(token)["valid"]
+    verifier.flush_usage()
+    assert verifier.stats()["exhausted"] == 0
+
+def test_headroom_clears_exhausted_license():
+    store = FakeLicenseStore(usage_limit=1)
+    verifier = LicenseTokenVerifier(SECRET, store_getter=lambda: store)
+    verifier._usage["key"] = 1
+    verifier.flush_usage()
+    assert verifier.stats()["exhausted"] == 1
+
+    # Depo yer olduğunu bildirince kayıt hemen silinir
+    store.usage_limit = 0
+    verifier._usage["key"] = 1
+    verifier.flush_usage()
+    assert verifier.stats()["exhausted"] == 0
+
+def test_unused_exhausted_entries_expire(monkeypatch):
+    store = FakeLicenseStore(usage_limit=1)
+    verifier = LicenseTokenVerifier(SECRET, store_getter=lambda: store)
+    verifier._usage["key"] = 1
+    verifier.flush_usage()
+
+    now = license_tokens.time.monotonic()
+    monkeypatch.setattr(license_tokens.time, "monotonic", lambda: now + license_tokens.EXHAUSTED_TTL_SECONDS)
+    verifier.flush_usage()
+    assert verifier.stats()["exhausted"] == 0
@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import license_service
+from app.services.license_service import LicenseIndex, SQLiteLicenseStore, LICENSE_COLUMNS, save_licenses, get_licenses
+
+def license_data(usage_limit=0, active=True, expiry_days=30, usage_count=0):
+    now = datetime.now()
+    return {
+        "customer_name": "Test",
+        "customer_email": "test@example.com",
+        "plan": "basic",
+        "creation_date": now.isoformat(),
+        "expiry_date": (now + timedelta(days=expiry_days)).isoformat(),
+        "usage_count": usage_count,
+        "usage_limit": usage_limit,
+        "active": active,
+        "last_used": None,
+    }
+
+def advance_reload_clock(monkeypatch):
+    """Sonraki doğrulamada dosya değişikliği yeniden kontrol edilsin"""
+    now = time.monotonic() + license_service.RELOAD_CHECK_INTERVAL
+    monkeypatch.setattr(license_service.time, "monotonic", lambda: now)
+
+def test_index_reloads_changed_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "licenses.json")
+    save_licenses({"a": license_data()}, path)
+    index = LicenseIndex(path)
+    assert index.validate("a")["valid"]
+    assert not index.validate("b")["valid"]
+
+    licenses = get_licenses(path)
+    licenses["b"] = license_data()
+    licenses["a"]["active"] = False
+    save_licenses(licenses, path)
+    # Aynı zaman damgasına düşen yazmalar da fark edilsin diye mtime açıkça değiştirilir
+    mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+    # Kontrol aralığı dolmadan dosya tekrar okunmaz
+    assert not index.validate("b")["valid"]
+    advance_reload_clock(monkeypatch)
+    assert index.validate("b")["valid"]
+    assert index.validate("a")["message"] == "Lisans deaktive edilmiş"
+
+def test_index_counts_usage_in_memory_until_flush(tmp_path):
+    path = str(tmp_path / "licenses.json")
+    save_licenses({"a": license_data(usage_limit=3)}, path)
+    index = LicenseIndex(path)
+
+    assert index.validate("a")["valid"]
+    assert index.validate("a")["usage_count"] == 1
+    assert get_licenses(path)["a"]["usage_count"] == 0
+
+    assert index.flush() == 1
+    saved = get_licenses(path)["a"]
+    assert saved["usage_count"] == 2
+    assert saved["last_used"] is not None
+    assert index.flush() == 0
+
+    # Limit, dosyaya yazılmamış artışlarla birlikte uygulanır
+    assert index.validate("a")["valid"]
+    assert index.validate("a")["message"] == "Kullanım limiti aşıldı"
+
+def test_index_flush_keeps_external_changes(tmp_path, monkeypatch):
+    """Kaydetme dosyanın güncel halini okur; başka süreçlerin eklediği lisanslar kaybolmaz"""
+    path = str(tmp_path / "licenses.json")
+    save_licenses({"a": license_data()}, path)
+    index = LicenseIndex(path)
+    index.validate("a")
+
+    licenses = get_licenses(path)
+    licenses["b"] = license_data()
+    save_licenses(licenses, path)
+    index.flush()
+
+    saved = get_licenses(path)
+    assert set(saved) == {"a", "b"}
+    assert saved["a"]["usage_count"] == 1
+
+def test_index_background_flush_and_stop(tmp_path):
+    path = str(tmp_path / "licenses.json")
+    save_licenses({"a": license_data()}, path)
+    index = LicenseIndex(path, flush_interval=0.05)
+    index.start()
+    try:
+        index.validate("a")
+        deadline = time.time() + 5
+        while get_licenses(path)["a"]["usage_count"] == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        assert get_licenses(path)["a"]["usage_count"] == 1
+    finally:
+        index.stop()
+
+    # Kapanışta bekleyen artışlar yazılır
+    index = LicenseIndex(path, flush_interval=3600)
+    index.start()
+    index.validate("a")
+    index.stop()
+    assert get_licenses(path)["a"]["usage_count"] == 2
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = SQLiteLicenseStore(str(tmp_path / "licenses.db"), pool_size=4)
+    yield store
+    store.stop()
+
+def test_sqlite_concurrent_validation_respects_usage_limit(sqlite_store):
+    """Aynı anda doğrulama yapan iş parçacıklarından tam olarak limit kadarı kabul edilir"""
+    sqlite_store.create("a", license_data(usage_limit=5))
+    barrier = threading.Barrier(16)
+    results = []
+
+    def validate():
+        barrier.wait()
+        results.append(sqlite_store.validate("a"))
+
+    threads = [threading.Thread(target=validate) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    accepted = [result for result in results if result["valid"]]
+    assert len(accepted) == 5
+    assert sorted(result["usage_count"] for result in accepted) == [0, 1, 2, 3, 4]
+    assert all(result["message"] == "Kullanım limiti aşıldı" for result in results if not result["valid"])
+    assert sqlite_store.record_usage("a", 0) == (5, 5)
+
+@pytest.mark.parametrize("data, message", [
+    (license_data(expiry_days=-1), "Lisans süresi dolmuş"),
+    (license_data(active=False), "Lisans deaktive edilmiş"),
+    (license_data(usage_limit=2, usage_count=2), "Kullanım limiti aşıldı"),
+])
+def test_sqlite_rejected_license_messages(sqlite_store, data, message):
+    sqlite_store.create("a", data)
+    result = sqlite_store.validate("a")
+
+    assert result == {"valid": False, "message": message}
+    # Reddedilen doğrulama kullanım sayılmaz
+    assert sqlite_store.record_usage("a", 0)[0] == data["usage_count"]
+
+def test_sqlite_unknown_license(sqlite_store):
+    assert sqlite_store.validate("missing") == {"valid": False, "message": "Geçersiz lisans anahtarı"}
+
+def test_sqlite_import_json_round_trips(sqlite_store, tmp_path):
+    path = str(tmp_path / "licenses.json")
+    licenses = {
+        "a": license_data(usage_limit=10, usage_count=3),
+        "b": dict(license_data(active=False), plan="pro", last_used="2024-01-01T00:00:00"),
+    }
+    save_licenses(licenses, path)
+
+    assert sqlite_store.import_json(path) == 2
+    assert sqlite_store.count() == 2
+    with sqlite_store._connection() as conn:
+        rows = {row["license_key"]: row for row in conn.execute("SELECT * FROM licenses")}
+    for license_key, data in licenses.items():
+        imported = {column: rows[license_key][column] for column in LICENSE_COLUMNS}
+        assert imported == dict(data, active=int(data["active"]))
+
+    # Var olan lisanslar tekrar aktarımda ezilmez
+    sqlite_store.validate("a")
+    sqlite_store.import_json(path)
+    assert sqlite_store.record_usage("a", 0) == (4, 10)
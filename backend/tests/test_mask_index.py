@@ -0,0 +1,39 @@
+import numpy as np
+
+from app.utils.mask_index import MaskIndex
+
+def mask_with(*boxes, size=(256, 256)):
+    mask = np.zeros(size, dtype=np.uint8)
+    for x0, y0, x1, y1 in boxes:
+        mask[y0:y1, x0:x1] = 255
+    return mask
+
+def test_mask_index_counts_and_coverage():
+    index = MaskIndex(mask_with((10, 20, 30, 40)))
+
+    assert index.total == 400
+    assert index.count(0, 0, 256, 256) == 400
+    assert index.count(20, 30, 25, 35) == 25
+    assert index.coverage(10, 20, 30, 40) == 1.0
+    assert index.coverage(0, 0, 40, 40) == 0.25
+    # Görüntü dışına taşan ve boş dikdörtgenler
+    assert index.count(-50, -50, 500, 500) == 400
+    assert index.count(30, 30, 10, 10) == 0
+    assert index.coverage(5, 5, 5, 5) == 0.0
+
+def test_mask_index_bounding_box():
+    index = MaskIndex(mask_with((10, 20, 30, 40), (100, 5, 101, 6)))
+
+    assert index.bounding_box(0, 0, 256, 256) == (10, 5, 101, 40)
+    assert index.bounding_box(0, 0, 64, 64) == (10, 20, 30, 40)
+    assert index.bounding_box(200, 200, 256, 256) is None
+
+def test_mask_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    mask = (rng.random((37, 53)) > 0.7).astype(np.uint8) * 255
+    index = MaskIndex(mask)
+
+    for _ in range(50):
+        x0, x1 = sorted(rng.integers(0, 54, 2))
+        y0, y1 = sorted(rng.integers(0, 38, 2))
+        assert index.count(x0, y0, x1, y1) == int((mask[y0:y1, x0:x1] > 128).sum())
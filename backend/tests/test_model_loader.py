@@ -0,0 +1,126 @@
+import asyncio
+import importlib
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import model_loader as model_loader_module
+from app.services.model_loader import ModelLoader
+
+CONFIG = {"inpainting_settings": {"tiling_required": True, "tile_size": 64, "max_resolution": 768}}
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Yükleme ve ısıtma aşamalarını test ilerletene kadar bekleten sahte model fonksiyonları"""
+    stages = {"load": threading.Event(), "warmup": threading.Event(), "warmed": [], "load_error": None}
+
+    def load_optimized_model(model_id, use_safetensors, timings, device, cpu_engine):
+        stages["load"].wait(5)
+        if stages["load_error"] is not None:
+            raise stages["load_error"]
+        timings["weights"] = 0.01
+        return SimpleNamespace(device="cpu"), dict(CONFIG)
+
+    def synthetic_inference(model, size, steps):
+        stages["warmup"].wait(5)
+        stages["warmed"].append((size, steps))
+
+    monkeypatch.setattr(model_loader_module, "get_device_info", lambda: {})
+    monkeypatch.setattr(model_loader_module, "plan_replicas", lambda *args, **kwargs: [{"device": "cpu", "cpu_cores": None}])
+    monkeypatch.setattr(model_loader_module, "load_optimized_model", load_optimized_model)
+    monkeypatch.setattr(model_loader_module, "synthetic_inference", synthetic_inference)
+    return stages
+
+def test_loader_moves_through_states_to_ready(stages):
+    ready = []
+    loader = ModelLoader("model", warmup_steps=3, on_ready=ready.append)
+    loader.start()
+    assert loader.state == "loading"
+    assert not loader.ready
+
+    stages["load"].set()
+    assert wait_for(lambda: loader.state == "warming")
+    assert ready == []
+
+    stages["warmup"].set()
+    assert wait_for(lambda: loader.ready)
+    assert stages["warmed"] == [(64, 3)]
+    assert len(ready) == 1 and ready[0][0].device == "cpu"
+    stats = loader.stats()
+    assert stats["ready_at"] is not None
+    assert "64x64" in stats["timings"]["warmup_resolutions"]
+
+def test_loader_reports_failed_load(stages):
+    ready = []
+    stages["load_error"] = RuntimeError("ağırlıklar bulunamadı")
+    stages["load"].set()
+    loader = ModelLoader("model", on_ready=ready.append)
+    loader.start()
+
+    assert wait_for(lambda: loader.state == "failed")
+    assert "ağırlıklar bulunamadı" in loader.error
+    assert ready == []
+
+def test_warmup_failure_still_becomes_ready(stages, monkeypatch):
+    def failing(model, size, steps):
+        raise RuntimeError("ısıtma hatası")
+    monkeypatch.setattr(model_loader_module, "synthetic_inference", failing)
+    stages["load"].set()
+    loader = ModelLoader("model")
+    loader.start()
+
+    assert wait_for(lambda: loader.ready)
+
+def test_stopped_loader_does_not_call_on_ready(stages):
+    ready = []
+    loader = ModelLoader("model", warmup_enabled=False, on_ready=ready.append)
+    loader.start()
+    loader.stop()
+    stages["load"].set()
+
+    loader._thread.join(5)
+    assert ready == []
+    assert not loader.ready
+
+class FakeExecutor:
+    def __init__(self, healthy):
+        self._healthy = healthy
+
+    def healthy(self):
+        return self._healthy
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    # Uygulama modülü içe aktarılırken çıktı klasörünü çalışma dizininde oluşturur
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("app.main")
+
+def call_ready(main, monkeypatch, state, executor):
+    loader = ModelLoader("model")
+    loader.state = state
+    monkeypatch.setattr(main.app.state, "model_loader", loader, raising=False)
+    monkeypatch.setattr(main.app.state, "executor", executor, raising=False)
+    response = asyncio.run(main.ready())
+    if isinstance(response, dict):
+        return 200, response["status"]
+    return response.status_code, response.body
+
+@pytest.mark.parametrize("state", ["loading", "tuning", "warming", "failed"])
+def test_ready_is_unavailable_until_model_is_ready(main, monkeypatch, state):
+    status_code, body = call_ready(main, monkeypatch, state, None)
+    assert status_code == 503
+    assert f'"status":"{state}"'.encode() in body
+
+def test_ready_reports_ready_and_unhealthy(main, monkeypatch):
+    assert call_ready(main, monkeypatch, "ready", FakeExecutor(True)) == (200, "ready")
+    status_code, body = call_ready(main, monkeypatch, "ready", FakeExecutor(False))
+    assert status_code == 503
+    assert b'"status":"unhealthy"' in body
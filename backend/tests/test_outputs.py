@@ -0,0 +1,94 @@
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.models.inpainting import OutputSink
+from app.services.task_store import MemoryTaskStore
+from app.utils.image_utils import encode_image
+
+def sample_image(mode="RGB"):
+    rng = np.random.RandomState(0)
+    # Düzgün geçişli görüntü: kayıplı formatlarda kalite farkı ölçülebilir
+    x = np.linspace(0, 255, 64)
+    pixels = np.stack([np.add.outer(x, x) / 2, np.tile(x, (64, 1)), rng.randint(0, 256, (64, 64))], axis=2)
+    image = Image.fromarray(pixels.astype(np.uint8))
+    return image.convert(mode)
+
+def decode(data):
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+@pytest.mark.parametrize("format, pil_format", [
+    ("png", "PNG"), ("jpeg", "JPEG"), ("JPG", "JPEG"), ("webp", "WEBP"), ("webp_lossless", "WEBP"),
+])
+def test_encode_image_formats(format, pil_format):
+    assert decode(encode_image(sample_image(), format)).format == pil_format
+
+@pytest.mark.parametrize("format", ["png", "webp_lossless"])
+def test_lossless_formats_keep_pixels(format):
+    image = sample_image()
+    assert np.array_equal(np.asarray(decode(encode_image(image, format, quality=1))), np.asarray(image))
+
+@pytest.mark.parametrize("format", ["jpeg", "webp"])
+def test_quality_controls_lossy_size(format):
+    image = sample_image()
+    assert len(encode_image(image, format, quality=20)) < len(encode_image(image, format, quality=95))
+
+def test_png_compress_level():
+    image = sample_image()
+    assert len(encode_image(image, "png", compress_level=9)) < len(encode_image(image, "png", compress_level=0))
+
+def test_jpeg_drops_alpha_and_rejects_unknown_format():
+    assert decode(encode_image(sample_image("RGBA"), "jpeg")).mode == "RGB"
+    with pytest.raises(ValueError):
+        encode_image(sample_image(), "gif")
+
+def wait_for_status(task_store, task_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while task_store.get(task_id)["status"] == "pending" and time.time() < deadline:
+        time.sleep(0.01)
+    return task_store.get(task_id)
+
+def test_output_sink_writes_outputs_and_completes_task(tmp_path):
+    task_store = MemoryTaskStore()
+    task_store.create("a", {})
+    completed = []
+    sink = OutputSink(
+        "a", task_store, "kedi", [5, 6], output_format="jpeg", output_quality=80,
+        output_dir=str(tmp_path), on_complete=completed.append
+    )
+    # Çıktılar sırasız eklenebilir; kayıtlar çıktı sırasına göre tutulur
+    sink.add(1, sample_image())
+    sink.add(0, sample_image())
+    sink.close()
+
+    record = wait_for_status(task_store, "a")
+    assert record["status"] == "completed"
+    images = record["images"]
+    assert [image["seed"] for image in images] == [5, 6]
+    assert [image["path"] for image in images] == [str(tmp_path / "a_0.jpg"), str(tmp_path / "a_1.jpg")]
+    for image in images:
+        with open(image["path"], "rb") as f:
+            data = f.read()
+        assert image["media_type"] == "image/jpeg"
+        assert image["size"] == len(data)
+        assert image["prompt"] == "kedi"
+        assert decode(data).format == "JPEG"
+    assert completed == [images]
+    # Geçici dosya kalmaz
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a_0.jpg", "a_1.jpg"]
+
+def test_output_sink_fails_task_with_missing_outputs(tmp_path):
+    task_store = MemoryTaskStore()
+    task_store.create("a", {})
+    sink = OutputSink("a", task_store, "kedi", [5, 6], output_dir=str(tmp_path))
+    sink.add(0, sample_image())
+    sink.close()
+
+    record = wait_for_status(task_store, "a")
+    assert record["status"] == "failed"
+    assert "2 çıktı bekleniyordu" in record["error"]
@@ -0,0 +1,149 @@
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+from app.services import preprocessing
+from app.services.inpainting_service import InferenceExecutor
+from app.services.preprocessing import Preprocessor
+from app.services.replica_pool import Replica
+from app.services.task_store import MemoryTaskStore
+
+PLANS = {"basic": {"weight": 1, "max_in_flight": 1, "max_queued": 4, "rate_per_minute": 600, "burst": 10}}
+
+def png(color, size=(68, 64)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def make_job(image_data=None, seed=7):
+    return {
+        "image_data": image_data if image_data is not None else png((200, 10, 10)),
+        "mask_data": png((0, 0, 0)),
+        "seed": seed,
+        "num_outputs": 1,
+        "num_inference_steps": 30,
+    }
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Hazırlık, gate.set() çağrılana kadar arka plan iş parçacığında bekler"""
+    started = threading.Event()
+    release = threading.Event()
+    prepare = preprocessing.preprocess_job
+
+    def gated(job, inpainting_settings):
+        started.set()
+        release.wait(5)
+        return prepare(job, inpainting_settings)
+
+    monkeypatch.setattr(preprocessing, "preprocess_job", gated)
+    release.started = started
+    return release
+
+def test_inputs_are_prepared_in_background(gate):
+    preprocessor = Preprocessor(num_workers=1, max_prefetched=1)
+    prepared = preprocessor.submit(make_job(), {})
+
+    # submit beklemez; hazırlık çıkarım iş parçacığı dışında başlar
+    assert gate.started.wait(5)
+    assert preprocessor.stats()["pending"] == 1
+    gate.set()
+
+    init_image, mask_image, seed, regions = prepared.get()
+    # Boyut 8'in katına indirilir, siyah (korunacak) maske tamamen inpaint alanına döner
+    assert init_image.size == (64, 64)
+    assert mask_image.getextrema() == (255, 255)
+    assert seed == 7
+    assert regions == [(0, 0, 64, 64)]
+    assert preprocessor.stats()["pending"] == 0
+    preprocessor.shutdown()
+
+def test_ready_inputs_are_counted_at_start():
+    preprocessor = Preprocessor(num_workers=1, max_prefetched=2)
+    prepared = preprocessor.submit(make_job(), {})
+    prepared._future.result(5)
+    prepared.get()
+
+    stats = preprocessor.stats()
+    assert stats["ready_at_start"] == 1
+    assert stats["waited_at_start"] == 0
+    preprocessor.shutdown()
+
+def test_wait_for_room_blocks_at_prefetch_limit(gate):
+    preprocessor = Preprocessor(num_workers=1, max_prefetched=1)
+    prepared = preprocessor.submit(make_job(), {})
+
+    assert preprocessor.wait_for_room(timeout=0.05) is False
+    gate.set()
+    prepared.get()
+    assert preprocessor.wait_for_room(timeout=0.05) is True
+    assert preprocessor.stats()["waited_at_start"] + preprocessor.stats()["ready_at_start"] == 1
+    preprocessor.shutdown()
+
+def test_discard_releases_slot_once(gate):
+    preprocessor = Preprocessor(num_workers=1, max_prefetched=2)
+    running = preprocessor.submit(make_job(), {})
+    assert gate.started.wait(5)
+    # İkinci görevin hazırlığı başlamadan iptal edilir
+    queued = preprocessor.submit(make_job(), {})
+
+    queued.discard()
+    queued.discard()
+    assert queued._future.cancelled()
+    gate.set()
+    running.get()
+    running.discard()
+
+    stats = preprocessor.stats()
+    assert stats["pending"] == 0
+    assert stats["discarded"] == 1
+    preprocessor.shutdown()
+
+def test_failed_preparation_raises_and_releases_slot():
+    preprocessor = Preprocessor(num_workers=1, max_prefetched=1)
+    prepared = preprocessor.submit(make_job(image_data=b"not an image"), {})
+
+    with pytest.raises(Exception):
+        prepared.get()
+    assert preprocessor.stats()["pending"] == 0
+    assert preprocessor.wait_for_room(timeout=0.05) is True
+    preprocessor.shutdown()
+
+def make_executor():
+    replica = Replica(0, "cpu", None, {"inpainting_settings": {}})
+    return InferenceExecutor(
+        [replica], plan_settings=PLANS, default_plan="basic", preprocess_workers=1, prefetch_factor=1
+    )
+
+def test_failed_prefetch_marks_task_failed():
+    """Önceden hazırlanamayan görev başarısız olur; kopya sağlık kontrolüne gönderilmez"""
+    task_store = MemoryTaskStore()
+    task_store.create("bad", {})
+    executor = make_executor()
+    items = [("bad", task_store, "license", make_job(image_data=b"not an image"))]
+
+    executor._prefetch(items)
+    assert executor.preprocessor.stats()["submitted"] == 1
+    assert executor._run_batch(executor.pool.replicas[0], items, 1.0) is False
+    assert task_store.get("bad")["status"] == "failed"
+    assert executor.preprocessor.stats()["pending"] == 0
+    executor.preprocessor.shutdown()
+
+def test_prefetched_inputs_discarded_without_replica():
+    task_store = MemoryTaskStore()
+    task_store.create("a", {})
+    executor = make_executor()
+    executor.pool.replicas[0].healthy = False
+    executor._running = True
+    executor.submit("a", task_store, license_key="license", **make_job())
+    items = [executor._queue.get(timeout=0.1)]
+
+    executor._prefetch(items)
+    executor._dispatch(items)
+
+    assert task_store.get("a")["status"] == "failed"
+    assert executor.preprocessor.stats()["pending"] == 0
+    assert executor.preprocessor.stats()["discarded"] == 1
+    executor.preprocessor.shutdown()
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.services import progress as progress_module
+from app.services.progress import (
+    TaskProgress, TaskInterrupted, BatchSplit, ProgressHub, SUBSCRIBER_QUEUE_SIZE, CANCEL_POLL_INTERVAL,
+    combine_callbacks
+)
+
+def make_progress():
+    return TaskProgress(None, "task", num_inference_steps=10)
+
+def test_batch_continues_when_split_not_worth_it():
+    """Kesilen görev toplu çağrıyı durdurmaz; split False ise diğer görev sürer"""
+    first, second = make_progress(), make_progress()
+    on_step = combine_callbacks([first.callback(0), second.callback(1)], split=lambda step: False)
+    first.interrupt()
+
+    on_step(0, None, [None, None])
+    assert second.fraction() == 0.1
+
+def test_batch_splits_interrupted_items():
+    first, second = make_progress(), make_progress()
+    on_step = combine_callbacks([first.callback(0), second.callback(1)], split=lambda step: step < 5)
+    on_step(0, None, [None, None])
+    first.interrupt()
+
+    with pytest.raises(BatchSplit):
+        on_step(1, None, [None, None])
+
+def test_batch_stops_when_all_interrupted():
+    first = make_progress()
+    on_step = combine_callbacks([first.callback(0)], split=lambda step: False)
+    first.interrupt("timed_out")
+
+    with pytest.raises(TaskInterrupted) as error:
+        on_step(0, None, [None])
+    assert error.value.status == "timed_out"
+
+def test_full_subscriber_queue_keeps_status_events():
+    """Yavaş abonede yalnızca ilerleme olayları atılır"""
+    queue = asyncio.Queue()
+    ProgressHub._offer(queue, {"type": "status", "status": "processing"})
+    for step in range(SUBSCRIBER_QUEUE_SIZE - 1):
+        ProgressHub._offer(queue, {"type": "progress", "step": step})
+
+    ProgressHub._offer(queue, {"type": "status", "status": "completed"})
+    events = [queue.get_nowait() for _ in range(queue.qsize())]
+
+    assert len(events) == SUBSCRIBER_QUEUE_SIZE
+    assert events[0] == {"type": "status", "status": "processing"}
+    assert events[1] == {"type": "progress", "step": 1}
+    assert events[-1] == {"type": "status", "status": "completed"}
+
+def test_status_events_exceed_limit_instead_of_being_dropped():
+    queue = asyncio.Queue()
+    for _ in range(SUBSCRIBER_QUEUE_SIZE):
+        ProgressHub._offer(queue, {"type": "status", "status": "processing"})
+
+    ProgressHub._offer(queue, {"type": "progress", "step": 1})
+    assert queue.qsize() == SUBSCRIBER_QUEUE_SIZE
+    ProgressHub._offer(queue, {"type": "status", "status": "cancelled"})
+    assert queue.qsize() == SUBSCRIBER_QUEUE_SIZE + 1
+
+def test_cancel_check_is_rate_limited(monkeypatch):
+    calls = []
+    progress = TaskProgress(None, "task", num_inference_steps=10, cancel_check=lambda: calls.append(1))
+    now = [100.0]
+    monkeypatch.setattr(progress_module.time, "monotonic", lambda: now[0])
+
+    progress.check()
+    progress.check()
+    assert len(calls) == 1
+    now[0] += CANCEL_POLL_INTERVAL
+    progress.check()
+    assert len(calls) == 2
+
+def test_cancel_check_interrupts_at_next_step():
+    progress = TaskProgress(None, "task", num_inference_steps=10)
+    progress.cancel_check = lambda: progress.interrupt("cancelled")
+
+    with pytest.raises(TaskInterrupted):
+        progress.step(1)
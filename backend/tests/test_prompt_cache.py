@@ -0,0 +1,59 @@
+import torch
+
+from app.utils.prompt_cache import PromptEmbeddingCache
+from app.utils.tensor_cache import tensor_bytes
+
+def test_prompt_embeddings_are_reused(tiny_pipe):
+    cache = PromptEmbeddingCache()
+    prompt_embeds, negative_embeds = cache.get(tiny_pipe, "kedi", "")
+    assert cache.stats()["misses"] == 1
+
+    # Aynı prompt metin kodlayıcı çalıştırılmadan önbellekten gelir
+    again = cache.get(tiny_pipe, "kedi", None)
+    assert cache.stats()["hits"] == 1
+    assert torch.equal(again[0], prompt_embeds) and torch.equal(again[1], negative_embeds)
+
+    # Önbellekteki gömmeler pipeline'ın kendi kodlamasıyla aynıdır
+    with torch.no_grad():
+        expected = tiny_pipe._encode_prompt("kedi", tiny_pipe.device, 1, True, None)
+    assert torch.allclose(torch.cat([negative_embeds, prompt_embeds]), expected)
+
+    cache.get(tiny_pipe, "kedi", "bulanık")
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["entries"] == 2
+
+def test_batch_lookup_concatenates_per_item_embeddings(tiny_pipe):
+    cache = PromptEmbeddingCache()
+    prompt_embeds, negative_embeds = cache.get_batch(tiny_pipe, ["kedi", "köpek", "kedi"], ["", "", ""])
+
+    assert prompt_embeds.shape[0] == 3
+    assert torch.equal(prompt_embeds[0], prompt_embeds[2])
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["hits"] == 1
+
+def test_least_recently_used_prompt_is_evicted(tiny_pipe):
+    probe = PromptEmbeddingCache()
+    entry_bytes = tensor_bytes(probe.get(tiny_pipe, "a", ""))
+    cache = PromptEmbeddingCache(max_bytes=2 * entry_bytes)
+
+    cache.get(tiny_pipe, "a", "")
+    cache.get(tiny_pipe, "b", "")
+    cache.get(tiny_pipe, "a", "")
+    cache.get(tiny_pipe, "c", "")
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+    # "b" en uzun süredir kullanılmayandı
+    cache.get(tiny_pipe, "a", "")
+    assert cache.stats()["hits"] == stats["hits"] + 1
+    cache.get(tiny_pipe, "b", "")
+    assert cache.stats()["misses"] == stats["misses"] + 1
+
+def test_disabled_cache_stores_nothing(tiny_pipe):
+    cache = PromptEmbeddingCache(max_bytes=0)
+    cache.get(tiny_pipe, "kedi", "")
+    cache.get(tiny_pipe, "kedi", "")
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 0
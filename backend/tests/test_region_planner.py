@@ -0,0 +1,35 @@
+import numpy as np
+
+from app.utils.region_planner import plan_regions, crop_scale
+
+SETTINGS = {"region_padding": 16, "region_merge_distance": 32, "region_max_coverage": 0.6}
+
+def mask_with(*boxes, size=(256, 256)):
+    mask = np.zeros(size, dtype=np.uint8)
+    for x0, y0, x1, y1 in boxes:
+        mask[y0:y1, x0:x1] = 255
+    return mask
+
+def test_plan_regions_empty_mask():
+    assert plan_regions(mask_with(), SETTINGS) == []
+
+def test_plan_regions_large_mask_uses_full_frame():
+    assert plan_regions(mask_with((0, 0, 200, 200)), SETTINGS) == [(0, 0, 256, 256)]
+
+def test_plan_regions_pads_and_aligns_boxes():
+    regions = plan_regions(mask_with((100, 100, 110, 110)), SETTINGS)
+
+    # Bölge 8 piksellik bloklara (96-112) hizalanır, 16 piksel bağlam payı eklenir
+    assert regions == [(80, 80, 128, 128)]
+    assert all(value % 8 == 0 for value in regions[0])
+
+def test_plan_regions_merges_near_and_keeps_far_regions():
+    near = plan_regions(mask_with((20, 20, 30, 30), (50, 20, 60, 30)), SETTINGS)
+    assert len(near) == 1
+
+    far = plan_regions(mask_with((8, 8, 16, 16), (224, 224, 232, 232)), SETTINGS)
+    assert far == [(0, 0, 32, 32), (208, 208, 248, 248)]
+
+def test_crop_scale():
+    assert crop_scale((0, 0, 512, 256), 512) is None
+    assert crop_scale((0, 0, 128, 64), 512) == (512, 256)
@@ -0,0 +1,76 @@
+import threading
+
+from app.services.inpainting_service import InferenceExecutor
+from app.services.replica_pool import Replica, ReplicaPool
+
+def fake_replicas(count):
+    """Model yüklemeden CPU kopyaları"""
+    return [Replica(i, "cpu", None, {}) for i in range(count)]
+
+def test_acquire_prefers_least_loaded_replica():
+    pool = ReplicaPool(fake_replicas(2), queue_depth=2)
+    first = pool.acquire(2.0)
+    second = pool.acquire(1.0)
+
+    assert first.replica_id == 0
+    assert second.replica_id == 1
+    # Bekleyen maliyeti düşük olan kopya seçilir
+    assert pool.acquire(1.0) is second
+    assert second.pending == 2 and second.outstanding == 2.0
+
+def test_acquire_waits_for_room_and_release_measures_speed():
+    pool = ReplicaPool(fake_replicas(1), queue_depth=1)
+    replica = pool.acquire(1.0)
+
+    # Kopya dolu; yer açılmazsa zaman aşımında None döner
+    assert pool.acquire(1.0, timeout=0.05) is None
+
+    pool.release(replica, 1.0, elapsed=4.0)
+    assert replica.pending == 0 and replica.outstanding == 0.0
+    assert replica.seconds_per_cost == 4.0
+    assert replica.completed == 1
+    assert pool.acquire(1.0, timeout=0.05) is replica
+
+def test_probe_failures_evict_replica():
+    pool = ReplicaPool(fake_replicas(2), max_failures=2)
+    replica = pool.replicas[0]
+    replica.model = object()
+
+    assert pool.record_probe(replica, RuntimeError("device lost")) is False
+    # Başarılı kontrol ardışık hata sayacını sıfırlar
+    assert pool.record_probe(replica) is False
+    assert pool.record_probe(replica, RuntimeError("device lost")) is False
+    assert pool.record_probe(replica, RuntimeError("device lost")) is True
+
+    assert not replica.healthy and replica.model is None
+    assert pool.healthy_count() == 1
+    assert pool.stats()["evicted"] == 1
+    # Tahliye edilen kopyaya iş verilmez
+    assert pool.acquire(1.0) is pool.replicas[1]
+
+def test_acquire_returns_none_without_healthy_replicas():
+    pool = ReplicaPool(fake_replicas(1), max_failures=1)
+    replica = pool.acquire(1.0)
+    pool.record_probe(replica, RuntimeError("device lost"))
+
+    assert pool.acquire(1.0, timeout=1.0) is None
+
+def test_redispatch_moves_pending_batches_to_healthy_replica():
+    executor = InferenceExecutor(fake_replicas(2), replica_max_failures=1, preprocess_workers=0)
+    evicted, healthy = executor.pool.replicas
+    items = [("a", None, "license", {"num_outputs": 1, "num_inference_steps": 30})]
+
+    replica = executor.pool.acquire(1.0)
+    assert replica is evicted
+    replica.jobs.put((items, 1.0))
+    barrier = threading.Barrier(2)
+    replica.jobs.put(barrier)
+
+    assert executor.pool.record_probe(evicted, RuntimeError("device lost")) is True
+    executor._redispatch(evicted)
+
+    # Bekleyen toplu iş sağlıklı kopyaya aktarılır, özel çalıştırma iptal edilir
+    assert evicted.jobs.empty() and evicted.pending == 0
+    assert healthy.jobs.get_nowait() == (items, 1.0)
+    assert healthy.pending == 1
+    assert barrier.broken
@@ -0,0 +1,106 @@
+from app.services.result_cache import ResultCache, result_cache_key, pipeline_fingerprint
+from app.services.task_store import MemoryTaskStore
+
+def make_cache(tmp_path, max_bytes=0):
+    return ResultCache(str(tmp_path / "cache"), max_entries=4, max_bytes=max_bytes)
+
+def write_output(tmp_path, name, content=b"png"):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return [{"path": str(path), "media_type": "image/png", "size": len(content), "etag": "x", "seed": 1, "prompt": "kedi"}]
+
+def make_config(**inpainting_settings):
+    return {
+        "device": "cpu",
+        "torch_dtype": "torch.float32",
+        "autotune": {"fingerprint": "abc"},
+        "cpu_engine": {"mode": "legacy", "bf16_autocast": False, "num_threads": 4},
+        "inpainting_settings": dict({"tile_size": 256, "tile_overlap": 32, "region_padding": 32}, **inpainting_settings),
+    }
+
+def test_cache_key_depends_on_inputs_and_params():
+    key = result_cache_key(b"image", b"mask", "model", "pipe", seed=1, prompt="kedi")
+    assert key == result_cache_key(b"image", b"mask", "model", "pipe", prompt="kedi", seed=1)
+    assert key != result_cache_key(b"image", b"mask", "model", "pipe", seed=2, prompt="kedi")
+    assert key != result_cache_key(b"image", b"other", "model", "pipe", seed=1, prompt="kedi")
+    assert key != result_cache_key(b"image", b"mask", "model", "other", seed=1, prompt="kedi")
+
+def test_pipeline_fingerprint_tracks_output_affecting_settings():
+    fingerprint = pipeline_fingerprint([make_config()])
+    # Aynı yapılandırmayı paylaşan kopyalar ve çıktıyı etkilemeyen alanlar parmak izini değiştirmez
+    assert fingerprint == pipeline_fingerprint([make_config(), make_config()])
+    unrelated = make_config()
+    unrelated["cpu_engine"]["num_threads"] = 8
+    assert fingerprint == pipeline_fingerprint([unrelated])
+
+    assert fingerprint != pipeline_fingerprint([make_config(tile_size=512)])
+    assert fingerprint != pipeline_fingerprint([make_config(region_padding=16)])
+    bf16 = make_config()
+    bf16["cpu_engine"]["bf16_autocast"] = True
+    assert fingerprint != pipeline_fingerprint([bf16])
+    retuned = make_config()
+    retuned["autotune"]["fingerprint"] = "def"
+    assert fingerprint != pipeline_fingerprint([retuned])
+
+def test_claim_attaches_to_running_task(tmp_path):
+    cache = make_cache(tmp_path)
+    tasks = MemoryTaskStore()
+    tasks.create("leader", {})
+    tasks.create("follower", {})
+
+    assert cache.claim("key", "leader", tasks) == ("miss", None)
+    assert cache.claim("key", "follower", tasks) == ("attach", "leader")
+    # Aynı görevin tekrar sorması onu bağlamaz
+    assert cache.claim("key", "leader", tasks) == ("miss", None)
+    assert cache.stats()["coalesced"] == 1
+
+def test_claim_ignores_finished_leader(tmp_path):
+    cache = make_cache(tmp_path)
+    tasks = MemoryTaskStore()
+    tasks.create("leader", {})
+    cache.claim("key", "leader", tasks)
+    tasks.fail("leader", "hata")
+
+    # Başarısız görevin sonucu beklenmez; yeni görev çalışan görev olur
+    tasks.create("retry", {})
+    assert cache.claim("key", "retry", tasks) == ("miss", None)
+
+def test_release_forgets_task_that_did_not_start(tmp_path):
+    cache = make_cache(tmp_path)
+    tasks = MemoryTaskStore()
+    tasks.create("leader", {})
+    cache.claim("key", "leader", tasks)
+    cache.release("key", "leader")
+
+    tasks.create("next", {})
+    assert cache.claim("key", "next", tasks) == ("miss", None)
+    assert cache.stats()["in_flight"] == 1
+
+def test_claim_hits_stored_result(tmp_path):
+    cache = make_cache(tmp_path)
+    tasks = MemoryTaskStore()
+    tasks.create("leader", {})
+    cache.claim("key", "leader", tasks)
+    images = write_output(tmp_path, "leader_0.png")
+    cache.store("key", "leader", images)
+
+    assert cache.claim("key", "follower", tasks) == ("hit", images)
+    assert cache.stats()["in_flight"] == 0
+
+    # Çıktı dosyası silindiyse kayıt geçersizdir
+    (tmp_path / "leader_0.png").unlink()
+    assert cache.claim("key", "follower", tasks) == ("miss", None)
+
+def test_disk_tier_survives_restart_and_deleted_outputs(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=1024)
+    tasks = MemoryTaskStore()
+    cache.claim("key", "leader", tasks)
+    cache.store("key", "leader", write_output(tmp_path, "leader_0.png"))
+    (tmp_path / "leader_0.png").unlink()
+
+    # Disk katmanındaki kopya yeniden başlatmadan sonra da kullanılır
+    restarted = make_cache(tmp_path, max_bytes=1024)
+    outcome, images = restarted.claim("key", "follower", tasks)
+    assert outcome == "hit"
+    assert images[0]["path"].startswith(str(tmp_path / "cache"))
+    assert restarted.stats()["disk_hits"] == 1
@@ -0,0 +1,29 @@
+import os
+
+from app.services.retention_service import OutputJanitor
+
+def write_output(directory, name, size, mtime):
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+def test_touch_before_scan_protects_recent_output(tmp_path):
+    """Tarama öncesi erişilen yeni görev, kota aşımında eski görevlerden önce silinmez"""
+    janitor = OutputJanitor(str(tmp_path), max_age_days=0, max_bytes=150, batch_pause=0)
+    write_output(tmp_path, "old_0.png", 100, 1000)
+    write_output(tmp_path, "new_0.png", 100, 500)
+
+    # "new" henüz indekste değil; erişimi yine de kaydedilir
+    janitor.touch("new")
+    janitor.run_once()
+
+    assert not (tmp_path / "old_0.png").exists()
+    assert (tmp_path / "new_0.png").exists()
+
+def test_scan_forgets_access_of_unknown_tasks(tmp_path):
+    janitor = OutputJanitor(str(tmp_path))
+    janitor.touch("missing")
+    janitor.scan()
+
+    assert "missing" not in janitor._last_access
@@ -0,0 +1,80 @@
+import queue
+
+import pytest
+
+from app.services.scheduler import FairQueue, RateLimitedError
+
+PLANS = {
+    "basic": {"weight": 1, "max_in_flight": 1, "max_queued": 4, "rate_per_minute": 600, "burst": 10},
+    "pro": {"weight": 3, "max_in_flight": 2, "max_queued": 8, "rate_per_minute": 600, "burst": 10},
+    "slow": {"weight": 1, "max_in_flight": 1, "max_queued": 8, "rate_per_minute": 1, "burst": 2},
+}
+
+def test_remove_keeps_in_flight_limit():
+    """Kuyruktan çıkarılan görev, çalışan görevin sınır payını serbest bırakmamalı"""
+    fair_queue = FairQueue(8, PLANS, "basic")
+    for task_id in ("a", "b", "c"):
+        fair_queue.put_nowait(task_id, "license", "basic")
+
+    assert fair_queue.get(timeout=0.1) == "a"
+    assert fair_queue.remove(lambda item: item == "b") == "b"
+    assert fair_queue.qsize() == 1
+
+    # "a" hâlâ çalışıyor; max_in_flight=1 olduğundan "c" verilmemeli
+    with pytest.raises(queue.Empty):
+        fair_queue.get(timeout=0.05)
+
+    fair_queue.task_done("license")
+    assert fair_queue.get(timeout=0.1) == "c"
+
+def test_queue_limits():
+    """Toplam kuyruk sınırı queue.Full, plan başına kuyruk payı RateLimitedError verir"""
+    fair_queue = FairQueue(5, PLANS, "basic")
+    for task_id in range(4):
+        fair_queue.put_nowait(task_id, "license", "basic")
+
+    with pytest.raises(RateLimitedError) as error:
+        fair_queue.put_nowait(4, "license", "basic")
+    assert error.value.retry_after == 30
+
+    fair_queue.put_nowait(4, "other", "basic")
+    with pytest.raises(queue.Full):
+        fair_queue.put_nowait(5, "third", "basic")
+
+def test_rate_limit_burst():
+    fair_queue = FairQueue(8, PLANS, "basic")
+    fair_queue.put_nowait("a", "license", "slow")
+    fair_queue.put_nowait("b", "license", "slow")
+
+    # Kova boşaldı; dakikada 1 jetonla bir sonraki istek için ~60 saniye beklenir
+    with pytest.raises(RateLimitedError) as error:
+        fair_queue.put_nowait("c", "license", "slow")
+    assert 55 <= error.value.retry_after <= 60
+
+def test_weighted_fair_order():
+    """Ağırlığı 3 olan plan, ağırlığı 1 olan planın her görevine karşılık 3 görev alır"""
+    fair_queue = FairQueue(16, PLANS, "basic")
+    for i in range(4):
+        fair_queue.put_nowait(("basic", i), "basic-license", "basic")
+    for i in range(6):
+        fair_queue.put_nowait(("pro", i), "pro-license", "pro")
+
+    order = []
+    for _ in range(8):
+        item = fair_queue.get(timeout=0.1)
+        order.append(item[0])
+        fair_queue.task_done(f"{item[0]}-license")
+    assert order.count("pro") == 6
+    assert order[:4].count("basic") == 1
+
+def test_max_in_flight_per_plan():
+    fair_queue = FairQueue(8, PLANS, "basic")
+    for i in range(3):
+        fair_queue.put_nowait(i, "license", "pro")
+
+    assert fair_queue.get(timeout=0.1) == 0
+    assert fair_queue.get(timeout=0.1) == 1
+    # pro planında aynı anda en fazla 2 görev çalışır
+    with pytest.raises(queue.Empty):
+        fair_queue.get(timeout=0.05)
+    assert fair_queue.stats()["in_flight"] == 2
@@ -0,0 +1,136 @@
+import time
+import sqlite3
+import threading
+
+import pytest
+
+from app.services import task_store as task_store_module
+from app.services.task_store import MemoryTaskStore, SQLiteTaskStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteTaskStore(str(tmp_path / "tasks.db"), ttl_seconds=60, max_tasks=3)
+    else:
+        store = MemoryTaskStore(ttl_seconds=60, max_tasks=3)
+    yield store
+    store.close()
+
+def test_task_lifecycle(store):
+    events = []
+    store.add_listener(lambda task_id, status: events.append((task_id, status)))
+    store.create("a", {"prompt": "kedi"})
+
+    record = store.get("a")
+    assert record["status"] == "pending"
+    assert record["params"] == {"prompt": "kedi"}
+
+    store.mark_processing("a")
+    images = [{"path": "/tmp/a_0.png", "media_type": "image/png", "size": 1, "etag": "x", "seed": 1, "prompt": "kedi"}]
+    assert store.complete("a", images) is True
+
+    record = store.get("a")
+    assert record["status"] == "completed"
+    assert record["images"] == images
+    assert record["completed_at"] is not None
+    assert events == [("a", "processing"), ("a", "completed")]
+
+    store.delete("a")
+    assert store.get("a") is None
+    # Silinen görev güncellenemez ve dinleyicilere bildirilmez
+    assert store.fail("a", RuntimeError("hata")) is False
+    assert len(events) == 2
+
+def test_interrupt_records_status_and_message(store):
+    store.create("a", {})
+    store.interrupt("a", "timed_out", "Görev süre sınırını aştı")
+
+    record = store.get("a")
+    assert record["status"] == "timed_out"
+    assert record["error"] == "Görev süre sınırını aştı"
+
+def test_finished_tasks_expire(store, monkeypatch):
+    store.create("done", {})
+    store.fail("done", "hata")
+    store.create("running", {})
+
+    now = time.time()
+    monkeypatch.setattr(task_store_module.time, "time", lambda: now + 120)
+    # Süresi dolan bitmiş görev silinir; bekleyen görev tutulur
+    assert store.get("done") is None
+    assert store.get("running")["status"] == "pending"
+
+def test_limit_evicts_only_finished_tasks(store, monkeypatch):
+    for task_id in ("a", "b", "c"):
+        store.create(task_id, {})
+    store.fail("a", "hata")
+    store.fail("b", "hata")
+
+    # SQLite deposu sınırı periyodik temizlikte uygular
+    monkeypatch.setattr(task_store_module, "PURGE_INTERVAL", 0)
+    store.create("d", {})
+    store.create("e", {})
+
+    ids = store.list_ids()
+    assert "a" not in ids and "b" not in ids
+    assert {"c", "d", "e"} <= set(ids)
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    """Aynı dosyayı kullanan işçiler görev durumlarını paylaşır"""
+    path = str(tmp_path / "tasks.db")
+    first, second = SQLiteTaskStore(path), SQLiteTaskStore(path)
+    first.create("a", {"seed": 1})
+    second.complete("a", [])
+
+    assert first.get("a")["status"] == "completed"
+    assert first.stats()["tasks"] == 1
+    first.close()
+    second.close()
+
+def test_sqlite_close_closes_connections_of_all_threads(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    store.create("a", {})
+    worker = threading.Thread(target=store.get, args=("a",))
+    worker.start()
+    worker.join()
+    connections = list(store._connections)
+    assert len(connections) == 2
+
+    store.close()
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # Kapatıldıktan sonra kullanılırsa yeni bağlantı açılır
+    assert store.get("a")["status"] == "pending"
+    store.close()
+
+def test_task_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        task_store_module.TaskStore()
+
+def test_cancel_request_is_consumed_once(store):
+    store.create("a", {})
+    assert store.pop_cancel_request("a") is None
+
+    assert store.request_cancel("a", "license") is True
+    assert store.pop_cancel_request("a") == "license"
+    assert store.pop_cancel_request("a") is None
+    assert store.request_cancel("missing", "license") is False
+
+def test_sqlite_store_adds_cancel_column_to_existing_table(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE tasks (
+            id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL,
+            completed_at REAL, params TEXT, images TEXT, error TEXT
+        )
+    """)
+    conn.execute("INSERT INTO tasks (id, status, created_at, updated_at) VALUES ('a', 'processing', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteTaskStore(path)
+    store.request_cancel("a", "license")
+    assert store.get("a")["cancel_requested"] == "license"
+    store.close()
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from app.utils.tile_compositor import TileCompositor, feather_weights
+
+WIDTH, HEIGHT, TILE, OVERLAP = 96, 80, 48, 16
+
+def tile_positions(size, tile=TILE, overlap=OVERLAP):
+    """Son parçası görüntü sınırına dayanan, overlap kadar örtüşen parça başlangıçları"""
+    positions = list(range(0, size - tile, tile - overlap)) + [size - tile]
+    return sorted(set(positions))
+
+def tile_grid():
+    return [(x, y) for y in tile_positions(HEIGHT) for x in tile_positions(WIDTH)]
+
+def composite(tiles, base, region=None, mask=None):
+    compositor = TileCompositor(WIDTH, HEIGHT, overlap=OVERLAP, region=region)
+    for (x, y), tile in tiles:
+        compositor.add(tile, x, y)
+    return compositor.result(base, mask)
+
+def test_tiles_of_one_image_composite_without_seams():
+    """Aynı görüntüden kesilen parçalar birleşince görüntü değişmeden geri gelir"""
+    rng = np.random.RandomState(0)
+    image = rng.randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8)
+    tiles = [((x, y), image[y:y + TILE, x:x + TILE]) for x, y in tile_grid()]
+
+    result = composite(tiles, np.zeros_like(image))
+    assert np.array_equal(result, image)
+
+    uniform = np.full((HEIGHT, WIDTH, 3), 137, dtype=np.uint8)
+    tiles = [((x, y), uniform[y:y + TILE, x:x + TILE]) for x, y in tile_grid()]
+    assert np.array_equal(composite(tiles, np.zeros_like(uniform)), uniform)
+
+def test_edge_tiles_have_full_weight_at_image_border():
+    # Sol üst köşe parçası: yalnızca sağ ve alt kenarda komşusu var
+    weights = feather_weights(TILE, TILE, 3, OVERLAP, False, False, True, True)
+    assert weights.shape == (TILE, TILE, 3)
+    assert np.all(weights[0, :TILE - OVERLAP] == 1)
+    assert np.all(weights[:TILE - OVERLAP, 0] == 1)
+    # Komşuya bakan kenarlarda ağırlık sıfıra inmeden azalır
+    assert 0 < weights[0, -1, 0] < weights[0, -OVERLAP, 0] <= 1
+    assert 0 < weights[-1, 0, 0] < 1
+
+    # Görüntünün tamamını kaplayan tek parça her yerde tam ağırlık alır
+    assert np.all(feather_weights(TILE, TILE, 3, OVERLAP, False, False, False, False) == 1)
+    assert not feather_weights(TILE, TILE, 3, OVERLAP, True, True, True, True).flags.writeable
+
+def reference_blend(tiles, base):
+    """Parça başına float64 ağırlıklarla doğrudan hesaplanan harmanlama"""
+    accumulator = np.zeros(base.shape, dtype=np.float64)
+    total = np.zeros(base.shape, dtype=np.float64)
+    ramp = (np.arange(OVERLAP) + 0.5) / OVERLAP
+    for (x, y), tile in tiles:
+        ramp_x, ramp_y = np.ones(TILE), np.ones(TILE)
+        if x > 0:
+            ramp_x[:OVERLAP] = np.minimum(ramp_x[:OVERLAP], ramp)
+        if x + TILE < WIDTH:
+            ramp_x[-OVERLAP:] = np.minimum(ramp_x[-OVERLAP:], ramp[::-1])
+        if y > 0:
+            ramp_y[:OVERLAP] = np.minimum(ramp_y[:OVERLAP], ramp)
+        if y + TILE < HEIGHT:
+            ramp_y[-OVERLAP:] = np.minimum(ramp_y[-OVERLAP:], ramp[::-1])
+        weights = np.outer(ramp_y, ramp_x)[:, :, None]
+        accumulator[y:y + TILE, x:x + TILE] += tile * weights
+        total[y:y + TILE, x:x + TILE] += weights
+    return np.where(total > 0, np.floor(accumulator / np.maximum(total, 1e-12) + 0.5), base).astype(np.uint8)
+
+def test_result_matches_reference_blend():
+    rng = np.random.RandomState(1)
+    base = rng.randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8)
+    # Her parça farklı içerikle: örtüşen bölgeler gerçekten harmanlanır
+    tiles = [((x, y), rng.randint(0, 256, (TILE, TILE, 3)).astype(np.uint8)) for x, y in tile_grid()]
+
+    result = composite(tiles, base)
+    difference = np.abs(result.astype(int) - reference_blend(tiles, base).astype(int))
+    assert difference.max() <= 1
+
+@pytest.mark.parametrize("region", [None, (32, 0, 96, 80)])
+def test_uncovered_and_unmasked_pixels_keep_base(region):
+    rng = np.random.RandomState(2)
+    base = rng.randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8)
+    tile = np.full((TILE, TILE, 3), 255, dtype=np.uint8)
+    mask = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    mask[:, 64:] = 255
+
+    result = composite([((48, 0), tile), ((48, 32), tile)], base, region=region, mask=mask)
+    # Parça kapsamı dışı ve maske dışı pikseller korunur
+    assert np.array_equal(result[:, :64], base[:, :64])
+    assert np.all(result[:, 64:] == 255)
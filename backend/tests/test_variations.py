@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from app.utils import variations
+from app.utils.prompt_cache import prompt_cache
+from app.utils.latent_cache import latent_cache
+
+STEPS = 3
+GUIDANCE = 7.5
+
+@pytest.fixture
+def inputs():
+    prompt_cache.clear()
+    latent_cache.clear()
+    rng = np.random.RandomState(0)
+    image = Image.fromarray(rng.randint(0, 255, (64, 64, 3), dtype=np.uint8))
+    mask = np.zeros((64, 64, 3), dtype=np.uint8)
+    mask[16:48, 16:48] = 255
+    return image, Image.fromarray(mask)
+
+def single_seed(pipe, image, mask, seed):
+    generator = torch.Generator().manual_seed(seed)
+    return pipe(
+        prompt="kedi", negative_prompt="", image=image, mask_image=mask, height=64, width=64,
+        guidance_scale=GUIDANCE, num_inference_steps=STEPS, generator=generator
+    ).images[0]
+
+def max_difference(first, second):
+    return np.abs(np.asarray(first).astype(int) - np.asarray(second).astype(int)).max()
+
+def test_batched_variations_match_single_seed_pipeline(tiny_pipe, inputs):
+    """Toplu çalıştırmadaki her çıktı aynı seed'le tek başına çalıştırılan pipeline çıktısına eşittir"""
+    image, mask = inputs
+    prepared = variations.prepare_variation_inputs(tiny_pipe, image, mask, "kedi", "", GUIDANCE)
+    with torch.no_grad():
+        batch = variations.run_variation_batch(tiny_pipe, prepared, GUIDANCE, STEPS, [7, 8])
+
+    assert len(batch) == 2
+    for seed, result in zip([7, 8], batch):
+        assert max_difference(result, single_seed(tiny_pipe, image, mask, seed)) <= 1
+    # Farklı seed'ler farklı çıktı verir
+    assert max_difference(batch[0], batch[1]) > 1
+
+def test_out_of_memory_halves_batch_size(tiny_pipe, inputs, monkeypatch):
+    image, mask = inputs
+    seeds = [1, 2, 3, 4]
+    expected = variations.generate_variations(tiny_pipe, image, mask, "kedi", "", GUIDANCE, STEPS, seeds)
+
+    run_batch = variations.run_variation_batch
+    chunks = []
+    def limited(pipe, prepared, guidance_scale, steps, chunk, progress=None):
+        chunks.append(list(chunk))
+        if len(chunk) > 1:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+        return run_batch(pipe, prepared, guidance_scale, steps, chunk, progress=progress)
+    monkeypatch.setattr(variations, "run_variation_batch", limited)
+
+    indexes = []
+    results = variations.generate_variations(
+        tiny_pipe, image, mask, "kedi", "", GUIDANCE, STEPS, seeds,
+        on_result=lambda index, result: indexes.append(index)
+    )
+
+    assert chunks == [[1, 2, 3, 4], [1, 2], [1], [2], [3], [4]]
+    assert indexes == [0, 1, 2, 3]
+    assert all(max_difference(result, reference) <= 1 for result, reference in zip(results, expected))
+
+def test_out_of_memory_with_single_seed_is_raised(tiny_pipe, inputs, monkeypatch):
+    image, mask = inputs
+    def failing(*args, **kwargs):
+        raise RuntimeError("DefaultCPUAllocator: can't allocate memory")
+    monkeypatch.setattr(variations, "run_variation_batch", failing)
+
+    with pytest.raises(RuntimeError):
+        variations.generate_variations(tiny_pipe, image, mask, "kedi", "", GUIDANCE, STEPS, [1])
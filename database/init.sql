@@ -0,0 +1,19 @@
+-- Lisans veritabanı şeması
+-- backend/app/services/license_service.py içindeki LICENSE_SCHEMA ile aynı tutulmalıdır.
+-- SQLite deposu bu şemayı ilk açılışta kendisi oluşturur; dosya diğer
+-- veritabanlarında aynı tabloyu hazırlamak için de kullanılabilir.
+
+CREATE TABLE IF NOT EXISTS licenses (
+    license_key TEXT PRIMARY KEY,
+    customer_name TEXT NOT NULL,
+    customer_email TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    creation_date TEXT NOT NULL,
+    expiry_date TEXT NOT NULL,
+    usage_count INTEGER NOT NULL DEFAULT 0,
+    usage_limit INTEGER NOT NULL DEFAULT 0,  -- 0 = sınırsız
+    active INTEGER NOT NULL DEFAULT 1,
+    last_used TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_licenses_customer_email ON licenses (customer_email);
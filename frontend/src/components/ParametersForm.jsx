@@ -1,6 +1,9 @@
-import React, { useState } from 'react';
-import { startInpaintingProcess } from '../services/api';
-import { checkInpaintingStatus } from '../services/checkInpaintingStatus'; // Bu satırı ekleyin
+import React, { useEffect, useRef, useState } from 'react';
+import { startInpaintingProcess, cancelInpaintingProcess } from '../services/api';
+import { subscribeToInpaintingEvents, withAbsoluteUrls } from '../services/checkInpaintingStatus';
+
+// İlerleme akışında her 5 adımda bir düşük çözünürlüklü önizleme istenir
+const PREVIEW_EVERY = 5;
 
 export const ParametersForm = ({ originalImage, mask, setIsProcessing, isProcessing, setResults }) => {
 
@@ -10,6 +13,51 @@ export const ParametersForm = ({ originalImage, mask, setIsProcessing, isProcess
   const [numInferenceSteps, setNumInferenceSteps] = useState(30);
   const [seed, setSeed] = useState(-1);
   const [numOutputs, setNumOutputs] = useState(1);
+  const [outputFormat, setOutputFormat] = useState('png');
+  const [outputQuality, setOutputQuality] = useState(90);
+  const [progress, setProgress] = useState(null);
+  // Çalışan görevin ID'si; sayfadan ayrılırken veya iptal edilince sunucuda da durdurulur
+  const activeTaskId = useRef(null);
+  // Görevin ilerleme akışını (EventSource ve yedek sorgulama) kapatan fonksiyon
+  const closeEvents = useRef(null);
+  
+  const closeEventStream = () => {
+    if (closeEvents.current) {
+      closeEvents.current();
+      closeEvents.current = null;
+    }
+  };
+  
+  useEffect(() => {
+    const onPageHide = () => {
+      if (activeTaskId.current) {
+        cancelInpaintingProcess(activeTaskId.current).catch(() => {});
+      }
+    };
+    window.addEventListener('pagehide', onPageHide);
+    return () => {
+      window.removeEventListener('pagehide', onPageHide);
+      closeEventStream();
+    };
+  }, []);
+  
+  const finishTask = () => {
+    closeEventStream();
+    activeTaskId.current = null;
+    setProgress(null);
+    setIsProcessing(false);
+  };
+  
+  const handleCancel = async () => {
+    if (!activeTaskId.current) {
+      return;
+    }
+    try {
+      await cancelInpaintingProcess(activeTaskId.current);
+    } catch (error) {
+      console.error('İptal hatası:', error);
+    }
+  };
   
   const generateRandomSeed = () => {
     setSeed(Math.floor(Math.random() * 2147483647));
@@ -25,6 +73,7 @@ export const ParametersForm = ({ originalImage, mask, setIsProcessing, isProcess
     
     setIsProcessing(true);
     setResults([]);
+    setProgress(null);
     
     try {
       const originalImageBlob = await fetch(originalImage).then(r => r.blob());
@@ -39,24 +88,37 @@ export const ParametersForm = ({ originalImage, mask, setIsProcessing, isProcess
       formData.append('num_inference_steps', numInferenceSteps);
       formData.append('seed', seed);
       formData.append('num_outputs', numOutputs);
+      formData.append('output_format', outputFormat);
+      formData.append('output_quality', outputQuality);
+      formData.append('preview_every', PREVIEW_EVERY);
       
       const response = await startInpaintingProcess(formData);
       
-      if (response && response.id) {
-        // Sonuçları kontrol etmek için polling yap
-        const pollInterval = setInterval(async () => {
-          const result = await checkInpaintingStatus(response.id);
-          
-          if (result.status === 'completed') {
-            clearInterval(pollInterval);
-            setResults(result.images || []);
-            setIsProcessing(false);
-          } else if (result.status === 'failed') {
-            clearInterval(pollInterval);
-            alert(`İşlem başarısız oldu: ${result.error || 'Bilinmeyen hata'}`);
-            setIsProcessing(false);
-          }
-        }, 2000);
+      if (response && response.status === 'completed') {
+        // Aynı istek daha önce işlenmişse sonuç önbellekten hemen döner
+        setResults(withAbsoluteUrls(response.images) || []);
+        setIsProcessing(false);
+      } else if (response && response.id) {
+        activeTaskId.current = response.id;
+        // İlerlemeyi ve sonucu tek bir akış bağlantısından al
+        closeEventStream();
+        closeEvents.current = subscribeToInpaintingEvents(response.id, response.events_url, {
+          onQueue: (info) => setProgress((previous) => ({ ...previous, queuePosition: info.queue_position })),
+          onProgress: (event) => setProgress((previous) => ({
+            ...event,
+            queuePosition: null,
+            preview: event.preview || (previous && previous.preview),
+          })),
+          onCompleted: (images) => {
+            setResults(images);
+            finishTask();
+          },
+          onFailed: (error) => {
+            alert(`İşlem başarısız oldu: ${error || 'Bilinmeyen hata'}`);
+            finishTask();
+          },
+          onCancelled: finishTask,
+        });
       }
     } catch (error) {
       console.error('Inpainting hatası:', error);
@@ -172,6 +234,43 @@ export const ParametersForm = ({ originalImage, mask, setIsProcessing, isProcess
           </div>
         </div>
         
+        <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-4 mt-4">
+          <div>
+            <label className="block text-gray-700 text-sm font-bold mb-2">
+              Çıktı Formatı
+            </label>
+            <select
+              value={outputFormat}
+              onChange={(e) => setOutputFormat(e.target.value)}
+              className="w-full p-1 border border-gray-300 rounded-md"
+            >
+              <option value="png">PNG (kayıpsız)</option>
+              <option value="webp_lossless">WebP (kayıpsız)</option>
+              <option value="webp">WebP</option>
+              <option value="jpeg">JPEG</option>
+            </select>
+          </div>
+          
+          {(outputFormat === 'webp' || outputFormat === 'jpeg') && (
+            <div>
+              <label className="block text-gray-700 text-sm font-bold mb-2">
+                Kalite
+              </label>
+              <div className="flex items-center">
+                <input
+                  type="range"
+                  min="50"
+                  max="100"
+                  value={outputQuality}
+                  onChange={(e) => setOutputQuality(parseInt(e.target.value))}
+                  className="w-full"
+                />
+                <span className="ml-2 text-sm text-gray-700">{outputQuality}</span>
+              </div>
+            </div>
+          )}
+        </div>
+        
         <div className="mt-6">
           <button
             type="submit"
@@ -184,6 +283,49 @@ export const ParametersForm = ({ originalImage, mask, setIsProcessing, isProcess
           >
             {isProcessing ? 'İşleniyor...' : 'Inpainting İşlemini Başlat'}
           </button>
+          
+          {isProcessing && (
+            <button
+              type="button"
+              onClick={handleCancel}
+              className="ml-4 py-3 px-6 rounded-lg font-semibold bg-gray-200 text-gray-700 hover:bg-gray-300"
+            >
+              İptal
+            </button>
+          )}
+          
+          {isProcessing && progress && (
+            <div className="mt-4 flex items-start gap-4">
+              {progress.preview && (
+                <img
+                  src={progress.preview}
+                  alt="Önizleme"
+                  className="w-24 h-24 object-cover rounded border border-gray-200"
+                  style={{ imageRendering: 'pixelated' }}
+                />
+              )}
+              <div className="flex-1 text-sm text-gray-700">
+                {progress.queuePosition ? (
+                  <p>Kuyrukta sıra: {progress.queuePosition}</p>
+                ) : progress.progress !== undefined && (
+                  <>
+                    <div className="w-full bg-gray-200 rounded h-2 mb-2">
+                      <div
+                        className="bg-blue-600 h-2 rounded"
+                        style={{ width: `${Math.round(progress.progress * 100)}%` }}
+                      />
+                    </div>
+                    <p>
+                      Adım {progress.step}/{progress.steps}
+                      {progress.outputs > 1 && ` · Sonuç ${progress.output}/${progress.outputs}`}
+                      {progress.tiles > 1 && ` · Parça ${progress.tile}/${progress.tiles}`}
+                      {progress.eta_seconds !== null && ` · Kalan ~${Math.ceil(progress.eta_seconds)} sn`}
+                    </p>
+                  </>
+                )}
+              </div>
+            </div>
+          )}
         </div>
       </form>
     </div>
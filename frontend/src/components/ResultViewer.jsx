@@ -1,5 +1,11 @@
 import React, { useState } from 'react';
 
+const FILE_EXTENSIONS = {
+  'image/png': 'png',
+  'image/jpeg': 'jpg',
+  'image/webp': 'webp',
+};
+
 export const ResultViewer = ({ results }) => {
   const [selectedIndex, setSelectedIndex] = useState(0);
   
@@ -17,7 +23,7 @@ export const ResultViewer = ({ results }) => {
               className={`border p-2 cursor-pointer ${selectedIndex === index ? 'border-blue-500 ring-2 ring-blue-300' : 'border-gray-300'}`}
               onClick={() => setSelectedIndex(index)}
             >
-              <img src={result.image} alt={`Sonuç ${index + 1}`} className="max-w-full" />
+              <img src={result.url} alt={`Sonuç ${index + 1}`} className="max-w-full" />
               <div className="mt-2 text-xs text-gray-500">
                 <p>Seed: {result.seed}</p>
               </div>
@@ -31,13 +37,13 @@ export const ResultViewer = ({ results }) => {
           {results.length > 1 ? 'Seçilen Sonuç' : 'Sonuç'}
         </h3>
         <div className="border border-gray-300 p-1 inline-block">
-          <img src={results[selectedIndex].image} alt="İnpainting Sonucu" className="max-w-full" />
+          <img src={results[selectedIndex].url} alt="İnpainting Sonucu" className="max-w-full" />
         </div>
         
         <div className="mt-4">
           <a
-            href={results[selectedIndex].image}
-            download="sd_inpainting_result.png"
+            href={results[selectedIndex].url}
+            download={`sd_inpainting_result.${FILE_EXTENSIONS[results[selectedIndex].media_type] || 'png'}`}
             className="bg-green-600 text-white py-2 px-6 rounded-lg font-semibold hover:bg-green-700">
           
             Sonucu İndir</a> 
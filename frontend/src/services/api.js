@@ -20,4 +20,17 @@ export const startInpaintingProcess = async (formData) => {
   }
   
   return await response.json();
-};
\ No newline at end of file
+};
+// keepalive: sayfa kapanırken gönderilen istek de tamamlanır
+export const cancelInpaintingProcess = async (taskId) => {
+  const response = await fetch(`${API_BASE_URL}/inpaint/${taskId}`, {
+    method: 'DELETE',
+    keepalive: true,
+  });
+  
+  if (!response.ok && response.status !== 409) {
+    throw new Error('İşlem iptal edilemedi');
+  }
+  
+  return await response.json();
+};
@@ -1,5 +1,14 @@
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// Sonuç görüntüleri API'ye göre göreli URL olarak gelir
+export const withAbsoluteUrls = (images) =>
+  images
+    ? images.map((image) => ({
+        ...image,
+        url: `${API_BASE_URL}${image.url}`,
+      }))
+    : images;
+
 export const checkInpaintingStatus = async (taskId) => {
   const response = await fetch(`${API_BASE_URL}/inpaint/${taskId}`);
   
@@ -7,5 +16,79 @@ export const checkInpaintingStatus = async (taskId) => {
     throw new Error('İşlem durumu alınamadı');
   }
   
-  return await response.json();
-};
\ No newline at end of file
+  const result = await response.json();
+  result.images = withAbsoluteUrls(result.images);
+  
+  return result;
+};
+
+/**
+ * Görevin ilerleme akışına (Server-Sent Events) abone olur. Görev başına tek
+ * bağlantı açılır; adım/parça ilerlemesi, kuyruk sırası ve sonuç bu bağlantıdan
+ * gelir. Akış kurulamazsa durum 2 saniyede bir sorgulanır.
+ * eventsUrl görev yanıtındaki imzalı adrestir (EventSource lisans başlığı gönderemez).
+ * Dönen fonksiyon aboneliği kapatır.
+ */
+export const subscribeToInpaintingEvents = (taskId, eventsUrl, { onProgress, onQueue, onCompleted, onFailed, onCancelled }) => {
+  let closed = false;
+  let pollInterval = null;
+  const source = new EventSource(`${API_BASE_URL}${eventsUrl}`);
+  
+  const close = () => {
+    closed = true;
+    source.close();
+    if (pollInterval) {
+      clearInterval(pollInterval);
+    }
+  };
+  
+  const startPolling = () => {
+    if (pollInterval || closed) {
+      return;
+    }
+    pollInterval = setInterval(async () => {
+      try {
+        const result = await checkInpaintingStatus(taskId);
+        if (result.status === 'completed') {
+          close();
+          onCompleted(result.images || []);
+        } else if (result.status === 'failed' || result.status === 'timed_out') {
+          close();
+          onFailed(result.error);
+        } else if (result.status === 'cancelled') {
+          close();
+          onCancelled && onCancelled();
+        } else if (onQueue && result.queue_position) {
+          onQueue(result);
+        }
+      } catch (error) {
+        console.error('Durum sorgulama hatası:', error);
+      }
+    }, 2000);
+  };
+  
+  source.addEventListener('progress', (e) => onProgress && onProgress(JSON.parse(e.data)));
+  source.addEventListener('queue', (e) => onQueue && onQueue(JSON.parse(e.data)));
+  source.addEventListener('completed', (e) => {
+    close();
+    onCompleted(withAbsoluteUrls(JSON.parse(e.data).images) || []);
+  });
+  // Süre sınırını aşan görevler başarısız sayılır
+  ['failed', 'timed_out'].forEach((event) => source.addEventListener(event, (e) => {
+    close();
+    onFailed(JSON.parse(e.data).error);
+  }));
+  source.addEventListener('cancelled', () => {
+    close();
+    onCancelled && onCancelled();
+  });
+  source.onerror = () => {
+    // Akış koptuysa (ör. proxy desteklemiyor) sorgulamaya geç
+    if (!closed) {
+      source.close();
+      startPolling();
+    }
+  };
+  
+  return close;
+};
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Parça birleştirici mikro-benchmark'ı.
+
+Eski döngü tabanlı harmanlama ile TileCompositor'ı aynı parça düzeni
+üzerinde karşılaştırır. Model gerektirmez; parçalar rastgele üretilir.
+
+Kullanım:
+    python scripts/benchmark_tile_compositor.py --width 2048 --height 2048 --tile 256 --overlap 32
+    python scripts/benchmark_tile_compositor.py --mask-fraction 0.1
+"""
+import argparse
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import numpy as np
+
+from app.utils.tile_compositor import TileCompositor
+
+def tile_grid(width, height, tile_size, tile_overlap):
+    """process_with_auto_tiling ile aynı parça koordinatlarını üretir"""
+    x_tiles = np.arange(0, width, tile_size - tile_overlap)
+    y_tiles = np.arange(0, height, tile_size - tile_overlap)
+    if len(x_tiles) > 1 and x_tiles[-1] + tile_size > width:
+        x_tiles[-1] = max(0, width - tile_size)
+    if len(y_tiles) > 1 and y_tiles[-1] + tile_size > height:
+        y_tiles[-1] = max(0, height - tile_size)
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for x in np.unique(x_tiles) for y in np.unique(y_tiles)
+    ]
+
+def legacy_composite(img_np, mask_np, tiles, tile_results, tile_overlap):
+    """Önceki sürümdeki döngü tabanlı harmanlama (referans)"""
+    result_np = np.copy(img_np)
+    for (x_start, y_start, x_end, y_end), tile_result_np in zip(tiles, tile_results):
+        if tile_overlap > 0 and (x_start > 0 or y_start > 0):
+            blend_mask = np.ones((y_end - y_start, x_end - x_start))
+            if x_start > 0:
+                for i in range(tile_overlap):
+                    blend_mask[:, i] = i / tile_overlap
+            if y_start > 0:
+                for i in range(tile_overlap):
+                    blend_mask[i, :] *= i / tile_overlap
+            blend_mask = np.expand_dims(blend_mask, axis=2).repeat(3, axis=2)
+            result_np[y_start:y_end, x_start:x_end] = (
+                tile_result_np * blend_mask +
+                result_np[y_start:y_end, x_start:x_end] * (1 - blend_mask)
+            ).astype(np.uint8)
+        else:
+            mask_region = (mask_np[y_start:y_end, x_start:x_end] > 128)
+            mask_region = np.expand_dims(mask_region, axis=2).repeat(3, axis=2)
+            result_np[y_start:y_end, x_start:x_end][mask_region] = tile_result_np[mask_region]
+    return result_np
+
+def vectorized_composite(img_np, mask_np, tiles, tile_results, tile_overlap):
+    """TileCompositor ile birleştirme"""
+    height, width = img_np.shape[:2]
+    region = (
+        min(t[0] for t in tiles), min(t[1] for t in tiles),
+        max(t[2] for t in tiles), max(t[3] for t in tiles),
+    )
+    compositor = TileCompositor(width, height, overlap=tile_overlap, region=region)
+    for (x_start, y_start, _, _), tile_result_np in zip(tiles, tile_results):
+        compositor.add(tile_result_np, x_start, y_start)
+    return compositor.result(img_np, mask_np)
+
+def bench(fn, repeats, *args):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description='Parça birleştirici mikro-benchmark')
+    parser.add_argument('--width', type=int, default=2048, help='Görüntü genişliği')
+    parser.add_argument('--height', type=int, default=2048, help='Görüntü yüksekliği')
+    parser.add_argument('--tile', type=int, default=256, help='Parça boyutu')
+    parser.add_argument('--overlap', type=int, default=32, help='Parça örtüşmesi')
+    parser.add_argument('--mask-fraction', type=float, default=1.0, help='Maskenin kapladığı alan oranı (merkezde)')
+    parser.add_argument('--repeats', type=int, default=5, help='Tekrar sayısı')
+
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    img_np = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    # Merkezde, istenen alan oranını kaplayan dikdörtgen maske
+    mask_np = np.zeros((args.height, args.width), dtype=np.uint8)
+    side = np.sqrt(args.mask_fraction)
+    mask_w, mask_h = int(args.width * side), int(args.height * side)
+    mask_x, mask_y = (args.width - mask_w) // 2, (args.height - mask_h) // 2
+    mask_np[mask_y:mask_y + mask_h, mask_x:mask_x + mask_w] = 255
+
+    # Tiler gibi yalnızca maskeye değen parçalar işlenir
+    tiles = [
+        (x0, y0, x1, y1) for x0, y0, x1, y1 in tile_grid(args.width, args.height, args.tile, args.overlap)
+        if np.mean(mask_np[y0:y1, x0:x1]) >= 10
+    ]
+    tile_results = [
+        rng.integers(0, 256, (y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        for x0, y0, x1, y1 in tiles
+    ]
+
+    print(f"\n=== {args.width}x{args.height}, {len(tiles)} parça ({args.tile}px, örtüşme {args.overlap}px, "
+          f"maske oranı {args.mask_fraction:.0%}) ===")
+    for name, fn in (("eski (döngü)", legacy_composite), ("TileCompositor", vectorized_composite)):
+        best, mean = bench(fn, args.repeats, img_np, mask_np, tiles, tile_results, args.overlap)
+        print(f"{name:<16} en iyi: {best * 1000:8.2f} ms   ortalama: {mean * 1000:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
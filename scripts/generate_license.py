@@ -2,9 +2,11 @@
 import argparse
 import sys
 import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.append(BACKEND_DIR)
 
-from app.services.license_service import create_license
+from app.config import settings
+from app.services.license_service import create_license, configure_license_store, configure_license_tokens
 
 def main():
     parser = argparse.ArgumentParser(description='SD Inpainting Lisans Oluşturucu')
@@ -13,15 +15,31 @@ def main():
     parser.add_argument('--plan', choices=['basic', 'pro', 'enterprise'], default='basic', help='Lisans planı')
     parser.add_argument('--days', type=int, default=365, help='Lisans süresi (gün)')
     parser.add_argument('--limit', type=int, default=0, help='Kullanım limiti (0=sınırsız)')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default=settings.license_backend,
+                        help='Lisans deposu (varsayılan: LICENSE_BACKEND ayarı)')
+    parser.add_argument('--db', default=settings.license_db_path,
+                        help='SQLite lisans veritabanı (backend klasörüne göre)')
     
     args = parser.parse_args()
     
+    # Lisans yolları API ile aynı olsun diye backend klasörüne göre çözülür
+    os.chdir(BACKEND_DIR)
+    store = configure_license_store(args.backend, path=args.db if args.backend == 'sqlite' else None)
+    # İmza anahtarı ayarlıysa çevrimdışı doğrulanabilen token da üretilir
+    configure_license_tokens(
+        secret=settings.license_token_secret,
+        algorithm=settings.license_token_algorithm,
+        private_key_path=settings.license_token_private_key_path,
+        public_key_path=settings.license_token_public_key_path
+    )
+    
     customer_info = {
         "name": args.name,
         "email": args.email
     }
     
     result = create_license(customer_info, args.plan, args.days, args.limit)
+    store.stop()
     
     print("\n=== Lisans Oluşturuldu ===")
     print(f"Lisans Anahtarı: {result['license_key']}")
@@ -34,6 +52,12 @@ def main():
     print("\n" + "="*50)
     print(f"{result['license_key']}")
     print("="*50)
+    
+    if "license_token" in result:
+        print("\nİmzalı lisans token'ı (sunucu depoya erişmeden doğrular):")
+        print("\n" + "="*50)
+        print(result["license_token"])
+        print("="*50)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file